@@ -0,0 +1,1242 @@
+#!/usr/bin/env python3
+"""Benchmark DocSmith builder hot paths on synthetic inputs."""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import html
+import itertools
+import json
+import os
+import platform
+import posixpath
+import random
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, TypedDict, cast
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import build_docs_site as docs  # noqa: E402
+
+NAV_SECTIONS = ["", "frontend", "api", "tests", "utils", "diagrams", "modules"]
+
+# Bump when the generated corpus changes so cached corpora are regenerated.
+CORPUS_VERSION = 1
+CORPUS_SECTIONS = ["guides", "api", "frontend", "modules", "operations", "diagrams"]
+CORPUS_COMMITS = 12
+CORPUS_DATE = 1767225600  # 2026-01-01T00:00:00Z
+MONOREPO_VERSION = 1
+BASELINE_VERSION = 1
+SCENARIOS = ["full", "noop", "edit"]
+# Stage timings below this many seconds are too noisy to flag as regressions.
+COMPARE_MIN_SECONDS = 0.05
+
+
+class BuildRun(TypedDict):
+    """One command-line build timed by `run_build`."""
+
+    wall_seconds: float
+    pages_per_second: float
+    rendered: int
+    stages: Dict[str, float]
+    peak_rss_kb: int
+    output_bytes: int
+
+
+class BuildRow(BuildRun):
+    pages: int
+    scenario: str
+
+
+class BuildReport(TypedDict):
+    """What `build --json` saves and `--compare` reads back."""
+
+    version: int
+    corpus_version: int
+    seed: int
+    jobs: int
+    python: str
+    machine: str
+    results: List[BuildRow]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark DocSmith builder hot paths.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    nav_parser = subparsers.add_parser("nav", help="Time navigation generation as the page count grows.")
+    nav_parser.add_argument("--sizes", default="1000,2500,5000,10000,20000", help="Comma-separated page counts.")
+    nav_parser.add_argument("--sample", type=int, default=200, help="Pages timed per size (spread across directories).")
+    nav_parser.add_argument(
+        "--legacy-sample",
+        type=int,
+        default=10,
+        help="Pages timed with the previous per-page implementation (0 to skip).",
+    )
+    nav_parser.add_argument("--json", dest="json_path", help="Also write results to this JSON file.")
+
+    inline_parser = subparsers.add_parser("inline", help="Compare render_inline with the previous regex cascade.")
+    inline_parser.add_argument("--root", default=str(docs.REPO_ROOT), help="Directory scanned for Markdown files.")
+    inline_parser.add_argument("--repeat", type=int, default=5, help="Timed passes over the collected fragments.")
+    inline_parser.add_argument("--json", dest="json_path", help="Also write results to this JSON file.")
+
+    build_parser = subparsers.add_parser("build", help="Time whole builds of generated repositories.")
+    build_parser.add_argument("--sizes", default="1000,10000,50000", help="Comma-separated Markdown file counts.")
+    build_parser.add_argument("--seed", type=int, default=1, help="Seed for the generated corpus.")
+    build_parser.add_argument(
+        "--work-dir",
+        default=str(Path(tempfile.gettempdir()) / "docsmith-bench"),
+        help="Where generated repositories are kept between runs.",
+    )
+    build_parser.add_argument(
+        "--builder",
+        default=str(Path(__file__).resolve().with_name("build_docs_site.py")),
+        help="build_docs_site.py to benchmark.",
+    )
+    build_parser.add_argument("--jobs", type=int, default=0, help="Passed through to the builder (0 = all CPUs).")
+    build_parser.add_argument("--repeat", type=int, default=1, help="Runs per scenario; the fastest is kept.")
+    build_parser.add_argument("--json", dest="json_path", help="Write the results as a baseline to this JSON file.")
+    build_parser.add_argument("--compare", metavar="BASELINE", help="Compare against a baseline written by --json.")
+    build_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.10,
+        help="Relative slowdown or growth reported as a regression (default 0.10).",
+    )
+
+    api_parser = subparsers.add_parser(
+        "api", help="Compare one-page edits rebuilt by a new process with warm in-process build_site() calls."
+    )
+    api_parser.add_argument("--sizes", default="1000,10000", help="Comma-separated Markdown file counts.")
+    api_parser.add_argument("--seed", type=int, default=1, help="Seed for the generated corpus.")
+    api_parser.add_argument(
+        "--work-dir",
+        default=str(Path(tempfile.gettempdir()) / "docsmith-bench"),
+        help="Where generated repositories are kept between runs.",
+    )
+    api_parser.add_argument("--jobs", type=int, default=0, help="Render workers for both (0 = all CPUs).")
+    api_parser.add_argument("--repeat", type=int, default=3, help="Edits timed per mode; the fastest is kept.")
+    api_parser.add_argument("--json", dest="json_path", help="Also write results to this JSON file.")
+
+    serve_parser = subparsers.add_parser(
+        "serve", help="Time startup and page requests of build_docs_site.py --serve and record its peak RSS."
+    )
+    serve_parser.add_argument("--sizes", default="1000,10000", help="Comma-separated Markdown file counts.")
+    serve_parser.add_argument("--seed", type=int, default=1, help="Seed for the generated corpus.")
+    serve_parser.add_argument(
+        "--work-dir",
+        default=str(Path(tempfile.gettempdir()) / "docsmith-bench"),
+        help="Where generated repositories are kept between runs.",
+    )
+    serve_parser.add_argument("--requests", type=int, default=500, help="Distinct pages requested per corpus.")
+    serve_parser.add_argument("--cache-mb", type=int, default=docs.SERVE_CACHE_MB, help="--serve-cache-mb of the server.")
+    serve_parser.add_argument("--json", dest="json_path", help="Also write results to this JSON file.")
+
+    markdown_parser = subparsers.add_parser(
+        "markdown", help="Compare the block tokenizer pipeline with the previous per-consumer line scans."
+    )
+    markdown_parser.add_argument("--sizes", default="1000,10000,50000", help="Comma-separated line counts per file.")
+    markdown_parser.add_argument("--seed", type=int, default=1, help="Seed for the generated Markdown.")
+    markdown_parser.add_argument("--repeat", type=int, default=3, help="Runs per pipeline; the fastest is kept.")
+    markdown_parser.add_argument("--json", dest="json_path", help="Also write results to this JSON file.")
+
+    discover_parser = subparsers.add_parser("discover", help="Time source discovery in generated monorepos.")
+    discover_parser.add_argument("--sizes", default="100000,500000", help="Comma-separated total file counts.")
+    discover_parser.add_argument(
+        "--work-dir",
+        default=str(Path(tempfile.gettempdir()) / "docsmith-bench"),
+        help="Where generated repositories are kept between runs.",
+    )
+    discover_parser.add_argument("--repeat", type=int, default=3, help="Runs per method; the fastest is kept.")
+    discover_parser.add_argument("--json", dest="json_path", help="Also write results to this JSON file.")
+
+    args = parser.parse_args()
+    status = 0
+    results: object
+    if args.command == "nav":
+        sizes = [int(value) for value in args.sizes.split(",") if value.strip()]
+        results = bench_navigation(sizes, args.sample, args.legacy_sample)
+    elif args.command == "inline":
+        results = bench_inline(Path(args.root), args.repeat)
+    elif args.command == "markdown":
+        sizes = [int(value) for value in args.sizes.split(",") if value.strip()]
+        results = bench_markdown(sizes, args.seed, args.repeat)
+    elif args.command == "api":
+        sizes = [int(value) for value in args.sizes.split(",") if value.strip()]
+        builder = Path(__file__).resolve().with_name("build_docs_site.py")
+        results = bench_api(sizes, args.seed, Path(args.work_dir), builder, args.jobs, args.repeat)
+    elif args.command == "serve":
+        sizes = [int(value) for value in args.sizes.split(",") if value.strip()]
+        builder = Path(__file__).resolve().with_name("build_docs_site.py")
+        results = bench_serve(sizes, args.seed, Path(args.work_dir), builder, args.requests, args.cache_mb)
+    elif args.command == "discover":
+        sizes = [int(value) for value in args.sizes.split(",") if value.strip()]
+        results = bench_discovery(sizes, Path(args.work_dir), args.repeat)
+    elif args.command == "build":
+        sizes = [int(value) for value in args.sizes.split(",") if value.strip()]
+        report = bench_builds(sizes, args.seed, Path(args.work_dir), Path(args.builder), args.jobs, args.repeat)
+        results = report
+        if args.compare:
+            baseline = cast(BuildReport, json.loads(Path(args.compare).read_text(encoding="utf-8")))
+            if compare_baseline(baseline, report, args.threshold):
+                status = 1
+    else:
+        raise SystemExit(f"Unknown command: {args.command}")
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    return status
+
+
+def synthetic_site(page_count: int) -> Tuple[Dict[Path, Path], Dict[Path, str]]:
+    """Spread pages over nav sections and nested directories of ~40 pages each."""
+    source_to_output: Dict[Path, Path] = {}
+    titles: Dict[Path, str] = {}
+    for index in range(page_count):
+        section = NAV_SECTIONS[index % len(NAV_SECTIONS)]
+        folder = f"area_{index // 40 % 25}/topic_{index // 1000}"
+        name = "README.md" if index % 40 == 0 else f"page_{index}.md"
+        source = Path("docs", section, folder, name) if section else Path("docs", folder, name)
+        source_to_output[source] = docs.map_output_path(source)
+        titles[source] = f"Synthetic page {index}"
+    return source_to_output, titles
+
+
+def sample_sources(sources: List[Path], count: int) -> List[Path]:
+    if count <= 0:
+        return []
+    step = max(1, len(sources) // count)
+    return sources[::step][:count]
+
+
+def bench_navigation(sizes: List[int], sample: int, legacy_sample: int) -> List[Dict[str, object]]:
+    """Time per-page navigation with `--shared-nav`, embedded in every page, and the previous code.
+
+    Shared-nav pages embed their directory and its parents' index pages, so
+    their cost follows depth and siblings; the embedded tree grows with the site.
+    """
+    results: List[Dict[str, object]] = []
+    print(
+        f"{'pages':>7} {'model ms':>9} {'page us':>9} {'total s':>8} {'nav KB/page':>11}"
+        f" {'embedded us':>11} {'embedded KB':>11} {'legacy page us':>15}"
+    )
+    for size in sizes:
+        source_to_output, titles = synthetic_site(size)
+        sources = sorted(source_to_output)
+
+        started = time.perf_counter()
+        nav_model = docs.build_nav_model(source_to_output, titles)
+        model_seconds = time.perf_counter() - started
+
+        timed = sample_sources(sources, sample)
+        timings: Dict[str, Tuple[float, int]] = {}
+        for name, render in (("shared", docs.build_shared_navigation), ("embedded", docs.build_navigation)):
+            nav_bytes = 0
+            started = time.perf_counter()
+            for source in timed:
+                output = source_to_output[source]
+                nav_bytes += len(render(source, output, nav_model))
+                docs.build_top_navigation(source, output, nav_model)
+            timings[name] = ((time.perf_counter() - started) / max(1, len(timed)), nav_bytes // max(1, len(timed)))
+        page_seconds, nav_bytes_per_page = timings["shared"]
+
+        legacy_page_seconds = None
+        legacy_timed = sample_sources(sources, legacy_sample)
+        if legacy_timed:
+            started = time.perf_counter()
+            for source in legacy_timed:
+                output = source_to_output[source]
+                legacy_build_navigation(source, output, source_to_output, titles)
+                legacy_build_top_navigation(source, output, source_to_output)
+            legacy_page_seconds = (time.perf_counter() - started) / len(legacy_timed)
+
+        row: Dict[str, object] = {
+            "pages": size,
+            "model_seconds": model_seconds,
+            "page_seconds": page_seconds,
+            "total_seconds": model_seconds + page_seconds * size,
+            "nav_bytes_per_page": nav_bytes_per_page,
+            "embedded_page_seconds": timings["embedded"][0],
+            "embedded_nav_bytes_per_page": timings["embedded"][1],
+            "legacy_page_seconds": legacy_page_seconds,
+        }
+        results.append(row)
+        legacy_text = f"{legacy_page_seconds * 1e6:15.0f}" if legacy_page_seconds is not None else f"{'-':>15}"
+        print(
+            f"{size:7d} {model_seconds * 1e3:9.1f} {page_seconds * 1e6:9.1f} {model_seconds + page_seconds * size:8.2f} "
+            f"{nav_bytes_per_page / 1024:11.1f} {timings['embedded'][0] * 1e6:11.1f} "
+            f"{timings['embedded'][1] / 1024:11.1f} {legacy_text}"
+        )
+    return results
+
+
+def collect_inline_fragments(root: Path) -> List[Tuple[Path, str]]:
+    """Collect the text render_inline sees: paragraph lines, list items, headings and table cells."""
+    fragments: List[Tuple[Path, str]] = []
+    for path in sorted(root.rglob("*.md")):
+        rel = path.relative_to(root)
+        if rel.parts[:2] == ("docs", "site") or any(part.startswith(".") for part in rel.parts):
+            continue
+        in_fence = False
+        for line in path.read_text(encoding="utf-8", errors="replace").splitlines():
+            stripped = line.strip()
+            if stripped.startswith("```"):
+                in_fence = not in_fence
+                continue
+            if in_fence or not stripped or docs.TABLE_DIVIDER_RE.match(stripped):
+                continue
+            if "|" in stripped:
+                fragments.extend((rel, cell) for cell in docs.split_table_row(stripped) if cell)
+                continue
+            stripped = re.sub(r"^(#{1,6}\s+|[-*]\s+|\d+\.\s+)", "", stripped)
+            fragments.append((rel, stripped))
+    return fragments
+
+
+def bench_inline(root: Path, repeat: int) -> Dict[str, object]:
+    fragments = collect_inline_fragments(root)
+    if not fragments:
+        raise SystemExit(f"No Markdown fragments found under {root}")
+    sources = sorted({source for source, _text in fragments})
+    source_to_output = {source: docs.map_output_path(source) for source in sources}
+    link_heavy = " ".join(f"[link {index} `code`](page_{index}.md) **bold**" for index in range(2000))
+    cases = [("real-world fragments", fragments), ("2000-link line", [(sources[0], link_heavy)])]
+
+    rows: List[Dict[str, object]] = []
+    results: Dict[str, object] = {"root": str(root), "fragments": len(fragments), "cases": rows}
+    print(f"{'case':<22} {'items':>7} {'legacy ms':>10} {'lexer ms':>10} {'speedup':>8} {'mismatches':>11}")
+    for name, items in cases:
+        mismatches = 0
+        for source, text in items:
+            output = source_to_output[source]
+            expected = legacy_render_inline(text, source, output, source_to_output)
+            if "@@PLACEHOLDER_" in expected:
+                continue
+            if docs.render_inline(text, source, output, source_to_output) != expected:
+                mismatches += 1
+
+        timings = {}
+        for label, render in (("legacy", legacy_render_inline), ("lexer", docs.render_inline)):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                for source, text in items:
+                    render(text, source, source_to_output[source], source_to_output)
+            timings[label] = (time.perf_counter() - started) / repeat
+        row = {
+            "case": name,
+            "items": len(items),
+            "legacy_seconds": timings["legacy"],
+            "lexer_seconds": timings["lexer"],
+            "mismatches": mismatches,
+        }
+        rows.append(row)
+        print(
+            f"{name:<22} {len(items):7d} {timings['legacy'] * 1e3:10.2f} {timings['lexer'] * 1e3:10.2f} "
+            f"{timings['legacy'] / max(timings['lexer'], 1e-9):7.1f}x {mismatches:11d}"
+        )
+    return results
+
+
+def synthetic_markdown(rng: random.Random, line_count: int) -> List[str]:
+    """A long page cycling through headings, paragraphs, lists, tables and code fences."""
+    words = ["alpha", "beta", "gamma", "delta", "render", "index", "build", "page", "cache", "token"]
+    lines = ["# Large generated page", ""]
+    section = 0
+    while len(lines) < line_count:
+        section += 1
+        lines += [f"## Section {section}", ""]
+        for _ in range(rng.randint(2, 5)):
+            lines.append(
+                " ".join(rng.choice(words) for _ in range(8))
+                + f" see [page {section}](../api/page_{section % 50}.md#section-{section}) and `code` **bold**"
+            )
+        lines.append("")
+        lines += [f"- {rng.choice(words)} item {index} with *emphasis*" for index in range(rng.randint(3, 8))]
+        lines.append("")
+        lines += [f"{index + 1}. step {rng.choice(words)}" for index in range(rng.randint(2, 5))]
+        lines += ["", f"### Details {section}", "", "| Name | Value | Link |", "| --- | --- | --- |"]
+        lines += [f"| {rng.choice(words)} | {index} | [x](page_{index}.md) |" for index in range(rng.randint(3, 10))]
+        lines += ["", "```python"]
+        lines += [f"value_{index} = compute({index})  # [not a link](x.md)" for index in range(rng.randint(3, 15))]
+        lines += ["```", ""]
+    return lines[:line_count]
+
+
+def bench_markdown(sizes: List[int], seed: int, repeat: int) -> List[Dict[str, object]]:
+    """Time title, HTML, table of contents, search entry and link collection for one large page.
+
+    "full" includes inline rendering (uncached, as for a changed page); "blocks"
+    stubs it out to isolate the block-level parsing the tokenizer replaced.
+    Link resolution is memoized as in a build.
+    """
+    source = Path("docs/guides/large.md")
+    output = docs.map_output_path(source)
+    source_to_output = {source: output}
+    for index in range(50):
+        target = Path(f"docs/api/page_{index}.md")
+        source_to_output[target] = docs.map_output_path(target)
+
+    def legacy_pipeline(lines: List[str]) -> str:
+        title = legacy_extract_title(source, lines)
+        headings: List[Tuple[int, str, str]] = []
+        content = legacy_render_markdown(lines, source, output, source_to_output, headings)
+        docs.build_table_of_contents(headings)
+        legacy_collect_search_entry(lines, title, False)
+        legacy_collect_links(lines, source)
+        return content
+
+    def model_pipeline(lines: List[str]) -> str:
+        title = docs.extract_title(source, lines)
+        links: List[str] = []
+        blocks = docs.parse_markdown(lines)
+        content = docs.render_markdown(blocks, source, output, source_to_output, links)
+        docs.build_table_of_contents(docs.document_headings(blocks))
+        docs.collect_search_entry(blocks, title)
+        docs.collect_links(links, source)
+        return content
+
+    def fastest(run, lines: List[str]) -> float:
+        best = float("inf")
+        for _ in range(max(1, repeat)):
+            started = time.perf_counter()
+            run(lines)
+            best = min(best, time.perf_counter() - started)
+        return best
+
+    results: List[Dict[str, object]] = []
+    print(f"{'lines':>7} {'mode':<7} {'legacy ms':>10} {'model ms':>10} {'speedup':>8} {'parse ms':>9} {'identical':>9}")
+    render_inline = docs.render_inline
+    with docs.use_build(docs.BuildContext(docs.REPO_ROOT)):
+        docs.configure_render_caches(docs.LINK_CACHE_SIZE, 0)
+        try:
+            for size in sizes:
+                lines = synthetic_markdown(random.Random(f"{seed}:{size}"), size)
+                for mode in ("full", "blocks"):
+                    if mode == "blocks":
+                        docs.render_inline = lambda text, *args: text
+                    identical = legacy_pipeline(lines) == model_pipeline(lines)
+                    legacy_seconds = fastest(legacy_pipeline, lines)
+                    model_seconds = fastest(model_pipeline, lines)
+                    parse_seconds = fastest(docs.parse_markdown, lines)
+                    docs.render_inline = render_inline
+                    results.append({
+                        "lines": size,
+                        "mode": mode,
+                        "legacy_seconds": legacy_seconds,
+                        "model_seconds": model_seconds,
+                        "parse_seconds": parse_seconds,
+                        "identical": identical,
+                    })
+                    print(
+                        f"{size:7d} {mode:<7} {legacy_seconds * 1e3:10.1f} {model_seconds * 1e3:10.1f} "
+                        f"{legacy_seconds / max(model_seconds, 1e-9):7.2f}x {parse_seconds * 1e3:9.1f} {str(identical):>9}",
+                        flush=True,
+                    )
+        finally:
+            docs.render_inline = render_inline
+    return results
+
+
+def corpus_vocabulary(rng: random.Random, size: int = 4000) -> Tuple[List[str], List[float]]:
+    """Pronounceable words with Zipf-distributed cumulative weights, like real prose."""
+    syllables = [consonant + vowel for consonant in "bcdfghklmnprstvz" for vowel in "aeiou"]
+    words: Dict[str, None] = {}
+    while len(words) < size:
+        words["".join(rng.choice(syllables) for _ in range(rng.randint(1, 4)))] = None
+    cumulative = list(itertools.accumulate(1.0 / rank for rank in range(1, size + 1)))
+    return list(words), cumulative
+
+
+def corpus_paths(size: int) -> List[Path]:
+    """Lay out `size` sources the way a real repository spreads them."""
+    paths: List[Path] = []
+    for index in range(size):
+        bucket = index % 20
+        if bucket == 0:
+            paths.append(Path("src", f"package_{index // 20 % 60}", f"module_{index}", "README.md"))
+        elif bucket == 1:
+            paths.append(Path("tests", f"suite_{index // 20 % 30}", f"case_{index}.md"))
+        elif bucket == 2 and index % 40 == 2:
+            paths.append(Path("docs", "diagrams", f"area_{index // 40 % 20}", f"flow_{index}.mmd"))
+        else:
+            section = CORPUS_SECTIONS[index % len(CORPUS_SECTIONS)]
+            folder = Path("docs", section, f"area_{index // 120 % 25}", f"topic_{index // 3000}")
+            paths.append(folder / ("README.md" if index % 120 in range(3, 9) else f"page_{index}.md"))
+    return paths
+
+
+def corpus_page(rng: random.Random, index: int, path: Path, paths: List[Path], vocabulary, weights) -> str:
+    def words(count: int) -> str:
+        return " ".join(rng.choices(vocabulary, cum_weights=weights, k=count))
+
+    def link() -> str:
+        target = paths[rng.randrange(len(paths))]
+        href = posixpath.relpath(target.as_posix(), path.parent.as_posix())
+        if rng.random() < 0.3:
+            href += "#section-1"
+        return f"[{words(2)}]({href})"
+
+    if path.suffix == ".mmd":
+        nodes = [f"N{node}[{words(1)}]" for node in range(rng.randint(3, 12))]
+        edges = [f"  {nodes[node - 1].split('[')[0]} --> {nodes[node]}" for node in range(1, len(nodes))]
+        return "\n".join([f"%% {words(3).title()} flow {index}", "graph TD", f"  {nodes[0]}", *edges]) + "\n"
+
+    lines = [f"# {words(3).title()} {index}", "", f"{words(rng.randint(15, 40))} {link()} and `{words(1)}`.", ""]
+    for section in range(1, rng.randint(2, 6)):
+        lines += [f"## Section {section}", "", f"{words(rng.randint(20, 60))} **{words(2)}** see {link()}.", ""]
+        kind = rng.randrange(5)
+        if kind == 0:
+            lines += [f"| {words(1)} | {words(1)} | Notes |", "| --- | --- | --- |"]
+            lines += [f"| `{words(1)}` | {rng.randint(1, 999)} | {words(4)} {link()} |" for _ in range(rng.randint(2, 8))]
+        elif kind == 1:
+            lines += [f"- {words(rng.randint(3, 10))} {link()}" for _ in range(rng.randint(2, 6))]
+            lines += [f"{item}. {words(rng.randint(3, 8))}" for item in range(1, rng.randint(2, 5))]
+        elif kind == 2:
+            lines += ["```python", f"def {words(1)}_{index}(value):", f"    return value * {rng.randint(2, 9)}", "```"]
+        elif kind == 3:
+            lines += ["```mermaid", "graph LR", f"  A[{words(1)}] --> B[{words(1)}]", "```"]
+        else:
+            lines += [f"### {words(2).title()}", "", words(rng.randint(30, 80))]
+        lines.append("")
+    return "\n".join(lines)
+
+
+def generate_corpus(root: Path, size: int, seed: int) -> None:
+    """Write a repository of `size` sources with a history that includes `Release` commits."""
+    rng = random.Random(f"{seed}:{size}")
+    vocabulary, weights = corpus_vocabulary(rng)
+    paths = corpus_paths(size)
+    if root.exists():
+        shutil.rmtree(root)
+    for index, path in enumerate(paths):
+        target = root / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(corpus_page(rng, index, path, paths, vocabulary, weights), encoding="utf-8")
+    (root / "Readme.md").write_text(f"# Bench corpus\n\n{size} generated sources (seed {seed}).\n", encoding="utf-8")
+    (root / ".gitignore").write_text("/utils/\n/docs/site/\n/.docsmith-cache/\n", encoding="utf-8")
+
+    def git(*command: str, when: int) -> None:
+        stamp = f"@{when} +0000"
+        env = {**os.environ, "GIT_AUTHOR_DATE": stamp, "GIT_COMMITTER_DATE": stamp}
+        subprocess.run(
+            ["git", "-c", "user.name=Bench", "-c", "user.email=bench@example.invalid", *command],
+            cwd=root,
+            env=env,
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+
+    git("init", "-q", when=CORPUS_DATE)
+    git("add", "-A", when=CORPUS_DATE)
+    git("commit", "-q", "-m", "Initial import", when=CORPUS_DATE)
+    for number in range(1, CORPUS_COMMITS + 1):
+        when = CORPUS_DATE + number * 86400
+        touched = rng.sample(range(len(paths)), max(1, len(paths) // 100))
+        for index in touched:
+            with open(root / paths[index], "a", encoding="utf-8") as handle:
+                handle.write(f"\nRevision {number} note.\n")
+        git("add", "-A", when=when)
+        day = time.strftime("%Y%m%d", time.gmtime(when))
+        subject = f"Release {day}.{number:03d}" if number % 3 == 0 else f"Update {len(touched)} pages"
+        git("commit", "-q", "-m", subject, when=when)
+
+
+def prepare_corpus(work_dir: Path, size: int, seed: int, builder: Path) -> Path:
+    root = work_dir / f"corpus-{size}-seed{seed}-v{CORPUS_VERSION}"
+    marker = root / ".git" / "docsmith-bench"
+    if not marker.exists():
+        print(f"Generating {size} sources in {root} ...", flush=True)
+        generate_corpus(root, size, seed)
+        marker.write_text("complete\n", encoding="utf-8")
+    target = root / "utils" / "docs" / "build_docs_site.py"
+    target.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(builder, target)
+    return root
+
+
+def run_build(root: Path, jobs: int) -> BuildRun:
+    """Run one build in a child process and collect its wall time, stages, peak RSS and output size."""
+    timings_path = root / ".docsmith-cache" / "bench-timings.json"
+    command = [
+        sys.executable, "utils/docs/build_docs_site.py", "--jobs", str(jobs), "--timings", str(timings_path),
+        "--mermaid-cdn",
+    ]
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=root, stdout=subprocess.DEVNULL)
+    _pid, status, usage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - started
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        raise SystemExit(f"Build failed in {root} (exit {process.returncode})")
+    timings = json.loads(timings_path.read_text(encoding="utf-8"))
+    output_bytes = 0
+    for directory, _dirs, files in os.walk(root / "docs" / "site"):
+        output_bytes += sum(os.path.getsize(os.path.join(directory, name)) for name in files)
+    return {
+        "wall_seconds": wall,
+        "pages_per_second": timings["pages"] / wall,
+        "rendered": timings["rendered"],
+        "stages": timings["stages"],
+        "peak_rss_kb": usage.ru_maxrss,
+        "output_bytes": output_bytes,
+    }
+
+
+def run_scenario(root: Path, scenario: str, jobs: int) -> BuildRun:
+    if scenario == "full":
+        shutil.rmtree(root / "docs" / "site", ignore_errors=True)
+        shutil.rmtree(root / ".docsmith-cache", ignore_errors=True)
+        return run_build(root, jobs)
+    if scenario == "noop":
+        return run_build(root, jobs)
+    # One page in the middle of the tree changes, as in a typical edit-and-rebuild loop.
+    sources = sorted((root / "docs" / "guides").rglob("*.md"))
+    edited = sources[len(sources) // 2]
+    original = edited.read_bytes()
+    edited.write_bytes(original + b"\nBench edit.\n")
+    try:
+        return run_build(root, jobs)
+    finally:
+        edited.write_bytes(original)
+
+
+def bench_builds(sizes: List[int], seed: int, work_dir: Path, builder: Path, jobs: int, repeat: int) -> BuildReport:
+    results: List[BuildRow] = []
+    print(f"{'pages':>7} {'scenario':<8} {'wall s':>8} {'pages/s':>9} {'rendered':>8} {'peak MB':>8} {'output MB':>9}  slowest stages")
+    for size in sizes:
+        root = prepare_corpus(work_dir, size, seed, builder)
+        for scenario in SCENARIOS:
+            best = min((run_scenario(root, scenario, jobs) for _ in range(max(1, repeat))), key=lambda run: run["wall_seconds"])
+            row: BuildRow = {"pages": size, "scenario": scenario, **best}
+            results.append(row)
+            stages = sorted(row["stages"].items(), key=lambda item: -item[1])[:3]
+            print(
+                f"{size:7d} {scenario:<8} {row['wall_seconds']:8.2f} {row['pages_per_second']:9.0f} "
+                f"{row['rendered']:8d} {row['peak_rss_kb'] / 1024:8.1f} {row['output_bytes'] / 1e6:9.1f}  "
+                + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in stages),
+                flush=True,
+            )
+    return {
+        "version": BASELINE_VERSION,
+        "corpus_version": CORPUS_VERSION,
+        "seed": seed,
+        "jobs": jobs,
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()} ({os.cpu_count()} CPUs)",
+        "results": results,
+    }
+
+
+def bench_api(sizes: List[int], seed: int, work_dir: Path, builder: Path, jobs: int, repeat: int) -> List[Dict[str, object]]:
+    """Time a one-page edit rebuilt by a fresh command-line process and by a warm `build_site()` into a dict."""
+    results: List[Dict[str, object]] = []
+    print(f"{'pages':>7} {'cli edit s':>10} {'api cold s':>10} {'api noop s':>10} {'api edit s':>10} {'speedup':>8}")
+    for size in sizes:
+        root = prepare_corpus(work_dir, size, seed, builder)
+        run_build(root, jobs)
+        cli_seconds = min(run_scenario(root, "edit", jobs)["wall_seconds"] for _ in range(max(1, repeat)))
+
+        files: Dict[str, bytes] = {}
+        config = docs.BuildConfig(root, output=files, jobs=jobs, mermaid_cdn=True)
+        started = time.perf_counter()
+        docs.build_site(config)
+        cold_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        docs.build_site(config)
+        noop_seconds = time.perf_counter() - started
+        edited = sorted((root / "docs" / "guides").rglob("*.md"))[size // 1000]
+        original = edited.read_bytes()
+        api_seconds = float("inf")
+        for run in range(max(1, repeat)):
+            edited.write_bytes(original + f"\nBench edit {run}.\n".encode("utf-8"))
+            try:
+                started = time.perf_counter()
+                result = docs.build_site(config)
+                api_seconds = min(api_seconds, time.perf_counter() - started)
+            finally:
+                edited.write_bytes(original)
+            if len(result.rendered) != 1:
+                raise SystemExit(f"Expected one re-rendered page, got {len(result.rendered)}")
+        docs.build_site(config)
+
+        row: Dict[str, object] = {
+            "pages": size,
+            "cli_edit_seconds": cli_seconds,
+            "api_cold_seconds": cold_seconds,
+            "api_noop_seconds": noop_seconds,
+            "api_edit_seconds": api_seconds,
+            "output_files": len(files),
+        }
+        results.append(row)
+        print(
+            f"{size:7d} {cli_seconds:10.2f} {cold_seconds:10.2f} {noop_seconds:10.2f} {api_seconds:10.2f} "
+            f"{cli_seconds / api_seconds:7.1f}x",
+            flush=True,
+        )
+    return results
+
+
+def bench_serve(
+    sizes: List[int], seed: int, work_dir: Path, builder: Path, requests: int, cache_mb: int
+) -> List[Dict[str, object]]:
+    """Start `--serve` on each corpus, request pages cold then warm, and record the server's peak RSS.
+
+    The render cache is disabled so cold requests really render. Pages are
+    requested in a shuffled order, then the last ones again while cached.
+    """
+    results: List[Dict[str, object]] = []
+    print(
+        f"{'pages':>7} {'startup s':>9} {'cold p50 ms':>11} {'cold p95 ms':>11} {'warm p50 ms':>11} {'peak MB':>8}"
+    )
+    for size in sizes:
+        root = prepare_corpus(work_dir, size, seed, builder)
+        sources = sorted(
+            path.relative_to(root)
+            for path in (root / "docs").rglob("*")
+            if path.suffix in (".md", ".mmd") and "site" not in path.relative_to(root).parts
+        )
+        outputs = [docs.map_output_path(source).as_posix() for source in sources]
+        random.Random(seed).shuffle(outputs)
+        outputs = outputs[:requests]
+        command = [
+            sys.executable, "utils/docs/build_docs_site.py", "--serve", "--port", "0",
+            "--render-cache-mb", "0", "--serve-cache-mb", str(cache_mb), "--mermaid-cdn",
+        ]
+        started = time.perf_counter()
+        process = subprocess.Popen(command, cwd=root, stdout=subprocess.PIPE, text=True)
+        try:
+            url = ""
+            for line in process.stdout or ():
+                match = re.search(r"at (http://\S+/)", line)
+                if match:
+                    url = match.group(1)
+                    break
+            if not url:
+                raise SystemExit(f"--serve did not start in {root}")
+            startup = time.perf_counter() - started
+            cold = [timed_request(url + output) for output in outputs]
+            warm = [timed_request(url + output) for output in outputs[-100:]]
+        finally:
+            process.send_signal(signal.SIGINT)
+            _pid, _status, usage = os.wait4(process.pid, 0)
+        cold.sort()
+        warm.sort()
+        row: Dict[str, object] = {
+            "pages": size,
+            "startup_seconds": startup,
+            "cold_p50_ms": cold[len(cold) // 2] * 1000,
+            "cold_p95_ms": cold[int(len(cold) * 0.95)] * 1000,
+            "warm_p50_ms": warm[len(warm) // 2] * 1000,
+            "peak_rss_kb": usage.ru_maxrss,
+        }
+        results.append(row)
+        print(
+            f"{size:7d} {startup:9.2f} {row['cold_p50_ms']:11.1f} {row['cold_p95_ms']:11.1f} "
+            f"{row['warm_p50_ms']:11.2f} {usage.ru_maxrss / 1024:8.0f}",
+            flush=True,
+        )
+    return results
+
+
+def timed_request(url: str) -> float:
+    started = time.perf_counter()
+    with urllib.request.urlopen(url) as response:
+        response.read()
+    return time.perf_counter() - started
+
+
+def generate_monorepo(root: Path, size: int) -> None:
+    """Write a git repository of `size` files, most of them under ignored directories.
+
+    Roughly: 45% node_modules, 10% a virtualenv, 7% a stale docs/site and 5%
+    build output, all gitignored but inside the scanned `src/` and `docs/`
+    trees, plus 30% Python packages and 3% docs. Every directory has a README.
+    """
+    if root.exists():
+        shutil.rmtree(root)
+    layout = [
+        (0.45, "src/web/node_modules/pkg_{dir}/lib", "f_{index}.js", 50),
+        (0.10, "src/service/.venv/lib/python3/site-packages/pkg_{dir}", "m_{index}.py", 50),
+        (0.07, "docs/site/area_{dir}", "page_{index}.html", 200),
+        (0.05, "src/service/build/out_{dir}", "obj_{index}.o", 200),
+        (0.30, "src/pkg_{dir}", "mod_{index}.py", 20),
+        (0.03, "docs/area_{dir}", "page_{index}.md", 40),
+    ]
+    index = 0
+    for share, folder, name, per_dir in layout:
+        count = int(size * share)
+        for offset in range(count):
+            directory = root / folder.format(dir=offset // per_dir)
+            if offset % per_dir == 0:
+                directory.mkdir(parents=True, exist_ok=True)
+                (directory / "README.md").write_text("# Package\n", encoding="utf-8")
+            (directory / name.format(index=index)).write_text("x\n", encoding="utf-8")
+            index += 1
+    (root / "src" / "service" / ".venv" / "pyvenv.cfg").write_text("home = /usr/bin\n", encoding="utf-8")
+    (root / "Readme.md").write_text("# Monorepo\n", encoding="utf-8")
+    (root / ".gitignore").write_text("node_modules/\n.venv/\nbuild/\n/docs/site/\n", encoding="utf-8")
+    for command in (["init", "-q"], ["add", "-A"]):
+        subprocess.run(["git", *command], cwd=root, check=True, stdout=subprocess.DEVNULL)
+
+
+def bench_discovery(sizes: List[int], work_dir: Path, repeat: int) -> List[Dict[str, object]]:
+    """Compare `git ls-files` discovery and the pruned walk with the previous glob per pattern."""
+    results: List[Dict[str, object]] = []
+    print(f"{'files':>8} {'sources':>8} {'git ms':>8} {'walk ms':>8} {'legacy ms':>10} {'legacy sources':>15}")
+    for size in sizes:
+        root = work_dir / f"monorepo-{size}-v{MONOREPO_VERSION}"
+        marker = root / ".git" / "docsmith-bench"
+        if not marker.exists():
+            print(f"Generating {size} files in {root} ...", flush=True)
+            generate_monorepo(root, size)
+            marker.write_text("complete\n", encoding="utf-8")
+        timings: Dict[str, float] = {}
+        counts: Dict[str, int] = {}
+        methods: List[Tuple[str, Callable[[], List[Path]]]] = [
+            ("git", lambda: docs.collect_sources()[0]),
+            ("walk", lambda: docs.collect_sources(use_git=False)[0]),
+            ("legacy", functools.partial(legacy_collect_sources, root)),
+        ]
+        with docs.use_build(docs.BuildContext(root)):
+            for name, method in methods:
+                for _ in range(max(1, repeat)):
+                    started = time.perf_counter()
+                    counts[name] = len(method())
+                    elapsed = time.perf_counter() - started
+                    timings[name] = min(timings.get(name, elapsed), elapsed)
+        if counts["git"] != counts["walk"]:
+            print(f"Warning: git found {counts['git']} sources but the walk found {counts['walk']}")
+        results.append({
+            "files": size,
+            "sources": counts["git"],
+            "git_seconds": timings["git"],
+            "walk_seconds": timings["walk"],
+            "legacy_seconds": timings["legacy"],
+            "legacy_sources": counts["legacy"],
+        })
+        print(
+            f"{size:8d} {counts['git']:8d} {timings['git'] * 1e3:8.0f} {timings['walk'] * 1e3:8.0f} "
+            f"{timings['legacy'] * 1e3:10.0f} {counts['legacy']:15d}",
+            flush=True,
+        )
+    return results
+
+
+def compare_baseline(baseline: BuildReport, current: BuildReport, threshold: float) -> bool:
+    """Print metrics that got worse than the baseline by more than `threshold`; return True if any did."""
+    if baseline.get("corpus_version") != current["corpus_version"] or baseline.get("seed") != current["seed"]:
+        print("Warning: baseline was recorded on a different corpus; comparisons may not be meaningful.")
+    previous = {(row["pages"], row["scenario"]): row for row in baseline.get("results", [])}
+    regressions: List[str] = []
+    for row in current["results"]:
+        old = previous.get((row["pages"], row["scenario"]))
+        if old is None:
+            continue
+        label = f"{row['pages']} {row['scenario']}"
+        metrics = [("wall_seconds", old["wall_seconds"], row["wall_seconds"])]
+        metrics += [(f"stage {name}", old["stages"].get(name, 0.0), seconds) for name, seconds in row["stages"].items()]
+        for metric, before, after in metrics:
+            if max(before, after) >= COMPARE_MIN_SECONDS and after > before * (1 + threshold):
+                regressions.append(f"{label}: {metric} {before:.3f}s -> {after:.3f}s")
+        sizes = [("peak_rss_kb", old["peak_rss_kb"], row["peak_rss_kb"]), ("output_bytes", old["output_bytes"], row["output_bytes"])]
+        for metric, size_before, size_after in sizes:
+            if size_after > size_before * (1 + threshold):
+                regressions.append(f"{label}: {metric} {size_before} -> {size_after}")
+    if regressions:
+        print(f"Regressions beyond {threshold:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+    else:
+        print(f"No regressions beyond {threshold:.0%}.")
+    return bool(regressions)
+
+
+# Previous inline renderer: a regex/placeholder cascade with a replace loop that
+# degrades quadratically on lines with many links. Kept as the comparison baseline.
+
+
+def legacy_render_inline(
+    text: str,
+    source_rel: Path,
+    output_rel: Path,
+    source_to_output: Dict[Path, Path],
+) -> str:
+    placeholders: Dict[str, str] = {}
+
+    def stash(value: str) -> str:
+        key = f"@@PLACEHOLDER_{len(placeholders)}@@"
+        placeholders[key] = value
+        return key
+
+    def format_label(value: str) -> str:
+        label_placeholders: Dict[str, str] = {}
+
+        def label_stash(fragment: str) -> str:
+            key = f"@@LABEL_{len(label_placeholders)}@@"
+            label_placeholders[key] = fragment
+            return key
+
+        formatted = re.sub(r"`([^`]+)`", lambda m: label_stash(f"<code>{html.escape(m.group(1))}</code>"), value)
+        formatted = html.escape(formatted)
+        formatted = re.sub(r"\*\*([^*]+)\*\*", r"<strong>\1</strong>", formatted)
+        formatted = re.sub(r"\*([^*]+)\*", r"<em>\1</em>", formatted)
+        for key, fragment in label_placeholders.items():
+            formatted = formatted.replace(key, fragment)
+        return formatted
+
+    def link_replacer(match: "re.Match[str]") -> str:
+        label = format_label(match.group(1).strip())
+        href = docs.resolve_link(match.group(2).strip(), source_rel, output_rel, source_to_output)
+        return stash(f"<a href=\"{html.escape(href, quote=True)}\">{label}</a>")
+
+    working = docs.LINK_RE.sub(link_replacer, text)
+    working = re.sub(r"`([^`]+)`", lambda m: stash(f"<code>{html.escape(m.group(1))}</code>"), working)
+    working = html.escape(working)
+    working = re.sub(r"\*\*([^*]+)\*\*", r"<strong>\1</strong>", working)
+    working = re.sub(r"\*([^*]+)\*", r"<em>\1</em>", working)
+    for key, value in placeholders.items():
+        working = working.replace(key, value)
+    return working
+
+
+# Previous Markdown handling, kept as the comparison baseline: the title, the
+# HTML (with headings for the table of contents), the search entry and the
+# link list each scanned the source lines separately, and the renderer tested
+# every line against each block pattern in turn.
+
+
+def legacy_extract_title(source_rel: Path, lines: Iterable[str]) -> str:
+    fallback = source_rel.stem.replace("_", " ").replace("-", " ").title()
+    is_diagram = source_rel.suffix.lower() == ".mmd"
+    heading_title = ""
+    for line in lines:
+        stripped = line.strip()
+        if is_diagram and stripped.startswith("%%"):
+            return stripped.strip("% ").strip() or fallback
+        if not heading_title and stripped.startswith("# "):
+            heading_title = stripped[2:].strip()
+            if not is_diagram:
+                return heading_title
+    return heading_title or fallback
+
+
+def legacy_render_markdown(
+    lines: List[str],
+    source_rel: Path,
+    output_rel: Path,
+    source_to_output: Dict[Path, Path],
+    headings: Optional[List[Tuple[int, str, str]]] = None,
+    links: Optional[List[str]] = None,
+) -> str:
+    """Render Markdown lines to HTML.
+
+    Appends (level, text, slug) of each heading to `headings` and each link
+    target as written (outside code spans and fences) to `links`.
+    """
+    html_parts: List[str] = []
+    list_stack: Optional[str] = None
+
+    def close_list() -> None:
+        nonlocal list_stack
+        if list_stack:
+            html_parts.append(f"</{list_stack}>")
+            list_stack = None
+
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        stripped = line.strip()
+
+        if not stripped:
+            close_list()
+            i += 1
+            continue
+
+        if stripped.startswith("```"):
+            close_list()
+            language = stripped[3:].strip().lower()
+            code_lines: List[str] = []
+            i += 1
+            while i < len(lines) and not lines[i].strip().startswith("```"):
+                code_lines.append(lines[i])
+                i += 1
+            if i < len(lines):
+                i += 1
+
+            code_body = "\n".join(code_lines)
+            if language == "mermaid":
+                html_parts.append(f"<pre class=\"mermaid\">{code_body}</pre>")
+            else:
+                class_name = f" class=\"language-{html.escape(language)}\"" if language else ""
+                html_parts.append(
+                    f"<pre><code{class_name}>{html.escape(code_body)}</code></pre>"
+                )
+            continue
+
+        heading_match = docs.HEADING_RE.match(stripped)
+        if heading_match:
+            close_list()
+            level = len(heading_match.group(1))
+            text = heading_match.group(2).strip()
+            slug = docs.slugify(text)
+            if headings is not None:
+                headings.append((level, text, slug))
+            html_parts.append(f"<h{level} id=\"{slug}\">{docs.render_inline(text, source_rel, output_rel, source_to_output, links)}</h{level}>")
+            i += 1
+            continue
+
+        if legacy_looks_like_table_header(lines, i):
+            close_list()
+            table_html, next_index = legacy_render_table(lines, i, source_rel, output_rel, source_to_output, links)
+            html_parts.append(table_html)
+            i = next_index
+            continue
+
+        ul_match = docs.UL_RE.match(line)
+        if ul_match:
+            if list_stack != "ul":
+                close_list()
+                list_stack = "ul"
+                html_parts.append("<ul>")
+            item_text = ul_match.group(1).strip()
+            html_parts.append(
+                f"<li>{docs.render_inline(item_text, source_rel, output_rel, source_to_output, links)}</li>"
+            )
+            i += 1
+            continue
+
+        ol_match = docs.OL_RE.match(line)
+        if ol_match:
+            if list_stack != "ol":
+                close_list()
+                list_stack = "ol"
+                html_parts.append("<ol>")
+            item_text = ol_match.group(1).strip()
+            html_parts.append(
+                f"<li>{docs.render_inline(item_text, source_rel, output_rel, source_to_output, links)}</li>"
+            )
+            i += 1
+            continue
+
+        close_list()
+        paragraph_lines = [stripped]
+        i += 1
+        while i < len(lines):
+            candidate = lines[i].strip()
+            if not candidate:
+                break
+            if candidate.startswith("```"):
+                break
+            if docs.HEADING_RE.match(candidate):
+                break
+            if docs.UL_RE.match(lines[i]) or docs.OL_RE.match(lines[i]):
+                break
+            if legacy_looks_like_table_header(lines, i):
+                break
+            paragraph_lines.append(candidate)
+            i += 1
+
+        paragraph_text = " ".join(paragraph_lines)
+        html_parts.append(
+            f"<p>{docs.render_inline(paragraph_text, source_rel, output_rel, source_to_output, links)}</p>"
+        )
+
+    close_list()
+    return "\n".join(html_parts)
+
+
+def legacy_looks_like_table_header(lines: List[str], index: int) -> bool:
+    if index + 1 >= len(lines):
+        return False
+    return "|" in lines[index] and bool(docs.TABLE_DIVIDER_RE.match(lines[index + 1].strip()))
+
+
+def legacy_render_table(
+    lines: List[str],
+    start: int,
+    source_rel: Path,
+    output_rel: Path,
+    source_to_output: Dict[Path, Path],
+    links: Optional[List[str]] = None,
+) -> Tuple[str, int]:
+    header_cells = docs.split_table_row(lines[start])
+    i = start + 2
+    data_rows: List[List[str]] = []
+    while i < len(lines):
+        line = lines[i]
+        stripped = line.strip()
+        if not stripped or "|" not in stripped:
+            break
+        if docs.TABLE_DIVIDER_RE.match(stripped):
+            i += 1
+            continue
+        data_rows.append(docs.split_table_row(line))
+        i += 1
+
+    head_html = "".join(
+        f"<th>{docs.render_inline(cell, source_rel, output_rel, source_to_output, links)}</th>" for cell in header_cells
+    )
+    row_html = []
+    for row in data_rows:
+        cells = "".join(
+            f"<td>{docs.render_inline(cell, source_rel, output_rel, source_to_output, links)}</td>" for cell in row
+        )
+        row_html.append(f"<tr>{cells}</tr>")
+
+    table_html = "<table><thead><tr>" + head_html + "</tr></thead><tbody>" + "".join(row_html) + "</tbody></table>"
+    return table_html, i
+
+
+def legacy_collect_search_entry(lines: List[str], title: str, is_diagram: bool) -> Dict[str, object]:
+    """Tokenize a page's title, headings and body for the search index.
+
+    Returns `{"sections": [[slug, heading], ...], "terms": {term: [score, section, ...]}}`
+    where section 0 is the top of the page and section n is `sections[n - 1]`.
+    Diagram sources are indexed by title only.
+    """
+    sections: List[List[str]] = []
+    scores: Dict[str, int] = {}
+    term_sections: Dict[str, List[int]] = {}
+
+    def add(text: str, weight: int, section: int) -> None:
+        for match in docs.SEARCH_TOKEN_RE.finditer(text.lower()):
+            term = match.group(0)[:docs.SEARCH_MAX_TERM]
+            if term in docs.SEARCH_STOPWORDS:
+                continue
+            scores[term] = scores.get(term, 0) + weight
+            seen = term_sections.setdefault(term, [])
+            if section not in seen and len(seen) < docs.SEARCH_MAX_SECTIONS:
+                seen.append(section)
+
+    add(title, docs.SEARCH_TITLE_WEIGHT, 0)
+    if not is_diagram:
+        section = 0
+        in_code = False
+        for line in lines:
+            stripped = line.strip()
+            if stripped.startswith("```"):
+                in_code = not in_code
+                continue
+            if "](" in stripped:
+                stripped = docs.LINK_RE.sub(r"\1", stripped)
+            heading_match = None if in_code else docs.HEADING_RE.match(stripped)
+            if heading_match:
+                text = heading_match.group(2).strip()
+                sections.append([docs.slugify(text), docs.SEARCH_MARKUP_RE.sub("", text)])
+                section = len(sections)
+                add(text, docs.SEARCH_HEADING_WEIGHT, section)
+            else:
+                add(stripped, 1, section)
+    return {
+        "sections": sections,
+        "terms": {term: [score, *term_sections[term]] for term, score in scores.items()},
+    }
+
+
+def legacy_collect_links(lines: List[str], source_rel: Path) -> Dict[str, bool]:
+    """Return repo-relative link targets of a page mapped to whether they exist."""
+    links: Dict[str, bool] = {}
+    for line in lines:
+        for match in docs.LINK_RE.finditer(line):
+            target = match.group(2).strip()
+            if not target or target.startswith(("http://", "https://", "mailto:", "#")):
+                continue
+            link_target = target.split("#", 1)[0]
+            if link_target.startswith("/") and not link_target.startswith(str(docs.current_build().repo_root)):
+                candidate: Optional[Path] = Path(link_target.lstrip("/"))
+            else:
+                candidate = docs.resolve_repo_path(link_target, source_rel)
+            if candidate is None:
+                continue
+            key = candidate.as_posix()
+            if key not in links:
+                links[key] = docs.repo_path_exists(candidate)
+    return links
+
+
+# Previous discovery, kept as the comparison baseline: one recursive glob per
+# pattern, filtering generated output only after walking it.
+
+
+def legacy_collect_sources(root: Path) -> List[Path]:
+    discovered: Dict[Path, None] = {}
+    for pattern in docs.SOURCE_GLOBS:
+        for path in root.glob(pattern):
+            if not path.is_file():
+                continue
+            rel = path.relative_to(root)
+            if rel.parts[:2] == ("docs", "site"):
+                continue
+            if rel.parts[:3] == ("docs", "utils", "templates"):
+                continue
+            discovered[rel] = None
+    return sorted(discovered)
+
+
+# Previous per-page navigation, kept as the comparison baseline. It regroups and
+# re-sorts every page and calls relpath for every link on every page.
+
+
+def legacy_build_navigation(
+    current_source: Path,
+    current_output: Path,
+    source_to_output: Dict[Path, Path],
+    titles: Dict[Path, str],
+) -> str:
+    grouped: Dict[str, List[Tuple[Path, Path]]] = {name: [] for name in docs.NAV_GROUPS}
+    for source, output in sorted(source_to_output.items(), key=lambda item: item[1].as_posix()):
+        grouped.setdefault(docs.nav_group(source), []).append((source, output))
+
+    current_group = docs.nav_group(current_source)
+    sections: List[str] = []
+    for group_name, items in grouped.items():
+        if not items:
+            continue
+        links: List[str] = []
+        for source, output in items:
+            href = posixpath.relpath(output.as_posix(), current_output.parent.as_posix() or ".")
+            active = " active" if source == current_source else ""
+            label = html.escape(titles.get(source, source.stem))
+            links.append(
+                f"<a class=\"nav-link{active}\" href=\"{href}\"><span class=\"nav-link-dot\">•</span>"
+                f"<span class=\"nav-link-text\">{label}</span></a>"
+            )
+        is_open = group_name == current_group or group_name == "Overview"
+        sections.append(
+            f"<section class=\"nav-group{' open' if is_open else ''}\">"
+            f"<div class=\"nav-group-items\">{''.join(links)}</div></section>"
+        )
+    return "\n".join(sections)
+
+
+def legacy_build_top_navigation(
+    current_source: Path,
+    current_output: Path,
+    source_to_output: Dict[Path, Path],
+) -> str:
+    grouped: Dict[str, List[Tuple[Path, Path]]] = {name: [] for name in docs.NAV_GROUPS}
+    for source, output in sorted(source_to_output.items(), key=lambda item: item[1].as_posix()):
+        grouped.setdefault(docs.nav_group(source), []).append((source, output))
+    current_group = docs.nav_group(current_source)
+    chips: List[str] = []
+    for group_name, items in grouped.items():
+        if not items:
+            continue
+        target = next((output for _source, output in items if output.name == "index.html"), items[0][1])
+        href = posixpath.relpath(target.as_posix(), current_output.parent.as_posix() or ".")
+        active = " top-link-active" if group_name == current_group else ""
+        chips.append(f"<a class=\"top-link{active}\" href=\"{href}\">{html.escape(group_name)}</a>")
+    return "".join(chips)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
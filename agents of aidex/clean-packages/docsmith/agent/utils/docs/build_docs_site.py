@@ -4,18 +4,71 @@
 from __future__ import annotations
 
 import argparse
+import contextvars
+import cProfile
+import ctypes
+import fnmatch
+import gzip
+import hashlib
+import heapq
 import html
+import itertools
+import json
+import marshal
+import mimetypes
+import mmap
+import os
 import posixpath
 import re
 import shutil
 import subprocess
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from datetime import datetime, timezone
+from functools import partial
+from http.server import BaseHTTPRequestHandler, SimpleHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Tuple
-
+from urllib.parse import quote, unquote, urlsplit
+from xml.sax.saxutils import escape as xml_escape
+from typing import (
+    Callable, Dict, Hashable, Iterable, Iterator, List, NamedTuple, Optional, Protocol, Sequence, Set, Tuple, TypedDict,
+    TypeVar, Union, cast,
+)
+
+try:
+    import brotli  # type: ignore[import-not-found]
+except ImportError:  # optional: .br siblings are only written when available
+    brotli = None
+
+# The checkout this script belongs to, which the command line builds; build_site() takes any repository.
 REPO_ROOT = Path(__file__).resolve().parents[2]
-DOCS_ROOT = REPO_ROOT / "docs"
-SITE_ROOT = DOCS_ROOT / "site"
+SITE_ROOT = REPO_ROOT / "docs" / "site"
+# Where links written in the sources expect the generated site, relative to the repository root.
+SITE_LINK_ROOT = Path("docs/site")
+MANIFEST_NAME = ".build-manifest.json"
+SHARD_MANIFEST_NAME = ".shard-{index}-of-{count}.json"
+MANIFEST_VERSION = 1
+CACHE_ROOT = REPO_ROOT / ".docsmith-cache"
+GIT_INDEX_VERSION = 1
+PAGE_CHUNK_SIZE = 32
+MMAP_THRESHOLD = 8 * 1024 * 1024
+SOURCE_MEMORY_BUDGET_MB = 256
+LINK_CACHE_SIZE = 4096
+INLINE_CACHE_SIZE = 8192
+INLINE_CACHE_MAX_TEXT = 200
+RENDER_CACHE_DIR = CACHE_ROOT / "render"
+RENDER_CACHE_MB = 512
+WATCH_INTERVAL_SECONDS = 0.25
+WATCH_RESCAN_SECONDS = 2.0
+SERVE_CACHE_MB = 64
+LIVE_RELOAD_PATH = "/__docsmith/reload"
+LIVE_RELOAD_SNIPPET = (
+    "<script>new EventSource(\"" + LIVE_RELOAD_PATH + "\").onmessage = function () { location.reload(); };</script>"
+)
 
 SOURCE_GLOBS = [
     "docs/**/*.md",
@@ -25,13 +78,43 @@ SOURCE_GLOBS = [
     "requirements.md",
     "Readme.md",
 ]
+# Never descended into during discovery; directories holding a pyvenv.cfg are skipped too.
+SOURCE_PRUNE_DIRS = frozenset({
+    ".git", ".hg", ".svn", "node_modules", ".venv", "venv", "__pycache__", ".tox", ".nox", ".docsmith-cache",
+})
+SOURCE_EXCLUDE_DIRS = frozenset({"docs/site", "docs/.site-generations", "docs/utils/templates"})
 
 HEADING_RE = re.compile(r"^(#{1,6})\s+(.*)$")
 UL_RE = re.compile(r"^\s*[-*]\s+(.*)$")
 OL_RE = re.compile(r"^\s*\d+\.\s+(.*)$")
 TABLE_DIVIDER_RE = re.compile(r"^\s*\|?(\s*:?-{3,}:?\s*\|)+\s*:?-{3,}:?\s*\|?\s*$")
 LINK_RE = re.compile(r"\[([^\]]+)\]\(([^)]+)\)")
+INLINE_MARKER_RE = re.compile(r"[\[`]")
+STRONG_RE = re.compile(r"\*\*([^*]+)\*\*")
+EM_RE = re.compile(r"\*([^*]+)\*")
+INLINE_ATOM = "\x00"
+LINK_SCHEME_RE = re.compile(r"[a-zA-Z][a-zA-Z0-9+.-]*:")
+LINK_REPORT_LIMIT = 20
 RELEASE_TAG_RE = re.compile(r"^Release\s+(\d{8}\.\d{3})")
+SEARCH_DIR = "search"
+SEARCH_INDEX_VERSION = 1
+# Format of the postings cache files; a mismatch drops the cache and rebuilds the index.
+SEARCH_CACHE_VERSION = 3
+SEARCH_TOKEN_RE = re.compile(r"[^\W_]{2,}")
+SEARCH_MARKUP_RE = re.compile(r"[`*]")
+SEARCH_STOPWORDS = frozenset(
+    "an and are as at be by can for from has have if in into is it its not of on or so that the then "
+    "this to was we were when will with you your".split()
+)
+SEARCH_TITLE_WEIGHT = 10
+SEARCH_HEADING_WEIGHT = 4
+SEARCH_MAX_TERM = 32
+SEARCH_MAX_SECTIONS = 3
+SEARCH_MAX_POSTINGS = 100
+SEARCH_MIN_PREFIX = 2
+SEARCH_MAX_PREFIX = 4
+SEARCH_SHARD_BYTES = 24 * 1024
+SEARCH_PAGE_CHUNK = 16
 GROUP_ICONS = {
     "Overview": "◉",
     "Frontend": "▣",
@@ -42,6 +125,802 @@ GROUP_ICONS = {
     "Modules": "☰",
     "Reference": "⌁",
 }
+ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MERMAID_VENDOR_PATH = Path(__file__).resolve().parent / "vendor" / "mermaid.min.js"
+MERMAID_CDN_URL = "https://cdn.jsdelivr.net/npm/mermaid@11/dist/mermaid.min.js"
+COMPRESS_SUFFIXES = {".html", ".css", ".js", ".json", ".xml", ".svg", ".txt"}
+COMPRESS_MIN_BYTES = 256
+MINIFY_RAW_RE = re.compile(r"(<(pre|textarea|script|style)\b.*?</\2>|<[^>]*>)", re.IGNORECASE | re.DOTALL)
+MINIFY_BLOCK_TAG_RE = re.compile(
+    r"</?(html|head|body|meta|link|title|script|style|header|main|aside|nav|footer|section|article|div|p|ul|ol|li"
+    r"|table|thead|tbody|tr|th|td|h[1-6]|pre|hr|br|button|input)\b",
+    re.IGNORECASE,
+)
+MINIFY_CSS_RE = re.compile(r"(\"[^\"]*\"|'[^']*')|/\*.*?\*/|\s*([{};,>])\s*|(:)\s+|\s+", re.DOTALL)
+NAV_GROUPS = ("Overview", "Frontend", "API", "Tests", "Utilities", "Diagrams", "Modules", "Reference")
+NAV_LINK_OPEN = "<a class=\"nav-link\""
+NAV_LINK_OPEN_ACTIVE = "<a class=\"nav-link active\""
+NAV_GROUP_CLOSE = "</div></section>"
+API_STATE_SLOTS = 4
+
+
+class PrefixedNav(NamedTuple):
+    """Navigation markup for pages at one directory depth below the site root."""
+
+    group_links: List[Tuple[str, List[str]]]
+
+
+class NavModel(NamedTuple):
+    """Navigation tree computed once per build.
+
+    Nav hrefs are written as a relative prefix back to the site root followed by
+    the site-relative output path, so link markup only depends on the depth of
+    the current page. It is rendered once per depth and each page only marks its
+    active link and open group. `directories` lists the items of each
+    (group, output directory) and `directory_index` the item whose output is
+    that directory's index.html, for the per-page fallback of `--shared-nav`.
+    """
+
+    groups: List[Tuple[str, List[Tuple[Path, Path, str]]]]
+    group_heads: List[Tuple[str, str]]
+    positions: Dict[Path, Tuple[int, int]]
+    directories: Dict[Tuple[int, Path], List[int]]
+    directory_index: Dict[Tuple[int, Path], int]
+    top_targets: List[Tuple[str, Path]]
+    prefixed: Dict[int, PrefixedNav]
+
+
+CacheValue = TypeVar("CacheValue")
+
+
+class MemoCache(Protocol):
+    """What `cached` and the render caches registry need from a cache.
+
+    `version` identifies the code that produced the entries; it is part of
+    the keys of caches that outlive the build.
+    """
+
+    version: str
+    hits: int
+    misses: int
+
+    def get(self, key: Hashable, compute: Callable[[], CacheValue]) -> CacheValue:
+        """Return the value stored under `key`, or compute, store and return it."""
+
+    def put(self, key: Hashable, value: object) -> None:
+        """Store `value` under `key`."""
+
+
+class BoundedCache:
+    """A size-bounded LRU memo with hit and miss counters.
+
+    Threads may share one (`--serve` renders concurrently), so lookups and
+    inserts hold `lock`. `compute` runs outside it: two threads missing the
+    same key both compute, and the later insert wins. Entries only live for
+    the build, so `version` is empty.
+    """
+
+    version = ""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.entries: "OrderedDict[Hashable, object]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable, compute: Callable[[], CacheValue]) -> CacheValue:
+        with self.lock:
+            try:
+                value = self.entries[key]
+                self.entries.move_to_end(key)
+            except KeyError:
+                self.misses += 1
+            else:
+                self.hits += 1
+                return value  # type: ignore[return-value]
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def put(self, key: Hashable, value: object) -> None:
+        if self.maxsize > 0:
+            with self.lock:
+                self.entries[key] = value
+                self.entries.move_to_end(key)
+                if len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+
+
+class DiskCache:
+    """A content-addressed cache of JSON values stored as files under `root`.
+
+    Entries are immutable (the key covers every input), so the directory can
+    be shared between workers and restored between CI jobs. Keys are hex
+    digests, which name the files. Hits refresh the entry's mtime, which
+    `prune_disk_cache` uses for LRU eviction.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.version = builder_fingerprint()
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key: Hashable) -> Path:
+        name = str(key)
+        return self.root / name[:2] / f"{name[2:]}.json.z"
+
+    def get(self, key: Hashable, compute: Callable[[], CacheValue]) -> CacheValue:
+        path = self.path(key)
+        try:
+            with open(path, "rb") as handle:
+                value = json.loads(zlib.decompress(handle.read()))
+        except (OSError, ValueError, zlib.error):
+            pass
+        else:
+            self.hits += 1
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            return value
+        self.misses += 1
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def put(self, key: Hashable, value: object) -> None:
+        path = self.path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            temp_path.write_bytes(zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"), 1))
+            os.replace(temp_path, path)
+        except OSError:
+            pass
+
+
+class DirectoryOutput:
+    """Site files under a directory, addressed by site-relative POSIX path.
+
+    Files are only rewritten when their bytes change, so unchanged files keep
+    their mtime. `home` is where the site is published when `root` is a
+    staged generation; `linked` means files may be hard links shared with the
+    live generation, so every write replaces the file instead of writing into it.
+    A linked output also collects the site-relative paths it writes or removes
+    in `changed`, which the next staged build uses to catch up.
+    """
+
+    def __init__(self, root: Path, home: Optional[Path] = None, linked: bool = False) -> None:
+        self.root = root
+        self.home = home if home is not None else root
+        self.linked = linked
+        self.name = str(self.home)
+        self.changed: Set[str] = set()
+
+    def read(self, path: str) -> Optional[bytes]:
+        try:
+            with open(os.path.join(self.root, path), "rb") as handle:
+                return handle.read()
+        except OSError:
+            return None
+
+    def write(self, path: str, content: bytes, atomic: bool = False) -> bool:
+        """Write `content` unless the file already holds it; return True if it was written.
+
+        With `atomic`, the file is replaced through a temporary sibling so
+        readers never see it half-written.
+        """
+        full_path = os.path.join(self.root, path)
+        if not atomic and not self.linked:
+            try:
+                return write_if_changed(full_path, content)
+            except FileNotFoundError:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                return write_if_changed(full_path, content)
+        if self.read(path) == content:
+            return False
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        temp_path = full_path + ".tmp"
+        with open(temp_path, "wb") as handle:
+            handle.write(content)
+        os.replace(temp_path, full_path)
+        self.record_change(full_path)
+        return True
+
+    def remove(self, path: str) -> None:
+        full_path = os.path.join(self.root, path)
+        if os.path.isfile(full_path):
+            os.unlink(full_path)
+            self.record_change(full_path)
+
+    def record_change(self, full_path: str) -> None:
+        """Note a file under `root` that was replaced or removed outside `write` and `remove`."""
+        if self.linked:
+            self.changed.add(Path(os.path.relpath(full_path, self.root)).as_posix())
+
+    def exists(self, path: str) -> bool:
+        return os.path.exists(os.path.join(self.root, path))
+
+    def size(self, path: str) -> int:
+        try:
+            return os.path.getsize(os.path.join(self.root, path))
+        except OSError:
+            return 0
+
+    def listdir(self, directory: str) -> List[str]:
+        """Return the names of the files directly inside `directory`."""
+        try:
+            return [entry.name for entry in os.scandir(os.path.join(self.root, directory)) if entry.is_file()]
+        except OSError:
+            return []
+
+    def clear(self) -> None:
+        if self.root.exists():
+            shutil.rmtree(self.root)
+
+
+class MemoryOutput:
+    """Site files kept in a dict of site-relative POSIX path to bytes.
+
+    `callback`, if given, is called with the path and new content of every
+    file that changes, and with None as content for every file removed.
+    """
+
+    def __init__(
+        self,
+        files: Optional[Dict[str, bytes]] = None,
+        callback: Optional[Callable[[str, Optional[bytes]], None]] = None,
+    ) -> None:
+        self.files = files if files is not None else {}
+        self.callback = callback
+        self.name = "memory"
+
+    def read(self, path: str) -> Optional[bytes]:
+        return self.files.get(path)
+
+    def write(self, path: str, content: bytes, atomic: bool = False) -> bool:
+        if self.files.get(path) == content:
+            return False
+        self.files[path] = content
+        if self.callback is not None:
+            self.callback(path, content)
+        return True
+
+    def remove(self, path: str) -> None:
+        if self.files.pop(path, None) is not None and self.callback is not None:
+            self.callback(path, None)
+
+    def exists(self, path: str) -> bool:
+        return path in self.files
+
+    def size(self, path: str) -> int:
+        return len(self.files.get(path, b""))
+
+    def listdir(self, directory: str) -> List[str]:
+        prefix = directory + "/"
+        return [
+            path[len(prefix):]
+            for path in self.files
+            if path.startswith(prefix) and "/" not in path[len(prefix):]
+        ]
+
+    def clear(self) -> None:
+        for path in list(self.files):
+            self.remove(path)
+
+
+SiteOutput = Union[DirectoryOutput, MemoryOutput]
+
+
+class GitTree:
+    """The files of the build's repository at one git revision, read from the object store instead of a checkout.
+
+    One `git ls-tree` call lists the tree; blob contents are read through a
+    single long-lived `git cat-file --batch` process per OS process, started
+    on first use, so forked render workers never share its pipes.
+    """
+
+    def __init__(self, rev: str) -> None:
+        self.rev = rev
+        self.commit = run_git(["rev-parse", "--verify", "--quiet", f"{rev}^{{commit}}"])
+        if not self.commit:
+            raise ValueError(f"Unknown git revision {rev!r}")
+        listing = subprocess.run(
+            ["git", "ls-tree", "-r", "-z", self.commit],
+            cwd=current_build().repo_root,
+            check=True,
+            capture_output=True,
+        ).stdout.decode("utf-8", errors="surrogateescape")
+        # path -> (mode, blob id) for every file; symlinks have mode 120000.
+        self.files: Dict[str, Tuple[str, str]] = {}
+        self.dirs: Set[str] = {""}
+        for record in listing.split("\0"):
+            if not record:
+                continue
+            meta, path = record.split("\t", 1)
+            mode, kind, oid = meta.split()
+            if kind != "blob":
+                continue
+            self.files[path] = (mode, oid)
+            parent = posixpath.dirname(path)
+            while parent not in self.dirs:
+                self.dirs.add(parent)
+                parent = posixpath.dirname(parent)
+        self.process: Optional["subprocess.Popen[bytes]"] = None
+        self.owner = 0
+        self.lock = threading.Lock()
+
+    def __getstate__(self) -> Dict[str, object]:
+        state = dict(self.__dict__)
+        state["process"] = None
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, object]) -> None:
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def exists(self, path: str) -> bool:
+        return path in self.files or path in self.dirs
+
+    def is_symlink(self, path: str) -> bool:
+        entry = self.files.get(path)
+        return entry is not None and entry[0] == "120000"
+
+    def stamp(self, path: str) -> Tuple[int, int]:
+        """Stand in for (mtime, size): the blob id changes whenever the content does."""
+        _mode, oid = self.files[path]
+        return int(oid[:15], 16), 0
+
+    def read(self, path: str) -> bytes:
+        build_context = current_build()
+        if path not in self.files:
+            raise FileNotFoundError(f"{path} is not in {self.rev}")
+        _mode, oid = self.files[path]
+        with self.lock:
+            if self.process is None or self.owner != os.getpid():
+                self.owner = os.getpid()
+                self.process = subprocess.Popen(
+                    ["git", "cat-file", "--batch"],
+                    cwd=build_context.repo_root,
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                )
+                if build_context.profile is not None:
+                    build_context.profile.record_git(0.0)
+            assert self.process.stdin is not None and self.process.stdout is not None
+            self.process.stdin.write(f"{oid}\n".encode("ascii"))
+            self.process.stdin.flush()
+            header = self.process.stdout.readline().split()
+            if len(header) != 3:
+                raise OSError(f"git cat-file could not read {path} ({oid})")
+            content = self.process.stdout.read(int(header[2]))
+            self.process.stdout.read(1)
+        return content
+
+    def resolve(self, path: str) -> Optional[str]:
+        """Resolve symlinks in a normalized repo-relative path, or None if it leaves the tree."""
+        parts: List[str] = []
+        pending = [part for part in path.split("/") if part]
+        for _ in range(1000):
+            if not pending:
+                return "/".join(parts)
+            part = pending.pop(0)
+            if part == ".":
+                continue
+            if part == "..":
+                if not parts:
+                    return None
+                parts.pop()
+                continue
+            parts.append(part)
+            current = "/".join(parts)
+            if self.is_symlink(current):
+                target = self.read(current).decode("utf-8", errors="replace")
+                if target.startswith("/"):
+                    return None
+                parts.pop()
+                pending = [segment for segment in target.split("/") if segment] + pending
+        return None
+
+    def close(self) -> None:
+        if self.process is not None and self.owner == os.getpid():
+            if self.process.stdin is not None:
+                self.process.stdin.close()
+            self.process.wait()
+            self.process = None
+
+
+class Block(NamedTuple):
+    """One block of a parsed Markdown document.
+
+    `kind` is "heading", "paragraph", "ul", "ol", "table" or "code". `text`
+    holds the heading text, the paragraph (lines joined by spaces) or the code
+    language; `items` holds list item texts, table rows (header first, divider
+    dropped) or code lines.
+    """
+
+    kind: str
+    text: str = ""
+    items: Tuple[str, ...] = ()
+    level: int = 0
+    slug: str = ""
+
+
+class IgnoreRule(NamedTuple):
+    """One `.gitignore` line, matched against paths relative to the file's directory."""
+
+    base: str
+    pattern: "re.Pattern[str]"
+    negate: bool
+    dir_only: bool
+
+
+class SourceDocument(NamedTuple):
+    """A source read once from disk, with what later build stages need from it.
+
+    `lines` is the parsed form shared by rendering, the table of contents and
+    link collection. It is None when the text was not kept in memory (sources
+    past the memory budget, memory-mapped large files and unchanged pages) and
+    is reloaded when the page is rendered.
+    """
+
+    source: Path
+    digest: str
+    title: str
+    lines: Optional[List[str]]
+
+
+class PageBody(TypedDict):
+    """The parts of a page `render_page_body` renders and the render cache stores."""
+
+    content: str
+    toc: str
+    search: Dict[str, object]
+    anchors: List[str]
+    refs: List[str]
+
+
+class PageEntry(TypedDict):
+    """A page's record in the build and shard manifests.
+
+    `search` holds the page's terms until `SearchIndex.update` moves them into
+    the index, then only its sections and base prefixes.
+    """
+
+    output: str
+    hash: str
+    title: str
+    release: str
+    mermaid: bool
+    links: Dict[str, bool]
+    search: Dict[str, object]
+    anchors: List[str]
+    refs: List[str]
+
+
+class RenderContext(NamedTuple):
+    """Build-wide state shared by every page render."""
+
+    source_to_output: Dict[Path, Path]
+    titles: Dict[Path, str]
+    nav_model: NavModel
+    assets: Dict[str, str]
+    generator_link_path: Path
+    generated_at: datetime
+    minify: bool = False
+    shared_nav: bool = False
+    search: bool = True
+
+
+SiteSink = Union[str, Path, Dict[str, bytes], Callable[[str, Optional[bytes]], None]]
+
+
+class BuildConfig(NamedTuple):
+    """Options of a `build_site()` call; fields after `use_git` match the command-line flags.
+
+    `output` is a directory (default `docs/site` under `repo_root`), a dict
+    filled with site-relative path -> bytes, or a callable receiving each
+    changed file as `(path, content)` and each removed one as `(path, None)`.
+    `log` receives the progress lines the command line prints; None keeps the
+    build quiet. `render_cache` defaults to `.docsmith-cache/render` under
+    `repo_root`.
+    """
+
+    repo_root: Union[str, Path]
+    output: Optional[SiteSink] = None
+    source_globs: Sequence[str] = tuple(SOURCE_GLOBS)
+    log: Optional[Callable[[str], None]] = None
+    use_git: bool = True
+    clean: bool = False
+    full: bool = False
+    jobs: int = 1
+    source_memory_mb: int = SOURCE_MEMORY_BUDGET_MB
+    link_cache_size: int = LINK_CACHE_SIZE
+    inline_cache_size: int = INLINE_CACHE_SIZE
+    render_cache: Optional[str] = None
+    render_cache_mb: int = RENDER_CACHE_MB
+    link_check: str = "warn"
+    link_report: Optional[str] = None
+    minify: bool = False
+    precompress: bool = False
+    mermaid_cdn: bool = False
+    site_url: Optional[str] = None
+    shared_nav: bool = False
+    reproducible: bool = False
+    shard: Optional[Tuple[int, int]] = None
+    merge: Sequence[str] = ()
+    atomic: bool = False
+    rev: Optional[str] = None
+
+
+BuildOptions = Union[argparse.Namespace, BuildConfig]
+
+
+class PageResult(NamedTuple):
+    output: str
+    title: str
+    rendered: bool
+    seconds: float
+
+
+class BuildResult(NamedTuple):
+    """What one build produced.
+
+    `pages` covers every page, keyed by source path; `html` holds the pages
+    rendered by this build (the rest were unchanged and skipped). `timings`
+    is wall-clock seconds per stage and `broken_links` lists
+    (source, target, reason).
+    """
+
+    pages: Dict[str, PageResult]
+    rendered: List[str]
+    html: Dict[str, str]
+    timings: Dict[str, float]
+    warnings: List[str]
+    broken_links: List[Tuple[str, str, str]]
+    output: SiteOutput
+
+    def page_html(self, source: str) -> Optional[str]:
+        """Return the HTML of `source`'s page, reading it from the output if it was skipped."""
+        if source in self.html:
+            return self.html[source]
+        page = self.pages.get(source)
+        content = self.output.read(page.output) if page is not None else None
+        return content.decode("utf-8") if content is not None else None
+
+
+class BuildState:
+    """Sources, titles and git history kept warm between builds in `--watch` mode and `build_site()` calls."""
+
+    def __init__(self) -> None:
+        self.documents: Dict[Path, SourceDocument] = {}
+        self.stamps: Dict[Path, Tuple[int, int]] = {}
+        self.outputs: Dict[Path, Path] = {}
+        self.git_head = ""
+        self.release_sources: List[Path] = []
+        self.release_infos: Dict[Path, Dict[str, str]] = {}
+        self.nav_model: Optional[NavModel] = None
+        self.nav_outputs: Dict[Path, Path] = {}
+        self.nav_titles: Dict[Path, str] = {}
+        self.manifest: Optional[Dict[str, object]] = None
+        self.search_index = SearchIndex()
+
+    def output_map(self, sources: List[Path]) -> Dict[Path, Path]:
+        outputs = self.outputs
+        self.outputs = {
+            source: outputs[source] if source in outputs else map_output_path(source)
+            for source in sources
+        }
+        return self.outputs
+
+    def refresh_documents(self, sources: List[Path], memory_budget: int) -> Dict[Path, SourceDocument]:
+        """Reload sources whose size or mtime changed and forget removed ones."""
+        documents: Dict[Path, SourceDocument] = {}
+        stamps: Dict[Path, Tuple[int, int]] = {}
+        retained = 0
+        for source in sources:
+            stamp = source_stamp(source)
+            document = self.documents.get(source)
+            if document is None or self.stamps.get(source) != stamp:
+                document = load_document(source, keep_lines=retained < memory_budget)
+            if document.lines is not None:
+                retained += stamp[1]
+            documents[source] = document
+            stamps[source] = stamp
+        self.documents = documents
+        self.stamps = stamps
+        return documents
+
+    def refresh_release_infos(self, sources: List[Path], reproducible: bool) -> Dict[Path, Dict[str, str]]:
+        """Recompute release badges only when HEAD or the source list changed."""
+        head = read_head_commit()
+        if head != self.git_head or sources != self.release_sources:
+            self.release_infos = collect_release_infos(sources, load_git_index(), reproducible)
+            self.git_head = head
+            self.release_sources = list(sources)
+        return self.release_infos
+
+    def refresh_nav_model(self, source_to_output: Dict[Path, Path], titles: Dict[Path, str]) -> NavModel:
+        if self.nav_model is None or titles != self.nav_titles or source_to_output != self.nav_outputs:
+            self.nav_model = build_nav_model(source_to_output, titles)
+            self.nav_outputs = source_to_output
+            self.nav_titles = titles
+        return self.nav_model
+
+    def has_changes(self, sources: List[Path]) -> bool:
+        if len(sources) != len(self.stamps) or read_head_commit() != self.git_head:
+            return True
+        for source in sources:
+            try:
+                stamp = source_stamp(source)
+            except OSError:
+                return True
+            if self.stamps.get(source) != stamp:
+                return True
+        return False
+
+
+class StageProfile(TypedDict):
+    wall_seconds: float
+    cpu_seconds: float
+
+
+class PageProfile(TypedDict):
+    source: str
+    wall_seconds: float
+    cpu_seconds: float
+    bytes_written: int
+
+
+class RenderProfile(TypedDict):
+    page_wall_seconds: float
+    page_cpu_seconds: float
+    mean_page_seconds: float
+    slowest: List[PageProfile]
+
+
+class GitProfile(TypedDict):
+    calls: int
+    seconds: float
+
+
+class ProfileReport(TypedDict):
+    """The JSON report `--profile` writes."""
+
+    pages: int
+    rendered: int
+    stages: Dict[str, StageProfile]
+    render: RenderProfile
+    git: GitProfile
+    bytes_written: Dict[str, int]
+
+
+class BuildProfile:
+    """Counters collected for `--profile`; only allocated when the flag is given."""
+
+    def __init__(self) -> None:
+        self.stage_cpu: Dict[str, float] = {}
+        self.page_timings: Dict[str, List[float]] = {}
+        self.git_calls = 0
+        self.git_seconds = 0.0
+        self.bytes_written: Dict[str, int] = {}
+
+    def record_git(self, seconds: float) -> None:
+        self.git_calls += 1
+        self.git_seconds += seconds
+
+    def report(self, pages: int, rendered: int, top: int, stage_seconds: Dict[str, float]) -> ProfileReport:
+        bytes_written = dict(self.bytes_written)
+        bytes_written["pages"] = bytes_written.get("pages", 0) + sum(
+            int(timing[2]) for timing in self.page_timings.values()
+        )
+        slowest = heapq.nlargest(top, self.page_timings.items(), key=lambda item: item[1][0])
+        page_seconds = [timing[0] for timing in self.page_timings.values()]
+        return {
+            "pages": pages,
+            "rendered": rendered,
+            "stages": {
+                name: {"wall_seconds": seconds, "cpu_seconds": self.stage_cpu.get(name, 0.0)}
+                for name, seconds in stage_seconds.items()
+            },
+            "render": {
+                "page_wall_seconds": sum(page_seconds),
+                "page_cpu_seconds": sum(timing[1] for timing in self.page_timings.values()),
+                "mean_page_seconds": sum(page_seconds) / len(page_seconds) if page_seconds else 0.0,
+                "slowest": [
+                    {"source": source, "wall_seconds": timing[0], "cpu_seconds": timing[1], "bytes_written": int(timing[2])}
+                    for source, timing in slowest
+                ],
+            },
+            "git": {"calls": self.git_calls, "seconds": self.git_seconds},
+            "bytes_written": {"total": sum(bytes_written.values()), **bytes_written},
+        }
+
+
+PageWork = Tuple[SourceDocument, Dict[str, str]]
+CacheConfig = Tuple[int, int, str]
+ChunkResult = Tuple[
+    Dict[str, PageEntry], Dict[str, List[int]], Dict[str, List[float]], List[int], Dict[str, bytes]
+]
+
+class BuildContext:
+    """What one build reads, writes and records: repository, output, log, revision and counters.
+
+    A build runs inside its context (see `use_build`) rather than in module
+    globals, so `build_site()` calls on other threads, or nested in a `log`
+    callback, each see their own. Worker processes and `--serve` request
+    threads enter the context of the build they work for.
+    """
+
+    def __init__(
+        self,
+        repo_root: Path,
+        output: Optional[SiteOutput] = None,
+        log: Callable[[str], None] = print,
+        profile: Optional[BuildProfile] = None,
+    ) -> None:
+        self.repo_root = repo_root
+        # Caches live in the repository's `.docsmith-cache/`.
+        self.cache_root = repo_root / ".docsmith-cache"
+        self.git_index_path = self.cache_root / "git-index.json"
+        self.log = log
+        self.profile = profile
+        # Set by --rev: sources, link targets and history come from this revision, not the work tree.
+        self.tree: Optional[GitTree] = None
+        self.stage_seconds: Dict[str, float] = {}
+        # [written, unchanged] page files since the last take_page_writes().
+        self.page_writes = [0, 0]
+        self.render_caches: Dict[str, MemoCache] = {}
+        self.site: SiteOutput = DirectoryOutput(repo_root / "docs" / "site")
+        self.site_root = repo_root / "docs" / "site"
+        # None when the site is kept in memory; postings then live only in the SearchIndex.
+        self.search_cache_dir: Optional[Path] = None
+        self.use_output(output if output is not None else self.site)
+
+    def use_output(self, output: SiteOutput) -> None:
+        """Write the site to `output` from now on.
+
+        Search postings are cached per output directory, and only in memory
+        for a memory output.
+        """
+        default_root = self.repo_root / "docs" / "site"
+        self.site = output
+        self.site_root = default_root
+        self.search_cache_dir = None
+        if isinstance(output, DirectoryOutput):
+            self.search_cache_dir = self.cache_root / "search"
+            if output.home != default_root:
+                site_key = hashlib.sha256(str(output.home).encode("utf-8")).hexdigest()[:12]
+                self.search_cache_dir = self.cache_root / f"search-{site_key}"
+            self.site_root = output.root
+
+
+_WORKER_CONTEXT: Optional[RenderContext] = None
+_WORKER_PROFILE = False
+_CURRENT_BUILD: "contextvars.ContextVar[BuildContext]" = contextvars.ContextVar("docsmith_build")
+# Outside any build, helpers see this checkout and write to its docs/site.
+_NO_BUILD = BuildContext(REPO_ROOT)
+# (repository, output) -> (output, warm state, lock) for the most recent build_site() calls.
+BUILD_STATES: "OrderedDict[Tuple[str, object], Tuple[SiteOutput, BuildState, threading.Lock]]" = OrderedDict()
+BUILD_LOCK = threading.Lock()
+
+
+def current_build() -> BuildContext:
+    """Return the context of the build running in this thread."""
+    return _CURRENT_BUILD.get(_NO_BUILD)
+
+
+@contextmanager
+def use_build(build_context: BuildContext) -> Iterator[BuildContext]:
+    """Run the enclosed block as part of `build_context`'s build."""
+    token = _CURRENT_BUILD.set(build_context)
+    try:
+        yield build_context
+    finally:
+        _CURRENT_BUILD.reset(token)
 
 
 def main() -> int:
@@ -51,76 +930,1923 @@ def main() -> int:
         action="store_true",
         help="Remove existing docs/site output before generating.",
     )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Re-render every page instead of only pages affected by changes since the last build.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Render pages in N worker processes (0 uses every CPU core). Output is identical to a serial build.",
+    )
+    parser.add_argument(
+        "--source-memory-mb",
+        type=int,
+        default=SOURCE_MEMORY_BUDGET_MB,
+        help="Keep at most this much source text in memory between loading and rendering.",
+    )
+    parser.add_argument(
+        "--link-cache-size",
+        type=int,
+        default=LINK_CACHE_SIZE,
+        help="Entries kept in each per-build link resolution cache (0 disables caching).",
+    )
+    parser.add_argument(
+        "--inline-cache-size",
+        type=int,
+        default=INLINE_CACHE_SIZE,
+        help="Rendered inline fragments (table cells, list items, short lines) kept per build (0 disables caching).",
+    )
+    parser.add_argument(
+        "--render-cache",
+        default=str(RENDER_CACHE_DIR),
+        metavar="DIR",
+        help="Directory of rendered page bodies reused across builds and workspaces.",
+    )
+    parser.add_argument(
+        "--render-cache-mb",
+        type=int,
+        default=RENDER_CACHE_MB,
+        help="Size limit of --render-cache; least recently used entries are evicted (0 disables the cache).",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running, rebuild affected pages when sources change and serve docs/site with live reload.",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=WATCH_INTERVAL_SECONDS,
+        help="Seconds between source polls in --watch mode.",
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Serve pages rendered when first requested, from memory, instead of building docs/site.",
+    )
+    parser.add_argument(
+        "--serve-cache-mb",
+        type=int,
+        default=SERVE_CACHE_MB,
+        help="Size limit of the rendered pages --serve keeps in memory; least recently used pages are evicted.",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Server address in --watch and --serve mode.")
+    parser.add_argument("--port", type=int, default=8000, help="Server port in --watch and --serve mode.")
+    parser.add_argument(
+        "--no-serve",
+        action="store_true",
+        help="Watch and rebuild without starting the preview server.",
+    )
+    parser.add_argument(
+        "--link-check",
+        choices=("warn", "error", "off"),
+        default="warn",
+        help=(
+            "Check intra-doc links and #anchors against the repository and page headings after rendering; "
+            "'error' makes the build exit with status 1 when any are broken (default: warn)."
+        ),
+    )
+    parser.add_argument(
+        "--link-report",
+        metavar="PATH",
+        help="Write every checked link problem to this JSON file.",
+    )
+    parser.add_argument(
+        "--timings",
+        metavar="PATH",
+        help="Write wall-clock seconds per build stage to this JSON file.",
+    )
+    parser.add_argument(
+        "--minify",
+        action="store_true",
+        help="Minify pages, the stylesheet and the script; <pre>, <script> and <style> content is kept as is.",
+    )
+    parser.add_argument(
+        "--precompress",
+        action="store_true",
+        help="Write .gz siblings (and .br when the brotli module is installed) for nginx gzip_static/brotli_static.",
+    )
+    parser.add_argument(
+        "--mermaid-cdn",
+        action="store_true",
+        help=(
+            f"Let pages with diagrams load Mermaid from {MERMAID_CDN_URL} when utils/docs/vendor/mermaid.min.js "
+            "is missing; without it such pages fail the build."
+        ),
+    )
+    parser.add_argument(
+        "--site-url",
+        metavar="URL",
+        help="Public base URL of the site; writes docs/site/sitemap.xml listing every page.",
+    )
+    parser.add_argument(
+        "--shared-nav",
+        action="store_true",
+        help=(
+            "Write the navigation tree once to docs/site/nav.json and load it in the browser; pages only embed "
+            "their own directory and its parents' index pages as a fallback, so adding a page re-renders just "
+            "its section."
+        ),
+    )
+    parser.add_argument(
+        "--reproducible",
+        action="store_true",
+        help=(
+            "Stamp pages with SOURCE_DATE_EPOCH or their last commit time instead of the build time, so identical "
+            "inputs give byte-identical output (implied when SOURCE_DATE_EPOCH is set)."
+        ),
+    )
+    parser.add_argument(
+        "--rev",
+        metavar="REF",
+        help=(
+            "Build the docs of a git revision (tag, branch or commit) straight from the object store, "
+            "without checking it out; links and release badges are evaluated against that revision."
+        ),
+    )
+    parser.add_argument(
+        "--atomic",
+        action="store_true",
+        help=(
+            "Build into a new generation under docs/.site-generations, hard-linking unchanged files from the "
+            "published one, then publish it by atomically repointing the docs/site symlink."
+        ),
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        metavar="I/N",
+        help=(
+            "Render only shard I of N (0-based, by a stable hash of each source path) and record its pages in "
+            "docs/site/.shard-I-of-N.json for --merge; implies --reproducible."
+        ),
+    )
+    parser.add_argument(
+        "--merge",
+        nargs="+",
+        default=[],
+        metavar="DIR",
+        help=(
+            "Combine the docs/site directories of every --shard run into docs/site, checking that all shards are "
+            "present and were built from this checkout, then write the search index, manifest and shared files."
+        ),
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const=str(CACHE_ROOT / "profile.json"),
+        metavar="PATH",
+        help=(
+            "Write a JSON report with per-stage wall and CPU time, per-page render times, git calls and "
+            "bytes written (default path: .docsmith-cache/profile.json)."
+        ),
+    )
+    parser.add_argument(
+        "--profile-top",
+        type=int,
+        default=20,
+        help="Number of slowest pages listed in the --profile report.",
+    )
+    parser.add_argument(
+        "--profile-stats",
+        metavar="PATH",
+        help="Also dump cProfile statistics for the main process to this file (read with pstats).",
+    )
     args = parser.parse_args()
+    if args.watch and (args.profile or args.profile_stats):
+        parser.error("--profile and --profile-stats cannot be combined with --watch")
+    if args.serve and (args.watch or args.profile or args.profile_stats):
+        parser.error("--serve cannot be combined with --watch, --profile or --profile-stats")
+    if (args.shard is not None or args.merge) and (args.watch or args.serve):
+        parser.error("--shard and --merge cannot be combined with --watch or --serve")
+    if args.shard is not None and args.merge:
+        parser.error("--shard and --merge are separate steps")
+    if args.atomic and (args.watch or args.serve):
+        parser.error("--atomic cannot be combined with --watch or --serve")
+    if args.rev and (args.watch or args.serve):
+        parser.error("--rev cannot be combined with --watch or --serve")
+
+    build_context = BuildContext(REPO_ROOT, profile=BuildProfile() if args.profile else None)
+    with use_build(build_context):
+        if args.rev:
+            try:
+                build_context.tree = GitTree(args.rev)
+            except (ValueError, subprocess.CalledProcessError) as exc:
+                raise SystemExit(str(exc)) from None
+        profiler = cProfile.Profile() if args.profile_stats else None
+        if profiler is not None:
+            profiler.enable()
+
+        with stage("discover"):
+            sources, discovery = collect_sources()
+        if not sources:
+            raise SystemExit("No markdown sources found.")
+        seconds = build_context.stage_seconds["discover"]
+        print(f"Discovered {len(sources)} sources in {seconds * 1000:.0f} ms ({discovery})")
+        if args.watch:
+            return watch(args, sources)
+        if args.serve:
+            return serve(args, sources)
+
+        try:
+            result = build_staged(args, sources) if args.atomic else build(args, sources)
+        except ValueError as exc:
+            raise SystemExit(str(exc)) from None
+        finally:
+            if build_context.tree is not None:
+                build_context.tree.close()
+        rendered = len(result.rendered)
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile_stats)
+            print(f"cProfile stats written to {args.profile_stats}")
+        if args.timings:
+            Path(args.timings).write_text(
+                json.dumps(
+                    {"pages": len(sources), "rendered": rendered, "stages": build_context.stage_seconds}, indent=2
+                ) + "\n",
+                encoding="utf-8",
+            )
+        profile = build_context.profile
+        if profile is not None:
+            report = profile.report(len(sources), rendered, args.profile_top, build_context.stage_seconds)
+            write_profile_report(Path(args.profile), report)
+        print(f"Open {build_context.site_root / 'index.html'}")
+        if result.broken_links and args.link_check == "error":
+            print(f"Failing the build: {len(result.broken_links)} broken links (--link-check error)")
+            return 1
+        return 0
+
+
+def build_site(config: BuildConfig) -> BuildResult:
+    """Build the docs of `config.repo_root` in this process and return what was built.
+
+    The parsed sources, git history, build manifest and search postings of
+    the last API_STATE_SLOTS (repository, output) pairs stay in memory, so a
+    later call with the same `repo_root` and output (the same directory, or
+    the same dict or callable object) only re-reads and re-renders what
+    changed. Each call runs in its own BuildContext, so calls may run on
+    several threads at once, or from a `log` callback; those for the same
+    repository and output wait for each other. With `rev`, the sources of
+    that git revision are built without a checkout.
+    """
+    repo_root = Path(config.repo_root).resolve()
+    sink = config.output if config.output is not None else repo_root / "docs" / "site"
+    if isinstance(sink, (str, Path)):
+        sink_path = Path(os.path.abspath(sink))
+        # The last component stays unresolved: an --atomic site is a symlink to its current generation.
+        site_root = sink_path.parent.resolve() / sink_path.name
+        key: Tuple[str, object] = (str(repo_root), str(site_root))
+    elif isinstance(sink, dict) or callable(sink):
+        if config.precompress or config.atomic:
+            raise ValueError("precompress and atomic need a directory output")
+        site_root = None
+        key = (str(repo_root), id(sink))
+    else:
+        raise TypeError(f"output must be a directory, a dict or a callable, not {type(sink).__name__}")
+
+    with BUILD_LOCK:
+        slot = BUILD_STATES.pop(key, None)
+        if slot is None:
+            if site_root is not None:
+                site: SiteOutput = DirectoryOutput(site_root)
+            elif isinstance(sink, dict):
+                site = MemoryOutput(sink)
+            elif callable(sink):
+                site = MemoryOutput(callback=sink)
+            # The output holds a reference to the dict or callable, so its id stays unique while cached.
+            slot = (site, BuildState(), threading.Lock())
+        BUILD_STATES[key] = slot
+        while len(BUILD_STATES) > API_STATE_SLOTS:
+            BUILD_STATES.popitem(last=False)
+    site, state, lock = slot
+    with lock:
+        build_context = BuildContext(
+            repo_root, site, log=config.log if config.log is not None else (lambda line: None)
+        )
+        if config.render_cache is None:
+            config = config._replace(render_cache=str(build_context.cache_root / "render"))
+        with use_build(build_context):
+            try:
+                build_context.tree = GitTree(config.rev) if config.rev else None
+                with stage("discover"):
+                    sources, discovery = collect_sources(config.use_git, config.source_globs)
+                if not sources:
+                    raise ValueError(f"No sources match {', '.join(config.source_globs)} in {repo_root}")
+                seconds = build_context.stage_seconds["discover"]
+                build_context.log(f"Discovered {len(sources)} sources in {seconds * 1000:.0f} ms ({discovery})")
+                if config.atomic:
+                    result = build_staged(config, sources, state, page_timings={})
+                else:
+                    result = build(config, sources, state, page_timings={})
+            finally:
+                if build_context.tree is not None:
+                    build_context.tree.close()
+        html: Dict[str, str] = {}
+        for source in result.rendered:
+            content = site.read(result.pages[source].output)
+            if content is not None:
+                html[source] = content.decode("utf-8")
+        return result._replace(html=html)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Add the wall-clock time of the enclosed block to the build's `stage_seconds[name]`.
+
+    With `--profile`, the main process's CPU time is recorded as well.
+    """
+    build_context = current_build()
+    stage_seconds = build_context.stage_seconds
+    profile = build_context.profile
+    cpu_started = time.process_time() if profile is not None else 0.0
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_seconds[name] = stage_seconds.get(name, 0.0) + time.perf_counter() - started
+        if profile is not None:
+            profile.stage_cpu[name] = profile.stage_cpu.get(name, 0.0) + time.process_time() - cpu_started
+
+
+def write_profile_report(path: Path, report: ProfileReport) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    print(f"Profile written to {path}")
+    stages = report["stages"]
+    print("Stages: " + ", ".join(
+        f"{name} {times['wall_seconds']:.2f}s wall / {times['cpu_seconds']:.2f}s cpu" for name, times in stages.items()
+    ))
+    git = report["git"]
+    print(f"Git: {git['calls']} calls, {git['seconds']:.2f}s; bytes written: {report['bytes_written']['total']}")
+    for page in report["render"]["slowest"][:5]:
+        print(f"  {page['wall_seconds'] * 1e3:8.1f} ms  {page['source']}")
+
+
+def build(
+    args: BuildOptions,
+    sources: List[Path],
+    state: Optional[BuildState] = None,
+    page_timings: Optional[Dict[str, List[float]]] = None,
+) -> BuildResult:
+    """Build the site into the current build's output and return what was rendered.
+
+    With a `state`, parsed sources, the git index and the build manifest are
+    taken from and kept in memory, so only changed sources are read again.
+    `page_timings` (or the `--profile` report) receives [wall, cpu, bytes
+    written] per rendered page.
+    """
+    build_context = current_build()
+    site = build_context.site
+    log = build_context.log
+    warnings: List[str] = []
+    memory_budget = args.source_memory_mb * 1024 * 1024
+    with stage("load"):
+        if state is None:
+            source_to_output = {source: map_output_path(source) for source in sources}
+            documents = load_documents(sources, memory_budget)
+        else:
+            source_to_output = state.output_map(sources)
+            documents = state.refresh_documents(sources, memory_budget)
+        titles = {source: document.title for source, document in documents.items()}
+    sharded = args.shard is not None or bool(args.merge)
+    # Shards render on different machines, so pages must not carry the build time.
+    reproducible = args.reproducible or sharded or "SOURCE_DATE_EPOCH" in os.environ
+    with stage("release"):
+        if state is None:
+            release_infos = collect_release_infos(sources, load_git_index(), reproducible)
+        else:
+            release_infos = state.refresh_release_infos(sources, reproducible)
+    if reproducible and not all("generated" in info for info in release_infos.values()):
+        if sharded:
+            raise ValueError("--shard and --merge need commit history or SOURCE_DATE_EPOCH to stamp pages")
+        warnings.append("no commit history to stamp pages with; set SOURCE_DATE_EPOCH for reproducible output")
+        log(f"Warning: {warnings[-1]}")
+    generator_link_path = find_generator_link_path()
+
+    if args.clean:
+        site.clear()
+    with stage("assets"):
+        assets = write_static_assets(args.minify, args.mermaid_cdn)
+
+    with stage("nav"):
+        if state is None:
+            nav_model = build_nav_model(source_to_output, titles)
+        else:
+            nav_model = state.refresh_nav_model(source_to_output, titles)
+        nav_top = [[group_name, output.as_posix()] for group_name, output in nav_model.top_targets]
+        write_shared_nav(nav_model if args.shared_nav else None)
+
+    with stage("plan"):
+        digests = {source: document.digest for source, document in documents.items()}
+        if args.full or sharded:
+            previous: Dict[str, object] = {}
+        elif state is not None and state.manifest is not None:
+            previous = state.manifest
+        else:
+            previous = load_build_manifest()
+        search_index = SearchIndex() if state is None else state.search_index
+        if args.shard is None and not search_index.resume(previous):
+            # Skipped pages would have no postings, so render everything.
+            previous = {}
+        dirty = plan_rebuild(
+            sources,
+            source_to_output,
+            titles,
+            digests,
+            release_infos,
+            generator_link_path,
+            assets["mermaid.js"],
+            args.minify,
+            args.shared_nav,
+            nav_top,
+            previous,
+        )
+        if args.shard is not None:
+            dirty = {source for source in dirty if shard_index(source, args.shard[1]) == args.shard[0]}
+        elif args.merge:
+            dirty = set()
+        previous_pages = manifest_pages(previous)
+        remove_stale_outputs(previous_pages, source_to_output)
+        plan = shard_plan(sources, source_to_output, titles, digests, release_infos, generator_link_path, assets, args)
+
+    context = RenderContext(
+        source_to_output=source_to_output,
+        titles=titles,
+        nav_model=nav_model,
+        assets=assets,
+        generator_link_path=generator_link_path,
+        generated_at=datetime.now(timezone.utc),
+        minify=args.minify,
+        shared_nav=args.shared_nav,
+    )
+    work = [(documents[source], release_infos[source]) for source in sources if source in dirty]
+    if state is None:
+        documents.clear()
+    render_cache = (args.render_cache or "") if args.render_cache_mb > 0 else ""
+    cache_config: CacheConfig = (args.link_cache_size, args.inline_cache_size, render_cache)
+    configure_render_caches(*cache_config)
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    if page_timings is None and build_context.profile is not None:
+        page_timings = build_context.profile.page_timings
+    with stage("render"):
+        if args.merge:
+            previous_pages = merge_shards(args.merge, plan, sources)
+        if jobs > 1 and len(work) > 1:
+            pages, cache_stats, page_writes = build_pages_parallel(work, context, jobs, cache_config, page_timings)
+        else:
+            pages = render_pages(work, context, page_timings)
+            cache_stats = take_cache_stats()
+            page_writes = take_page_writes()
+    if args.shard is not None:
+        with stage("manifest"):
+            write_shard_manifest(args.shard, plan, pages)
+        log(f"Rendered shard {args.shard[0]}/{args.shard[1]}: {len(pages)} of {len(sources)} pages at {site.name}")
+        return build_result(sources, dirty, pages, page_timings, warnings, [])
+    for source in sources:
+        if source not in dirty:
+            pages[source.as_posix()] = previous_pages[source.as_posix()]
+
+    with stage("search"):
+        # Merged pages arrive with their search terms, like freshly rendered ones.
+        indexed = pages.keys() if args.merge else (source.as_posix() for source in dirty)
+        search_index.update({} if args.merge else previous_pages, pages, indexed)
+        search_token = search_index.write()
+    broken: List[Tuple[str, str, str]] = []
+    if args.link_check != "off":
+        with stage("links"):
+            generated = [path for path in assets.values() if not LINK_SCHEME_RE.match(path)]
+            generated += ["assets/manifest.json", f"{SEARCH_DIR}/meta.json"]
+            if args.shared_nav:
+                generated.append("nav.json")
+            if args.site_url:
+                generated.append("sitemap.xml")
+            checked, broken = check_links(pages, planned_site_paths(pages, generated))
+        report_links(checked, broken, args.link_report)
+        if broken:
+            warnings.append(f"{len(broken)} of {checked} intra-doc links are broken")
+    if args.site_url:
+        write_sitemap(args.site_url, pages)
+    with stage("manifest"):
+        manifest = write_build_manifest(
+            generator_link_path, assets["mermaid.js"], args, nav_top, pages, search_token
+        )
+    if state is not None:
+        state.manifest = manifest
+    if args.precompress:
+        with stage("compress"):
+            compressed, unchanged = precompress_site(jobs)
+        log(f"Precompressed {compressed} files ({unchanged} unchanged)")
+    elif isinstance(site, DirectoryOutput):
+        # Not keyed on the manifest: --full and --clean builds start without one.
+        remove_precompressed()
+    log(f"Generated {len(sources)} pages at {site.name} ({len(dirty)} rendered, {len(sources) - len(dirty)} skipped as unchanged)")
+    if work:
+        log(f"Wrote {page_writes[0]} pages; {page_writes[1]} re-rendered pages were unchanged on disk")
+        log("Render caches: " + ", ".join(
+            f"{name} {hits} hits / {misses} misses" for name, (hits, misses) in cache_stats.items()
+        ))
+    if render_cache and cache_stats.get("rendered pages", [0, 0])[1]:
+        entries, size, evicted = prune_disk_cache(Path(render_cache), args.render_cache_mb * 1024 * 1024)
+        log(f"Render cache: {entries} entries, {size / (1024 * 1024):.1f} MB ({evicted} evicted)")
+    return build_result(sources, dirty, pages, page_timings, warnings, broken)
+
+
+def build_staged(
+    args: BuildOptions,
+    sources: List[Path],
+    state: Optional[BuildState] = None,
+    page_timings: Optional[Dict[str, List[float]]] = None,
+) -> BuildResult:
+    """Build a new generation of the site next to it and publish it in one atomic step.
+
+    The generation starts with the published files (unless `--clean`), so the
+    incremental build sees the previous output and replaces only the files
+    that change; the published files are never written. Each generation
+    records the files its build changed, so the one before the published
+    generation is recycled by re-linking just those files from the published
+    one; without that record every published file is hard-linked. The site
+    directory then becomes a symlink to the new generation, swapped with a
+    single rename, so readers see either the old or the new site. The
+    previous generation is kept for requests still reading it. A failed
+    build leaves the published site as it was.
+    """
+    build_context = current_build()
+    if not isinstance(build_context.site, DirectoryOutput):
+        raise ValueError("atomic publishing needs a directory output")
+    site_root = build_context.site.home
+    generations = site_root.with_name(f".{site_root.name}-generations")
+    generations.mkdir(parents=True, exist_ok=True)
+    published = site_root.resolve() if site_root.exists() else None
+    staging = generations / f"gen-{time.time_ns()}-{os.getpid()}"
+    with stage("stage"):
+        linked = None if published is None or args.clean else recycle_generation(generations, published, staging)
+        if linked is None:
+            staging.mkdir()
+            linked = link_tree(published, staging) if published is not None and not args.clean else 0
+            how = "linked from the previous generation"
+        else:
+            how = "caught up in a recycled generation"
+    output = DirectoryOutput(staging, home=site_root, linked=True)
+    build_context.use_output(output)
+    try:
+        result = build(args, sources, state, page_timings)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    finally:
+        build_context.use_output(DirectoryOutput(site_root))
+    with stage("publish"):
+        # Workers write rendered pages through their own outputs, so add those here.
+        output.changed.update(page.output for page in result.pages.values() if page.rendered)
+        changed = None if args.clean else sorted(output.changed)
+        base = published.name if published is not None and published.parent == generations.resolve() else None
+        (generations / f"{staging.name}.json").write_text(json.dumps({"base": base, "changed": changed}), encoding="utf-8")
+        previous = publish_generation(site_root, staging)
+        keep = {staging.name, f"{staging.name}.json"}
+        if previous is not None:
+            keep.update((previous.name, f"{previous.name}.json"))
+        for entry in os.scandir(generations):
+            if entry.name not in keep:
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                else:
+                    os.unlink(entry.path)
+    build_context.log(f"Published {staging.name} at {site_root} ({linked} files {how})")
+    result = result._replace(timings=dict(build_context.stage_seconds), output=DirectoryOutput(site_root))
+    return result
+
+
+def recycle_generation(generations: Path, published: Path, staging: Path) -> Optional[int]:
+    """Turn the generation before `published` into `staging` holding the published files.
+
+    The published generation's record names the generation it was built from
+    and the files its build changed; only those are re-linked or removed.
+    Return the number of files caught up, or None (leaving `staging` absent)
+    when there is no record or no such generation to recycle.
+    """
+    try:
+        record = json.loads((generations / f"{published.name}.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    base = record.get("base") if isinstance(record, dict) else None
+    changed = record.get("changed") if isinstance(record, dict) else None
+    if not isinstance(base, str) or not isinstance(changed, list) or base in ("", published.name):
+        return None
+    recycled = generations / base
+    if os.path.dirname(base) or not recycled.is_dir() or recycled.is_symlink():
+        return None
+    os.rename(recycled, staging)
+    (generations / f"{base}.json").unlink(missing_ok=True)
+    for rel in changed:
+        rel = posixpath.normpath(str(rel))
+        if rel.startswith(("/", "../")) or rel in (".", ".."):
+            continue
+        source_path = os.path.join(published, rel)
+        target_path = os.path.join(staging, rel)
+        if os.path.isfile(source_path):
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            # Replaced, not unlinked first: a reader still holding this generation sees one file or the other.
+            link_file(source_path, target_path + ".tmp")
+            os.replace(target_path + ".tmp", target_path)
+        elif os.path.isfile(target_path):
+            os.unlink(target_path)
+    return len(changed)
+
+
+def link_tree(source: Path, target: Path) -> int:
+    """Hard-link every file under `source` into `target`, copying where links are not possible; return the count."""
+    count = 0
+    for directory, dirnames, filenames in os.walk(source):
+        target_dir = os.path.join(target, os.path.relpath(directory, source))
+        for name in dirnames:
+            os.makedirs(os.path.join(target_dir, name), exist_ok=True)
+        for name in filenames:
+            if name.endswith(".tmp"):
+                continue
+            link_file(os.path.join(directory, name), os.path.join(target_dir, name))
+            count += 1
+    return count
 
-    sources = collect_sources()
-    if not sources:
-        raise SystemExit("No markdown sources found.")
 
-    source_to_output = {source: map_output_path(source) for source in sources}
-    titles = {source: extract_title(source) for source in sources}
-    release_context = collect_release_context(sources)
-    generator_link_path = Path("docs-toolkit.zip")
-    if not (REPO_ROOT / generator_link_path).exists():
-        generator_link_path = Path("docs-toolkit/README.md")
-    if not (REPO_ROOT / generator_link_path).exists():
-        generator_link_path = Path("utils/docs/build_docs_site.py")
+def link_file(source_path: str, target_path: str) -> None:
+    try:
+        os.link(source_path, target_path)
+    except OSError:
+        # Another filesystem, or no hard links: copy2 keeps the mtime precompression checks.
+        shutil.copy2(source_path, target_path)
+
+
+def publish_generation(site_root: Path, generation: Path) -> Optional[Path]:
+    """Point `site_root` at `generation` and return the directory it showed before, if any.
+
+    A symlink is replaced by renaming a new one over it. A site that is
+    still a plain directory is exchanged with the new symlink in one
+    renameat2(RENAME_EXCHANGE) call and then moved into the generations
+    directory; only where that call is unavailable is the directory moved
+    aside first, leaving a brief window without a site.
+    """
+    temp_link = site_root.with_name(f".{site_root.name}.{os.getpid()}.link")
+    if temp_link.is_symlink():
+        temp_link.unlink()
+    os.symlink(os.path.relpath(generation, site_root.parent), temp_link)
+    if site_root.is_symlink() or not site_root.exists():
+        previous = site_root.resolve() if site_root.is_symlink() else None
+        os.replace(temp_link, site_root)
+        return previous
+    previous = generation.with_name(f"gen-{time.time_ns()}-previous")
+    if exchange_paths(temp_link, site_root):
+        os.rename(temp_link, previous)
+    else:
+        current_build().log(
+            f"Warning: {site_root} is a directory and atomic exchange is unavailable; replacing it non-atomically"
+        )
+        os.rename(site_root, previous)
+        os.replace(temp_link, site_root)
+    return previous
 
-    if args.clean and SITE_ROOT.exists():
-        shutil.rmtree(SITE_ROOT)
-    SITE_ROOT.mkdir(parents=True, exist_ok=True)
 
+def exchange_paths(first: Path, second: Path) -> bool:
+    """Swap two directory entries atomically with Linux renameat2(RENAME_EXCHANGE); return False where unsupported."""
+    try:
+        renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+    except (OSError, TypeError, AttributeError):
+        return False
+    at_fdcwd, rename_exchange = -100, 2
+    return renameat2(at_fdcwd, os.fsencode(first), at_fdcwd, os.fsencode(second), rename_exchange) == 0
+
+
+def build_result(
+    sources: List[Path],
+    dirty: Set[Path],
+    pages: Dict[str, PageEntry],
+    page_timings: Optional[Dict[str, List[float]]],
+    warnings: List[str],
+    broken: List[Tuple[str, str, str]],
+) -> BuildResult:
+    """Collect the BuildResult of the sources that have an entry in `pages`."""
+    build_context = current_build()
+    timings = page_timings or {}
+    results: Dict[str, PageResult] = {}
     for source in sources:
-        output_rel = source_to_output[source]
-        output_path = SITE_ROOT / output_rel
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-
-        source_text = (REPO_ROOT / source).read_text(encoding="utf-8")
-        if source.suffix.lower() == ".mmd":
-            content_html = render_mermaid_source(source_text)
-            toc_html = ""
-        else:
-            content_html = render_markdown(source_text, source, output_rel, source_to_output)
-            toc_html = build_table_of_contents(source_text)
-        navigation_html = build_navigation(source, output_rel, source_to_output, titles)
-        top_nav_html = build_top_navigation(source, output_rel, source_to_output)
-        source_href = rel_href(Path("docs/site") / output_rel.parent, source)
-        home_href = rel_href(output_rel.parent, Path("index.html"))
-        generator_href = rel_href(Path("docs/site") / output_rel.parent, generator_link_path)
-        release_info = build_release_info(source, release_context)
-
-        page_html = page_template(
-            title=titles[source],
-            source=source,
-            source_href=source_href,
-            home_href=home_href,
-            generator_href=generator_href,
-            top_nav_html=top_nav_html,
-            nav_html=navigation_html,
-            toc_html=toc_html,
-            content_html=content_html,
-            release_info=release_info,
+        key = source.as_posix()
+        if key not in pages:
+            continue
+        timing = timings.get(key)
+        results[key] = PageResult(
+            output=str(pages[key]["output"]),
+            title=str(pages[key]["title"]),
+            rendered=source in dirty,
+            seconds=timing[0] if timing is not None else 0.0,
         )
-        output_path.write_text(page_html, encoding="utf-8")
+    return BuildResult(
+        pages=results,
+        rendered=[source.as_posix() for source in sources if source in dirty],
+        html={},
+        timings=dict(build_context.stage_seconds),
+        warnings=warnings,
+        broken_links=broken,
+        output=build_context.site,
+    )
 
-    print(f"Generated {len(sources)} pages at {SITE_ROOT}")
-    print(f"Open {SITE_ROOT / 'index.html'}")
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """Parse an `I/N` shard argument; shards are numbered from 0."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected I/N, got {value!r}") from None
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be in 0..{count - 1}, got {value!r}")
+    return index, count
+
+
+def shard_index(source: Path, count: int) -> int:
+    """Return the shard of `source` among `count`: a stable hash of its path, the same on every machine."""
+    digest = hashlib.sha256(source.as_posix().encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count
+
+
+def shard_plan(
+    sources: List[Path],
+    source_to_output: Dict[Path, Path],
+    titles: Dict[Path, str],
+    digests: Dict[Path, str],
+    release_infos: Dict[Path, Dict[str, str]],
+    generator_link_path: Path,
+    assets: Dict[str, str],
+    args: BuildOptions,
+) -> str:
+    """Digest everything a page render depends on besides its own body.
+
+    Shards and the merge step each compute it from their checkout; equal
+    digests mean they saw the same sources, titles, navigation, release
+    stamps, assets and options, so the merged site matches a single build.
+    """
+    digest = hashlib.sha256(json.dumps({
+        "builder": builder_fingerprint(),
+        "generator": generator_link_path.as_posix(),
+        "assets": assets,
+        "minify": args.minify,
+        "shared_nav": args.shared_nav,
+    }, sort_keys=True).encode("utf-8"))
+    for source in sources:
+        digest.update(
+            f"\n{source.as_posix()}\0{source_to_output[source].as_posix()}\0{titles[source]}\0"
+            f"{digests[source]}\0{release_digest(release_infos[source])}".encode("utf-8")
+        )
+    return digest.hexdigest()
+
+
+def write_shard_manifest(shard: Tuple[int, int], plan: str, pages: Dict[str, PageEntry]) -> None:
+    """Record a shard's pages, with their search terms, for `--merge`."""
+    index, count = shard
+    manifest = {"version": MANIFEST_VERSION, "shard": [index, count], "plan": plan, "pages": pages}
+    content = json.dumps(manifest, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    if current_build().site.write(SHARD_MANIFEST_NAME.format(index=index, count=count), content, atomic=True):
+        record_write("manifest", len(content))
+
+
+def merge_shards(directories: Sequence[str], plan: str, sources: List[Path]) -> Dict[str, PageEntry]:
+    """Copy the pages of every shard found in `directories` into the output and return their manifest entries.
+
+    Raises ValueError unless the shards are exactly 0..N-1 of one N, were
+    built from the same plan as this checkout, and together cover every
+    source once with its page file present.
+    """
+    build_context = current_build()
+    found: Dict[int, Tuple[Path, Dict[str, object]]] = {}
+    counts: Set[int] = set()
+    for directory in directories:
+        for path in sorted(Path(directory).glob(SHARD_MANIFEST_NAME.format(index="*", count="*"))):
+            try:
+                manifest = json.loads(path.read_text(encoding="utf-8"))
+                index, count = manifest["shard"]
+            except (OSError, ValueError, KeyError, TypeError) as exc:
+                raise ValueError(f"Unreadable shard manifest {path}: {exc}") from None
+            if manifest.get("version") != MANIFEST_VERSION or manifest.get("plan") != plan:
+                raise ValueError(f"{path} was built from different sources, history or options than this checkout")
+            if index in found:
+                raise ValueError(f"Shard {index}/{count} found twice: {found[index][0]} and {path}")
+            found[index] = (path, manifest)
+            counts.add(count)
+    if len(counts) != 1:
+        raise ValueError(f"Expected the shards of one build, found shard counts {sorted(counts) or 'none'}")
+    count = counts.pop()
+    missing_shards = sorted(set(range(count)) - set(found))
+    if missing_shards:
+        raise ValueError(f"Missing shards {', '.join(f'{index}/{count}' for index in missing_shards)}")
+
+    pages: Dict[str, PageEntry] = {}
+    for index, (path, manifest) in sorted(found.items()):
+        for key, entry in manifest_pages(manifest).items():
+            if shard_index(Path(key), count) != index:
+                raise ValueError(f"{path} has {key}, which belongs to shard {shard_index(Path(key), count)}/{count}")
+            output = str(entry["output"])
+            try:
+                content = (path.parent / output).read_bytes()
+            except OSError:
+                raise ValueError(f"Shard {index}/{count} is missing {output} in {path.parent}") from None
+            if build_context.site.write(output, content):
+                build_context.page_writes[0] += 1
+            else:
+                build_context.page_writes[1] += 1
+            pages[key] = entry
+        build_context.site.remove(path.name)
+    missing = [source.as_posix() for source in sources if source.as_posix() not in pages]
+    if missing:
+        raise ValueError(f"Shards have no page for {len(missing)} sources, e.g. {', '.join(missing[:5])}")
+    build_context.log(f"Merged {len(pages)} pages from {count} shards")
+    return pages
+
+
+def find_generator_link_path() -> Path:
+    """Return what the "generated by" footer link points at, relative to the repository root."""
+    for candidate in (Path("docs-toolkit.zip"), Path("docs-toolkit/README.md")):
+        if repo_file_exists(candidate.as_posix()):
+            return candidate
+    return Path("utils/docs/build_docs_site.py")
+
+
+def watch(args: argparse.Namespace, sources: List[Path]) -> int:
+    """Rebuild whenever sources change, serving the site with live reload.
+
+    Sources are polled by size and mtime every `--interval` seconds and the
+    source globs are re-scanned every WATCH_RESCAN_SECONDS to pick up added or
+    removed files. A new commit (HEAD change) also triggers a rebuild so
+    release badges stay current.
+    """
+    state = BuildState()
+    build(args, sources, state)
+    # --clean and --full only apply to the first build.
+    args.clean = False
+    args.full = False
+
+    server: Optional[PreviewServer] = None
+    if not args.no_serve:
+        server = PreviewServer(args.host, args.port)
+        print(f"Serving {current_build().site_root} at {server.url}")
+    print("Watching for changes (Ctrl+C to stop).")
+
+    last_scan = time.monotonic()
+    try:
+        while True:
+            time.sleep(args.interval)
+            if time.monotonic() - last_scan >= WATCH_RESCAN_SECONDS:
+                sources, _discovery = collect_sources()
+                last_scan = time.monotonic()
+            if not sources or not state.has_changes(sources):
+                continue
+            started = time.perf_counter()
+            try:
+                rendered = build(args, sources, state).rendered
+            except (OSError, UnicodeDecodeError) as exc:
+                # Usually a file caught mid-save; the next poll retries.
+                print(f"Build failed: {exc}")
+                continue
+            print(f"Rebuilt in {(time.perf_counter() - started) * 1000:.0f} ms")
+            if server is not None and rendered:
+                server.reload.notify()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if server is not None:
+            server.close()
+    return 0
+
+
+class ReloadSignal:
+    """A generation counter that preview clients wait on."""
+
+    def __init__(self) -> None:
+        self.condition = threading.Condition()
+        self.generation = 0
+
+    def notify(self) -> None:
+        with self.condition:
+            self.generation += 1
+            self.condition.notify_all()
+
+    def wait(self, generation: int, timeout: float) -> int:
+        with self.condition:
+            self.condition.wait_for(lambda: self.generation != generation, timeout)
+            return self.generation
+
+
+class PreviewHandler(SimpleHTTPRequestHandler):
+    """Serve docs/site, adding a live-reload hook to HTML pages on the fly."""
+
+    reload: ReloadSignal
+
+    def do_GET(self) -> None:
+        request_path = urlsplit(self.path).path
+        if request_path == LIVE_RELOAD_PATH:
+            self.stream_reloads()
+            return
+        file_path = Path(self.translate_path(self.path))
+        if request_path.endswith("/"):
+            file_path = file_path / "index.html"
+        if file_path.suffix != ".html" or not file_path.is_file():
+            super().do_GET()
+            return
+        body = file_path.read_bytes()
+        marker = body.rfind(b"</body>")
+        if marker != -1:
+            body = body[:marker] + LIVE_RELOAD_SNIPPET.encode("utf-8") + body[marker:]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream_reloads(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        generation = self.reload.generation
+        try:
+            while True:
+                latest = self.reload.wait(generation, timeout=15)
+                # Comment lines keep the connection open and detect closed tabs.
+                self.wfile.write(b"data: reload\n\n" if latest != generation else b": ping\n\n")
+                self.wfile.flush()
+                generation = latest
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+class PreviewServer:
+    """Serve docs/site from a background thread."""
+
+    def __init__(self, host: str, port: int) -> None:
+        self.reload = ReloadSignal()
+        handler = type("BoundPreviewHandler", (PreviewHandler,), {"reload": self.reload})
+        self.httpd = ThreadingHTTPServer((host, port), partial(handler, directory=str(current_build().site_root)))
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}/"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def serve(args: argparse.Namespace, sources: List[Path]) -> int:
+    """Serve pages rendered when first requested instead of building docs/site.
+
+    Nothing is written to docs/site: assets and rendered pages are kept in
+    memory, the pages in an LRU bounded by `--serve-cache-mb`.
+    """
+    started = time.perf_counter()
+    current_build().use_output(MemoryOutput())
+    site = OnDemandSite(args, sources)
+    handler = type("BoundOnDemandHandler", (OnDemandHandler,), {"site": site})
+    httpd = ThreadingHTTPServer((args.host, args.port), handler)
+    httpd.daemon_threads = True
+    print(f"Loaded {len(sources)} sources in {(time.perf_counter() - started) * 1000:.0f} ms")
+    print(f"Serving pages on demand at http://{args.host}:{httpd.server_address[1]}/ (Ctrl+C to stop).")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        site.close()
+        httpd.server_close()
+    pages = site.pages
+    print(
+        f"Page cache: {pages.hits} hits / {pages.misses} misses, {len(pages.entries)} pages, "
+        f"{pages.size / (1024 * 1024):.1f} MB"
+    )
     return 0
 
 
-def collect_sources() -> List[Path]:
-    discovered: Dict[Path, None] = {}
-    for pattern in SOURCE_GLOBS:
-        for path in REPO_ROOT.glob(pattern):
-            if not path.is_file():
+class PageCache:
+    """Rendered pages in least-recently-used order, bounded by their total size in bytes.
+
+    Each entry carries a version string; a lookup with a different version
+    is a miss.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[str, Tuple[str, bytes]]" = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, version: str) -> Optional[bytes]:
+        entry = self.entries.get(key)
+        if entry is None or entry[0] != version:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: str, version: str, content: bytes) -> None:
+        self.discard(key)
+        if len(content) > self.max_bytes:
+            return
+        self.entries[key] = (version, content)
+        self.size += len(content)
+        while self.size > self.max_bytes:
+            _key, (_version, evicted) = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def discard(self, key: str) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.size = 0
+
+
+class OnDemandSite:
+    """The site of `--serve`: navigation is computed at startup, pages when requested.
+
+    Startup reads every source once for its title and content hash but keeps
+    no source text, so memory grows with the page cache, not the corpus. A
+    background thread rescans the source list every WATCH_RESCAN_SECONDS; a
+    request whose source changed since the last scan wakes it and waits for
+    that scan alone. Cached pages are validated against their source's content
+    hash and release badge, and the cache is emptied when the nav model
+    changes, since every page embeds it. `lock` only guards lookups and
+    refreshes: pages render outside it, so a slow page or rescan does not
+    hold up other requests. The rescan and request threads run in the
+    BuildContext the site was created in.
+    """
+
+    def __init__(self, args: argparse.Namespace, sources: List[Path]) -> None:
+        self.args = args
+        self.build_context = current_build()
+        self.lock = threading.Lock()
+        self.scanned = threading.Condition(self.lock)
+        self.scan_requested = threading.Event()
+        self.scans = 0
+        self.generation = 0
+        self.state = BuildState()
+        self.pages = PageCache(args.serve_cache_mb * 1024 * 1024)
+        self.outputs: Dict[str, Path] = {}
+        self.context: Optional[RenderContext] = None
+        self.assets = write_static_assets(args.minify, args.mermaid_cdn)
+        self.generator_link_path = find_generator_link_path()
+        self.refresh(sources)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.rescan, daemon=True)
+        self.thread.start()
+
+    def refresh(self, sources: List[Path]) -> None:
+        """Reload changed sources and rebuild the render context if the nav changed; call with `lock` held."""
+        args = self.args
+        state = self.state
+        source_to_output = state.output_map(sources)
+        documents = state.refresh_documents(sources, 0)
+        titles = {source: document.title for source, document in documents.items()}
+        state.refresh_release_infos(sources, args.reproducible or "SOURCE_DATE_EPOCH" in os.environ)
+        nav_model = state.refresh_nav_model(source_to_output, titles)
+        render_cache = args.render_cache if args.render_cache_mb > 0 else ""
+        configure_render_caches(args.link_cache_size, args.inline_cache_size, render_cache)
+        # Pages still rendering from before this refresh must not be cached.
+        self.generation += 1
+        if self.context is None or nav_model is not self.context.nav_model:
+            self.pages.clear()
+            write_shared_nav(nav_model if args.shared_nav else None)
+            self.context = RenderContext(
+                source_to_output=source_to_output,
+                titles=titles,
+                nav_model=nav_model,
+                assets=self.assets,
+                generator_link_path=self.generator_link_path,
+                generated_at=datetime.now(timezone.utc),
+                minify=args.minify,
+                shared_nav=args.shared_nav,
+                search=False,
+            )
+        self.outputs = {output.as_posix(): source for source, output in source_to_output.items()}
+
+    def rescan(self) -> None:
+        with use_build(self.build_context):
+            self.rescan_until_stopped()
+
+    def rescan_until_stopped(self) -> None:
+        while not self.stopped.is_set():
+            self.scan_requested.wait(WATCH_RESCAN_SECONDS)
+            self.scan_requested.clear()
+            try:
+                # The source walk runs unlocked; only the refresh holds up requests.
+                sources, _discovery = collect_sources()
+                with self.lock:
+                    if self.state.has_changes(sources):
+                        self.refresh(sources)
+            except (OSError, UnicodeDecodeError) as exc:
+                # Usually a file caught mid-save; the next scan retries.
+                print(f"Rescan failed: {exc}")
+            finally:
+                with self.lock:
+                    self.scans += 1
+                    self.scanned.notify_all()
+
+    def get(self, path: str) -> Optional[bytes]:
+        """Return the content of the site file at `path`, rendering a page if needed, or None."""
+        with self.lock:
+            source = self.outputs.get(path)
+            if source is None:
+                return self.build_context.site.read(path)
+            try:
+                current = source_stamp(source) == self.state.stamps.get(source)
+            except OSError:
+                current = False
+            if not current:
+                # Any scan that refreshes after this point sees the change.
+                target = self.scans + 1
+                self.scan_requested.set()
+                self.scanned.wait_for(lambda: self.scans >= target or self.stopped.is_set())
+                source = self.outputs.get(path)
+                if source is None:
+                    return None
+            assert self.context is not None
+            document = self.state.documents[source]
+            release_info = self.state.release_infos[source]
+            context = self.context
+            generation = self.generation
+            version = f"{document.digest}:{release_digest(release_info)}"
+            content = self.pages.get(path, version)
+        if content is None:
+            page_html, _entry = render_page(document, release_info, context)
+            content = page_html.encode("utf-8")
+            with self.lock:
+                if self.generation == generation:
+                    self.pages.put(path, version, content)
+        return content
+
+    def close(self) -> None:
+        self.stopped.set()
+        self.scan_requested.set()
+        with self.lock:
+            self.scanned.notify_all()
+
+
+class OnDemandHandler(BaseHTTPRequestHandler):
+    """Serve an OnDemandSite."""
+
+    site: OnDemandSite
+
+    def do_GET(self) -> None:
+        path = unquote(urlsplit(self.path).path).lstrip("/")
+        if not path or path.endswith("/"):
+            path += "index.html"
+        try:
+            with use_build(self.site.build_context):
+                content = self.site.get(path)
+        except (OSError, UnicodeDecodeError) as exc:
+            self.send_error(500, f"Could not render {path}: {exc}")
+            return
+        if content is None:
+            self.send_error(404)
+            return
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type == "application/json":
+            content_type += "; charset=utf-8"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        # Fingerprinted assets never change; everything else is checked on each load.
+        immutable = path.startswith("assets/") and path != "assets/manifest.json"
+        self.send_header("Cache-Control", ASSET_CACHE_CONTROL if immutable else "no-cache")
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+def build_page(
+    document: SourceDocument,
+    release_info: Dict[str, str],
+    context: RenderContext,
+) -> PageEntry:
+    """Render one page, write it into the site and return its manifest entry."""
+    build_context = current_build()
+    page_html, entry = render_page(document, release_info, context)
+    if build_context.site.write(str(entry["output"]), page_html.encode("utf-8")):
+        build_context.page_writes[0] += 1
+    else:
+        build_context.page_writes[1] += 1
+    return entry
+
+
+def render_page(
+    document: SourceDocument,
+    release_info: Dict[str, str],
+    context: RenderContext,
+) -> Tuple[str, PageEntry]:
+    """Render one page and return its HTML and manifest entry."""
+    source = document.source
+    output_rel = context.source_to_output[source]
+
+    lines = document.lines if document.lines is not None else load_document(source).lines or []
+    is_diagram = source.suffix.lower() == ".mmd"
+    render_cache = current_build().render_caches.get("rendered pages")
+    body: PageBody
+    if render_cache is None:
+        body = render_page_body(document, lines, output_rel, context)
+    else:
+        key = render_cache_key(render_cache.version, document, lines, output_rel, context.source_to_output)
+        body = render_cache.get(key, lambda: render_page_body(document, lines, output_rel, context))
+    content_html = body["content"]
+    toc_html = body["toc"]
+    has_mermaid = is_diagram or '<pre class="mermaid">' in content_html
+    if context.shared_nav:
+        navigation_html = build_shared_navigation(source, output_rel, context.nav_model)
+    else:
+        navigation_html = build_navigation(source, output_rel, context.nav_model)
+    top_nav_html = build_top_navigation(source, output_rel, context.nav_model)
+    source_href = rel_href(SITE_LINK_ROOT / output_rel.parent, source)
+    home_href = rel_href(output_rel.parent, Path("index.html"))
+    generator_href = rel_href(SITE_LINK_ROOT / output_rel.parent, context.generator_link_path)
+    root_prefix = "../" * len(output_rel.parent.parts)
+    generated = release_info.get("generated")
+    generated_at = datetime.fromisoformat(generated) if generated else context.generated_at
+    mermaid_href = ""
+    if has_mermaid:
+        mermaid_href = context.assets["mermaid.js"]
+        if not mermaid_href:
+            raise ValueError(
+                f"{source} has Mermaid diagrams but {MERMAID_VENDOR_PATH} is missing; "
+                "vendor the library there or pass --mermaid-cdn"
+            )
+        if mermaid_href != MERMAID_CDN_URL:
+            mermaid_href = root_prefix + mermaid_href
+
+    page_html = page_template(
+        title=context.titles[source],
+        source=source,
+        source_href=source_href,
+        home_href=home_href,
+        generator_href=generator_href,
+        top_nav_html=top_nav_html,
+        nav_html=navigation_html,
+        toc_html=toc_html,
+        content_html=content_html,
+        release_info=release_info,
+        generated_at=generated_at,
+        stylesheet_href=root_prefix + context.assets["docs.css"],
+        script_href=root_prefix + context.assets["docs.js"],
+        mermaid_href=mermaid_href,
+        search=context.search,
+    )
+    if context.minify:
+        page_html = minify_html(page_html)
+    return page_html, {
+        "output": output_rel.as_posix(),
+        "hash": document.digest,
+        "title": document.title,
+        "release": release_digest(release_info),
+        "mermaid": has_mermaid,
+        "links": collect_links(body["refs"], source),
+        "search": body["search"],
+        "anchors": body["anchors"],
+        "refs": body["refs"],
+    }
+
+
+def render_page_body(
+    document: SourceDocument,
+    lines: List[str],
+    output_rel: Path,
+    context: RenderContext,
+) -> PageBody:
+    """Render the parts of a page that depend only on its source and link targets.
+
+    Markdown is parsed once; the HTML, table of contents, search entry, anchors
+    and link targets are all taken from that model.
+    """
+    source = document.source
+    links: List[str] = []
+    if source.suffix.lower() == ".mmd":
+        blocks: List[Block] = []
+        content_html = render_mermaid_source("\n".join(lines))
+    else:
+        blocks = parse_markdown(lines)
+        content_html = render_markdown(blocks, source, output_rel, context.source_to_output, links)
+    headings = document_headings(blocks)
+    return {
+        "content": content_html,
+        "toc": build_table_of_contents(headings),
+        "search": collect_search_entry(blocks, document.title),
+        "anchors": sorted({slug for _level, _text, slug in headings}),
+        "refs": list(dict.fromkeys(links)),
+    }
+
+
+def render_cache_key(
+    version: str,
+    document: SourceDocument,
+    lines: List[str],
+    output_rel: Path,
+    source_to_output: Dict[Path, Path],
+) -> str:
+    """Key a page body by renderer version, source path and hash, and link-map fingerprint.
+
+    The fingerprint covers where each of the page's link targets resolves and
+    the output it maps to, so pages elsewhere in the site can be added or
+    removed without invalidating this one.
+    """
+    source = document.source
+    key = hashlib.sha256(f"{version}\0{source.as_posix()}\0{output_rel.as_posix()}\0{document.digest}".encode("utf-8"))
+    targets: Set[str] = set()
+    for line in lines:
+        if "](" in line:
+            targets.update(match.group(2).strip().split("#", 1)[0] for match in LINK_RE.finditer(line))
+    for target in sorted(targets):
+        if target.startswith(("http://", "https://", "mailto:")):
+            continue
+        candidate = resolve_repo_path(target, source)
+        output = source_to_output.get(candidate) if candidate is not None else None
+        key.update(f"\0{target}\0{candidate}\0{output}".encode("utf-8"))
+    return key.hexdigest()
+
+
+def write_static_assets(minify: bool = False, mermaid_cdn: bool = False) -> Dict[str, str]:
+    """Write content-hashed shared assets and return their site-relative paths.
+
+    `assets/manifest.json` maps each logical name to its fingerprinted file and
+    the Cache-Control header it can be served with; superseded fingerprints are
+    removed. `mermaid.js` is the vendored Mermaid library; when
+    `vendor/mermaid.min.js` is missing it is MERMAID_CDN_URL with `mermaid_cdn`
+    and "" otherwise, which `render_page` rejects for pages with diagrams.
+    """
+    site = current_build().site
+    paths: Dict[str, str] = {}
+    manifest: Dict[str, Dict[str, str]] = {}
+    css, js = (minify_css(PAGE_CSS), minify_js(PAGE_JS)) if minify else (PAGE_CSS, PAGE_JS)
+    contents = [("docs.css", css.encode("utf-8")), ("docs.js", js.encode("utf-8"))]
+    try:
+        contents.append(("mermaid.js", MERMAID_VENDOR_PATH.read_bytes()))
+    except OSError:
+        paths["mermaid.js"] = MERMAID_CDN_URL if mermaid_cdn else ""
+        for stale_name in fnmatch.filter(site.listdir("assets"), "mermaid.*.js"):
+            site.remove(f"assets/{stale_name}")
+    for logical_name, content in contents:
+        digest = hashlib.sha256(content).hexdigest()
+        stem, suffix = logical_name.rsplit(".", 1)
+        file_name = f"{stem}.{digest[:12]}.{suffix}"
+        if site.write(f"assets/{file_name}", content):
+            record_write("assets", len(content))
+        for stale_name in fnmatch.filter(site.listdir("assets"), f"{stem}.*.{suffix}"):
+            if stale_name != file_name:
+                site.remove(f"assets/{stale_name}")
+        paths[logical_name] = f"assets/{file_name}"
+        manifest[logical_name] = {
+            "path": f"assets/{file_name}",
+            "sha256": digest,
+            "cache_control": ASSET_CACHE_CONTROL,
+        }
+    manifest_text = (json.dumps(manifest, indent=2, sort_keys=True) + "\n").encode("utf-8")
+    if site.write("assets/manifest.json", manifest_text):
+        record_write("assets", len(manifest_text))
+    return paths
+
+
+def render_pages(
+    work: List[PageWork],
+    context: RenderContext,
+    page_timings: Optional[Dict[str, List[float]]] = None,
+) -> Dict[str, PageEntry]:
+    """Render `work` in order; with `page_timings`, also record [wall, cpu, bytes written] per page."""
+    build_context = current_build()
+    if page_timings is None:
+        return {document.source.as_posix(): build_page(document, info, context) for document, info in work}
+    pages: Dict[str, PageEntry] = {}
+    for document, info in work:
+        key = document.source.as_posix()
+        written = build_context.page_writes[0]
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        entry = build_page(document, info, context)
+        elapsed = time.perf_counter() - started
+        pages[key] = entry
+        page_timings[key] = [
+            elapsed,
+            time.process_time() - cpu_started,
+            build_context.site.size(str(entry["output"])) if build_context.page_writes[0] != written else 0,
+        ]
+    return pages
+
+
+def take_page_writes() -> List[int]:
+    """Return [written, unchanged] page counts since the last call and reset them."""
+    page_writes = current_build().page_writes
+    counts = list(page_writes)
+    page_writes[:] = [0, 0]
+    return counts
+
+
+def minify_html(text: str) -> str:
+    """Collapse whitespace in text between tags.
+
+    Tags (with their attribute values) and the content of <pre>, <textarea>,
+    <script> and <style> are kept verbatim. Whitespace next to a block-level
+    tag is dropped; elsewhere a run shrinks to one space or newline, so inline
+    content renders the same.
+    """
+    parts = MINIFY_RAW_RE.split(text)
+    # split() yields text, tag, tag name, text, ...; drop the tag-name groups.
+    del parts[2::3]
+    for index in range(0, len(parts), 2):
+        chunk = parts[index]
+        if not chunk or not chunk.isspace() and "  " not in chunk and "\n" not in chunk:
+            continue
+        if chunk.isspace() and (
+            (index > 0 and MINIFY_BLOCK_TAG_RE.match(parts[index - 1]))
+            or (index + 1 < len(parts) and MINIFY_BLOCK_TAG_RE.match(parts[index + 1]))
+        ):
+            parts[index] = ""
+            continue
+        parts[index] = re.sub(r"\s+", lambda match: "\n" if "\n" in match.group(0) else " ", chunk)
+    return "".join(parts)
+
+
+def minify_css(text: str) -> str:
+    """Drop comments and insignificant whitespace, leaving string literals untouched."""
+
+    def replace(match: "re.Match[str]") -> str:
+        if match.group(1):
+            return match.group(1)
+        if match.group(2):
+            return match.group(2)
+        if match.group(3):
+            return ":"
+        return "" if match.group(0).startswith("/*") else " "
+
+    return MINIFY_CSS_RE.sub(replace, text).replace(";}", "}").strip()
+
+
+def minify_js(text: str) -> str:
+    """Strip indentation, blank lines and whole-line comments; line breaks are kept for ASI."""
+    lines = (line.strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line and not line.startswith("//")) + "\n"
+
+
+def precompress_site(jobs: int) -> Tuple[int, int]:
+    """Write .gz (and .br) siblings for compressible site files; return (compressed, unchanged).
+
+    A sibling carries its source's mtime, so files left untouched by the build
+    are not compressed again. Siblings whose source is gone are removed.
+    """
+    todo: List[str] = []
+    unchanged = 0
+    suffixes = (".gz", ".br") if brotli is not None else (".gz",)
+    for directory, dirnames, filenames in os.walk(current_build().site_root):
+        dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+        names = set(filenames)
+        for name in filenames:
+            path = os.path.join(directory, name)
+            if name.endswith((".gz", ".br")):
+                if name[:-3] not in names:
+                    os.unlink(path)
+                    record_site_change(path)
+                continue
+            if name.startswith(".") or os.path.splitext(name)[1] not in COMPRESS_SUFFIXES:
                 continue
-            rel = path.relative_to(REPO_ROOT)
-            if rel.parts[:2] == ("docs", "site"):
+            stat = os.stat(path)
+            if stat.st_size < COMPRESS_MIN_BYTES:
                 continue
-            if rel.parts[:3] == ("docs", "utils", "templates"):
+            fresh = True
+            for suffix in suffixes:
+                try:
+                    fresh = fresh and os.stat(path + suffix).st_mtime_ns == stat.st_mtime_ns
+                except OSError:
+                    fresh = False
+            if fresh:
+                unchanged += 1
+            else:
+                todo.append(path)
+    if todo:
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            for size in pool.map(compress_file, todo):
+                record_write("compressed", size)
+    return len(todo), unchanged
+
+
+def compress_file(path: str) -> int:
+    with open(path, "rb") as handle:
+        content = handle.read()
+    stat = os.stat(path)
+    siblings = [(path + ".gz", gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        siblings.append((path + ".br", brotli.compress(content, quality=11)))
+    for sibling, compressed in siblings:
+        # Replaced rather than rewritten: the old sibling may be linked into the live generation.
+        with open(sibling + ".tmp", "wb") as handle:
+            handle.write(compressed)
+        os.utime(sibling + ".tmp", ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(sibling + ".tmp", sibling)
+        record_site_change(sibling)
+    return sum(len(compressed) for _, compressed in siblings)
+
+
+def remove_precompressed() -> None:
+    """Delete every .gz and .br sibling, so `gzip_static` cannot serve a page older than its HTML."""
+    for directory, _dirnames, filenames in os.walk(current_build().site_root):
+        for name in filenames:
+            if name.endswith((".gz", ".br")):
+                os.unlink(os.path.join(directory, name))
+                record_site_change(os.path.join(directory, name))
+
+
+def record_site_change(path: str) -> None:
+    site = current_build().site
+    if isinstance(site, DirectoryOutput):
+        site.record_change(path)
+
+
+def write_sitemap(site_url: str, pages: Dict[str, PageEntry]) -> None:
+    base = site_url.rstrip("/") + "/"
+    outputs = sorted(str(entry["output"]) for entry in pages.values())
+    rows = [f"  <url><loc>{xml_escape(base + quote(output))}</loc></url>" for output in outputs]
+    content = "\n".join([
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">',
+        *rows,
+        "</urlset>",
+        "",
+    ]).encode("utf-8")
+    if current_build().site.write("sitemap.xml", content):
+        record_write("sitemap", len(content))
+
+
+def build_pages_parallel(
+    work: List[PageWork],
+    context: RenderContext,
+    jobs: int,
+    cache_config: CacheConfig,
+    page_timings: Optional[Dict[str, List[float]]] = None,
+) -> Tuple[Dict[str, PageEntry], Dict[str, List[int]], List[int]]:
+    """Render pages across a process pool.
+
+    The render context is sent once per worker through the pool initializer and
+    page work is submitted in small chunks, with at most two chunks in flight per
+    worker, so memory stays bounded regardless of corpus size. Each chunk also
+    reports the worker's render cache counters and page write counts, which are
+    summed, and, when `page_timings` is given, its per-page timings. Workers
+    write pages into a directory output themselves; pages for a memory output
+    come back with the chunk and are written here.
+    """
+    build_context = current_build()
+    site = build_context.site
+    chunk_size = max(1, min(PAGE_CHUNK_SIZE, len(work) // (jobs * 4)))
+    pages: Dict[str, PageEntry] = {}
+    cache_stats: Dict[str, List[int]] = {}
+    page_writes = [0, 0]
+
+    def collect(future: "Future[ChunkResult]") -> None:
+        chunk_pages, chunk_stats, chunk_timings, chunk_writes, chunk_files = future.result()
+        pages.update(chunk_pages)
+        if chunk_files:
+            chunk_writes = [0, 0]
+            for path, content in chunk_files.items():
+                chunk_writes[0 if site.write(path, content) else 1] += 1
+        page_writes[0] += chunk_writes[0]
+        page_writes[1] += chunk_writes[1]
+        for name, counts in chunk_stats.items():
+            totals = cache_stats.setdefault(name, [0, 0])
+            totals[0] += counts[0]
+            totals[1] += counts[1]
+        if page_timings is not None:
+            page_timings.update(chunk_timings)
+
+    site_root = str(site.root) if isinstance(site, DirectoryOutput) else ""
+    site_linked = isinstance(site, DirectoryOutput) and site.linked
+    initargs = (
+        context, cache_config, page_timings is not None, str(build_context.repo_root), site_root, site_linked,
+        build_context.tree,
+    )
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=initargs) as pool:
+        pending = set()
+        for chunk in chunked(work, chunk_size):
+            pending.add(pool.submit(_build_page_chunk, chunk))
+            if len(pending) >= jobs * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future)
+        for future in pending:
+            collect(future)
+    return pages, cache_stats, page_writes
+
+
+def chunked(items: List[PageWork], size: int) -> Iterator[List[PageWork]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _init_worker(
+    context: RenderContext,
+    cache_config: CacheConfig,
+    profile: bool,
+    repo_root: str,
+    site_root: str,
+    site_linked: bool,
+    tree: Optional[GitTree],
+) -> None:
+    global _WORKER_CONTEXT, _WORKER_PROFILE
+    _WORKER_CONTEXT = context
+    _WORKER_PROFILE = profile
+    output = DirectoryOutput(Path(site_root), linked=site_linked) if site_root else MemoryOutput()
+    build_context = BuildContext(Path(repo_root), output)
+    build_context.tree = tree
+    # A worker only ever works for this one build.
+    _CURRENT_BUILD.set(build_context)
+    configure_render_caches(*cache_config)
+
+
+def _build_page_chunk(chunk: List[PageWork]) -> ChunkResult:
+    site = current_build().site
+    if _WORKER_CONTEXT is None:
+        raise RuntimeError("Worker used before initialization.")
+    page_timings: Dict[str, List[float]] = {}
+    pages = render_pages(chunk, _WORKER_CONTEXT, page_timings if _WORKER_PROFILE else None)
+    files: Dict[str, bytes] = {}
+    if isinstance(site, MemoryOutput):
+        files, site.files = site.files, {}
+    return pages, take_cache_stats(), page_timings, take_page_writes(), files
+
+
+def configure_render_caches(link_size: int, inline_size: int, render_cache: str = "") -> None:
+    """Start empty per-build caches for link resolution and inline fragments.
+
+    With a `render_cache` directory, rendered page bodies are also looked up
+    in and added to that on-disk cache.
+    """
+    caches: Dict[str, MemoCache] = {
+        "link resolution": BoundedCache(link_size),
+        "path existence": BoundedCache(link_size),
+        "symlinks": BoundedCache(link_size),
+        "inline fragments": BoundedCache(inline_size),
+    }
+    if render_cache:
+        caches["rendered pages"] = DiskCache(Path(render_cache))
+    current_build().render_caches = caches
+
+
+def prune_disk_cache(root: Path, max_bytes: int) -> Tuple[int, int, int]:
+    """Evict least recently used entries until `root` fits in `max_bytes`.
+
+    Returns the remaining entry count and size, and the number evicted.
+    """
+    entries: List[Tuple[float, int, str]] = []
+    try:
+        shards = list(os.scandir(root))
+    except OSError:
+        return 0, 0, 0
+    for shard in shards:
+        if not shard.is_dir():
+            continue
+        for entry in os.scandir(shard.path):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    size = sum(entry[1] for entry in entries)
+    evicted = 0
+    if size > max_bytes:
+        entries.sort()
+        for _mtime, entry_size, path in entries:
+            if size <= max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
                 continue
-            discovered[rel] = None
-    return sorted(discovered)
+            size -= entry_size
+            evicted += 1
+    return len(entries) - evicted, size, evicted
+
+
+def take_cache_stats() -> Dict[str, List[int]]:
+    """Return hit/miss counts since the last call and reset the counters."""
+    stats: Dict[str, List[int]] = {}
+    for name, cache in current_build().render_caches.items():
+        stats[name] = [cache.hits, cache.misses]
+        cache.hits = 0
+        cache.misses = 0
+    return stats
+
+
+def cached(name: str, key: Hashable, compute: Callable[[], CacheValue]) -> CacheValue:
+    cache = current_build().render_caches.get(name)
+    if cache is None:
+        return compute()
+    return cache.get(key, compute)
+
+
+def collect_sources(use_git: bool = True, globs: Sequence[str] = SOURCE_GLOBS) -> Tuple[List[Path], str]:
+    """Return the files matching `globs` (SOURCE_GLOBS by default) and how they were found.
+
+    Inside a git work tree this is a single `git ls-files` call listing tracked
+    and untracked, non-ignored files. Otherwise the directories the globs can
+    match are walked once, skipping SOURCE_PRUNE_DIRS, virtualenvs and paths
+    excluded by `.gitignore` files before descending into them.
+    """
+    build_context = current_build()
+    matcher = re.compile("|".join(f"(?:{glob_regex(pattern)})" for pattern in globs))
+    if build_context.tree is not None:
+        candidates = [path for path, (mode, _oid) in build_context.tree.files.items() if mode != "120000"]
+        method = f"git ls-tree {build_context.tree.rev}"
+    else:
+        candidates = git_source_candidates(globs) if use_git and find_git_dir() is not None else []
+        method = "git ls-files"
+    if not candidates:
+        candidates = walk_source_candidates(build_context.repo_root, matcher, globs)
+        method = "directory walk"
+    discovered = [
+        Path(rel)
+        for rel in candidates
+        if matcher.fullmatch(rel) and not source_path_excluded(rel)
+    ]
+    return sorted(discovered), method
+
+
+def git_source_candidates(globs: Sequence[str] = SOURCE_GLOBS) -> List[str]:
+    """List tracked and untracked, non-ignored files matching `globs`, relative to the repository root."""
+    listing = run_git([
+        "ls-files", "-z", "--cached", "--others", "--exclude-standard", "--",
+        *(f":(glob){pattern}" for pattern in globs),
+    ])
+    root = str(current_build().repo_root)
+    virtualenvs: Dict[str, bool] = {}
+    candidates: List[str] = []
+    for rel in dict.fromkeys(listing.split("\0")):
+        # The index still lists tracked files deleted from the work tree.
+        if rel and os.path.isfile(os.path.join(root, rel)) and not in_virtualenv(root, rel, virtualenvs):
+            candidates.append(rel)
+    return candidates
+
+
+def in_virtualenv(root: str, rel: str, cache: Dict[str, bool]) -> bool:
+    """Return True if a directory above `rel` holds a pyvenv.cfg (an unignored virtualenv)."""
+    parent = posixpath.dirname(rel)
+    if not parent:
+        return False
+    found = cache.get(parent)
+    if found is None:
+        found = os.path.exists(os.path.join(root, parent, "pyvenv.cfg")) or in_virtualenv(root, parent, cache)
+        cache[parent] = found
+    return found
+
+
+def walk_source_candidates(root: Path, matcher: "re.Pattern[str]", globs: Sequence[str] = SOURCE_GLOBS) -> List[str]:
+    """Walk the directories `globs` can match, once, and return matching files."""
+    bases: Set[str] = set()
+    exact: List[str] = []
+    for pattern in globs:
+        parts = pattern.split("/")
+        literal = list(itertools.takewhile(lambda part: not any(ch in part for ch in "*?["), parts))
+        if len(literal) == len(parts):
+            exact.append(pattern)
+        else:
+            bases.add("/".join(literal))
+    # A base inside another base is covered by the outer walk.
+    bases = {
+        base
+        for base in bases
+        if not any(other != base and (not other or base.startswith(other + "/")) for other in bases)
+    }
+
+    rules_cache: Dict[str, List[IgnoreRule]] = {}
+    found: List[str] = []
+    for rel in exact:
+        rules = directory_ignore_rules(root, posixpath.dirname(rel), rules_cache)
+        if os.path.isfile(root / rel) and not ignored_path(rules, rel, False):
+            found.append(rel)
+
+    stack: List[Tuple[str, List[IgnoreRule]]] = []
+    for base in sorted(bases):
+        rules = directory_ignore_rules(root, posixpath.dirname(base), rules_cache) if base else []
+        if not base or not ignored_path(rules, base, True):
+            stack.append((base, rules))
+    while stack:
+        rel_dir, rules = stack.pop()
+        try:
+            with os.scandir(os.path.join(root, rel_dir)) as scan:
+                entries = list(scan)
+        except OSError:
+            continue
+        names = {entry.name for entry in entries}
+        if "pyvenv.cfg" in names:
+            continue
+        if ".gitignore" in names:
+            rules = rules + read_gitignore(root, rel_dir)
+        prefix = rel_dir + "/" if rel_dir else ""
+        for entry in entries:
+            rel = prefix + entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if is_dir:
+                if entry.name in SOURCE_PRUNE_DIRS or rel in SOURCE_EXCLUDE_DIRS or ignored_path(rules, rel, True):
+                    continue
+                stack.append((rel, rules))
+            elif matcher.fullmatch(rel) and not ignored_path(rules, rel, False) and entry.is_file():
+                found.append(rel)
+    return found
+
+
+def source_path_excluded(rel: str) -> bool:
+    path = f"/{rel}"
+    if any(f"/{name}/" in path for name in SOURCE_PRUNE_DIRS):
+        return True
+    return any(path.startswith(f"/{directory}/") for directory in SOURCE_EXCLUDE_DIRS)
+
+
+def directory_ignore_rules(root: Path, rel_dir: str, cache: Dict[str, List[IgnoreRule]]) -> List[IgnoreRule]:
+    """Return the `.gitignore` rules that apply inside `rel_dir`, from the root down."""
+    rules = cache.get(rel_dir)
+    if rules is None:
+        inherited = directory_ignore_rules(root, posixpath.dirname(rel_dir), cache) if rel_dir else []
+        rules = inherited + read_gitignore(root, rel_dir)
+        cache[rel_dir] = rules
+    return rules
+
+
+def read_gitignore(root: Path, rel_dir: str) -> List[IgnoreRule]:
+    try:
+        text = (root / rel_dir / ".gitignore").read_text(encoding="utf-8", errors="replace")
+    except OSError:
+        return []
+    rules: List[IgnoreRule] = []
+    for line in text.splitlines():
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            continue
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        elif line.startswith("\\"):
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            continue
+        # A slash anywhere but the end anchors the pattern to this directory.
+        anchored = "/" in line
+        pattern = glob_regex(line.lstrip("/"))
+        if not anchored:
+            pattern = "(?:.*/)?" + pattern
+        rules.append(IgnoreRule(rel_dir, re.compile(pattern), negate, dir_only))
+    return rules
+
+
+def ignored_path(rules: List[IgnoreRule], rel: str, is_dir: bool) -> bool:
+    """Apply `.gitignore` rules in order; the last matching rule decides."""
+    ignored = False
+    for rule in rules:
+        if rule.dir_only and not is_dir:
+            continue
+        path = rel[len(rule.base) + 1:] if rule.base else rel
+        if rule.pattern.fullmatch(path):
+            ignored = not rule.negate
+    return ignored
+
+
+def glob_regex(pattern: str) -> str:
+    """Translate a gitignore-style glob: `*` and `?` stay within one path segment, `**/` spans directories."""
+    parts: List[str] = []
+    index = 0
+    while index < len(pattern):
+        if pattern.startswith("**/", index):
+            parts.append("(?:.*/)?")
+            index += 3
+        elif pattern.startswith("**", index):
+            parts.append(".*")
+            index += 2
+        elif pattern[index] == "*":
+            parts.append("[^/]*")
+            index += 1
+        elif pattern[index] == "?":
+            parts.append("[^/]")
+            index += 1
+        elif pattern[index] == "[" and "]" in pattern[index + 2:]:
+            end = pattern.index("]", index + 2)
+            body = pattern[index + 1:end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            parts.append("[" + body.replace("\\", "\\\\") + "]")
+            index = end + 1
+        else:
+            parts.append(re.escape(pattern[index]))
+            index += 1
+    return "".join(parts)
 
 
 def map_output_path(source_rel: Path) -> Path:
@@ -138,34 +2864,734 @@ def map_output_path(source_rel: Path) -> Path:
             return relative.with_name("index.html")
         return relative
 
-    return Path("reference") / source_rel.with_suffix(".html")
+    return Path("reference") / source_rel.with_suffix(".html")
+
+
+def load_documents(sources: List[Path], memory_budget: int) -> Dict[Path, SourceDocument]:
+    """Read every source once, keeping parsed lines until the memory budget is spent."""
+    documents: Dict[Path, SourceDocument] = {}
+    retained = 0
+    for source in sources:
+        document = load_document(source, keep_lines=retained < memory_budget)
+        if document.lines is not None:
+            retained += sum(len(line) for line in document.lines)
+        documents[source] = document
+    return documents
+
+
+def load_document(source_rel: Path, keep_lines: bool = True) -> SourceDocument:
+    """Read one source, memory-mapping files of MMAP_THRESHOLD bytes or more.
+
+    A mapped file is hashed and scanned for its title without copying it into
+    memory; its lines are only decoded when `keep_lines` asks for them.
+    """
+    build_context = current_build()
+    path = build_context.repo_root / source_rel
+    if build_context.tree is not None or path.stat().st_size < MMAP_THRESHOLD:
+        data = build_context.tree.read(source_rel.as_posix()) if build_context.tree is not None else path.read_bytes()
+        lines = data.decode("utf-8").splitlines()
+        return SourceDocument(
+            source=source_rel,
+            digest=hashlib.sha256(data).hexdigest(),
+            title=extract_title(source_rel, lines),
+            lines=lines if keep_lines else None,
+        )
+
+    with path.open("rb") as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        digest = hashlib.sha256(mapped).hexdigest()
+        mapped_lines: Optional[List[str]] = None
+        if keep_lines:
+            mapped_lines = mapped[:].decode("utf-8").splitlines()
+            title = extract_title(source_rel, mapped_lines)
+        else:
+            title = extract_title(
+                source_rel,
+                (raw.decode("utf-8", errors="replace") for raw in iter(mapped.readline, b"")),
+            )
+    return SourceDocument(source=source_rel, digest=digest, title=title, lines=mapped_lines)
+
+
+def source_stamp(source_rel: Path) -> Tuple[int, int]:
+    build_context = current_build()
+    if build_context.tree is not None:
+        return build_context.tree.stamp(source_rel.as_posix())
+    stat = os.stat(os.path.join(build_context.repo_root, source_rel))
+    return stat.st_mtime_ns, stat.st_size
+
+
+def extract_title(source_rel: Path, lines: Iterable[str]) -> str:
+    """Return the first level-1 heading (outside code blocks), or a diagram's leading `%%` comment."""
+    fallback = source_rel.stem.replace("_", " ").replace("-", " ").title()
+    if source_rel.suffix.lower() != ".mmd":
+        for block in iter_blocks(lines):
+            if block.kind == "heading" and block.level == 1:
+                return block.text
+        return fallback
+
+    heading_title = ""
+    for line in lines:
+        stripped = line.strip()
+        if stripped.startswith("%%"):
+            return stripped.strip("% ").strip() or fallback
+        if not heading_title and stripped.startswith("# "):
+            heading_title = stripped[2:].strip()
+    return heading_title or fallback
+
+
+def builder_fingerprint() -> str:
+    return hashlib.sha256(Path(__file__).read_bytes()).hexdigest()
+
+
+def release_digest(release_info: Dict[str, str]) -> str:
+    return hashlib.sha256(json.dumps(release_info, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def collect_links(refs: List[str], source_rel: Path) -> Dict[str, bool]:
+    """Return repo-relative targets of a page's rendered links mapped to whether they exist.
+
+    Links into the generated site are left out: they render the same whether
+    or not the output exists yet, and `check_links` resolves them against the
+    planned outputs.
+    """
+    links: Dict[str, bool] = {}
+    for target in refs:
+        if not target or target.startswith(("http://", "https://", "mailto:", "#")):
+            continue
+        link_target = target.split("#", 1)[0]
+        if link_target.startswith("/") and not link_target.startswith(str(current_build().repo_root)):
+            candidate: Optional[Path] = Path(link_target.lstrip("/"))
+        else:
+            candidate = resolve_repo_path(link_target, source_rel)
+        if candidate is None or site_link_path(candidate) is not None:
+            continue
+        key = candidate.as_posix()
+        if key not in links:
+            links[key] = repo_path_exists(candidate)
+    return links
+
+
+def check_links(
+    pages: Dict[str, PageEntry], site_paths: Set[str]
+) -> Tuple[int, List[Tuple[str, str, str]]]:
+    """Validate every page's links against the repository and the heading anchors of this build.
+
+    `pages` are manifest entries, so pages skipped as unchanged are checked
+    with the links and anchors recorded when they were last rendered. Links
+    into the generated site are checked against `site_paths` (see
+    `planned_site_paths`) rather than the disk, which on a first or `--clean`
+    build does not have the pages yet. Returns the number of links checked
+    and (source, target, reason) for broken ones.
+    """
+    anchors = {key: set(entry.get("anchors") or ()) for key, entry in pages.items()}
+    checked = 0
+    broken: List[Tuple[str, str, str]] = []
+    for key in sorted(pages):
+        source = Path(key)
+        for target in pages[key].get("refs") or ():
+            if not target or LINK_SCHEME_RE.match(target):
+                continue
+            checked += 1
+            link_target, _, fragment = target.partition("#")
+            target_key = key
+            if link_target:
+                candidate = resolve_repo_path(link_target, source)
+                if candidate is None:
+                    reason = "target not found" if link_target.startswith("/") else "outside the repository"
+                    broken.append((key, target, reason))
+                    continue
+                site_path = site_link_path(candidate)
+                exists = site_path in site_paths if site_path is not None else repo_path_exists(candidate)
+                if not exists:
+                    broken.append((key, target, "target not found"))
+                    continue
+                target_key = candidate.as_posix()
+            slug = slugify(fragment) if fragment else ""
+            if slug and target_key in anchors and slug not in anchors[target_key]:
+                broken.append((key, target, f"no heading #{slug} in {target_key}"))
+    return checked, broken
+
+
+def report_links(checked: int, broken: List[Tuple[str, str, str]], report_path: Optional[str]) -> None:
+    log = current_build().log
+    if report_path:
+        report = {
+            "checked": checked,
+            "broken": [{"source": source, "target": target, "reason": reason} for source, target, reason in broken],
+        }
+        Path(report_path).write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    if not broken:
+        return
+    log(f"Links: {len(broken)} of {checked} intra-doc links are broken")
+    for source, target, reason in broken[:LINK_REPORT_LIMIT]:
+        log(f"  {source}: {target} ({reason})")
+    if len(broken) > LINK_REPORT_LIMIT:
+        suffix = f"; see {report_path}" if report_path else "; write them all with --link-report PATH"
+        log(f"  ... and {len(broken) - LINK_REPORT_LIMIT} more{suffix}")
+
+
+def site_link_path(path_rel: Path) -> Optional[str]:
+    """Return the site-relative path of a repo-relative link target into the generated site, else None.
+
+    Both SITE_LINK_ROOT and the output directory, when it lies in the
+    repository, count as the site.
+    """
+    build_context = current_build()
+    roots = [SITE_LINK_ROOT]
+    if isinstance(build_context.site, DirectoryOutput):
+        try:
+            roots.append(build_context.site.home.relative_to(build_context.repo_root))
+        except ValueError:
+            pass
+    for root in roots:
+        try:
+            relative = path_rel.relative_to(root).as_posix()
+        except ValueError:
+            continue
+        return "" if relative == "." else relative
+    return None
+
+
+def planned_site_paths(pages: Dict[str, PageEntry], generated: Iterable[str]) -> Set[str]:
+    """Return the pages and `generated` files this build writes, plus every directory holding one."""
+    files = {str(entry["output"]) for entry in pages.values()}
+    files.update(generated)
+    paths = set(files)
+    for path in files:
+        while path:
+            path = posixpath.dirname(path)
+            if path in paths:
+                break
+            paths.add(path)
+    return paths
+
+
+def repo_path_exists(path_rel: Path) -> bool:
+    return cached("path existence", path_rel, lambda: repo_file_exists(path_rel.as_posix()))
+
+
+def repo_file_exists(rel: str) -> bool:
+    """Return whether the file or directory `rel` exists in the work tree, or in the --rev tree."""
+    build_context = current_build()
+    if build_context.tree is not None:
+        return build_context.tree.exists(posixpath.normpath(rel).lstrip("/") if rel else "")
+    return os.path.exists(os.path.join(build_context.repo_root, rel))
+
+
+def manifest_pages(manifest: Dict[str, object]) -> Dict[str, PageEntry]:
+    """Return the page entries of a loaded build or shard manifest, or {} when it has none."""
+    pages = manifest.get("pages")
+    return cast(Dict[str, PageEntry], pages) if isinstance(pages, dict) else {}
+
+
+def load_build_manifest() -> Dict[str, object]:
+    content = current_build().site.read(MANIFEST_NAME)
+    try:
+        manifest = json.loads(content) if content is not None else {}
+    except ValueError:
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
+
+
+def write_build_manifest(
+    generator_link_path: Path,
+    mermaid_asset: str,
+    args: BuildOptions,
+    nav_top: List[List[str]],
+    pages: Dict[str, PageEntry],
+    search_token: str,
+) -> Dict[str, object]:
+    manifest: Dict[str, object] = {
+        "version": MANIFEST_VERSION,
+        "builder": builder_fingerprint(),
+        "generator": generator_link_path.as_posix(),
+        "mermaid": mermaid_asset,
+        "minify": args.minify,
+        "precompress": args.precompress,
+        "shared_nav": args.shared_nav,
+        "nav_top": nav_top,
+        "search_index": search_token,
+        "pages": pages,
+    }
+    manifest_text = json.dumps(manifest, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    if current_build().site.write(MANIFEST_NAME, manifest_text, atomic=True):
+        record_write("manifest", len(manifest_text))
+    return manifest
+
+
+def plan_rebuild(
+    sources: List[Path],
+    source_to_output: Dict[Path, Path],
+    titles: Dict[Path, str],
+    digests: Dict[Path, str],
+    release_infos: Dict[Path, Dict[str, str]],
+    generator_link_path: Path,
+    mermaid_asset: str,
+    minify: bool,
+    shared_nav: bool,
+    nav_top: List[List[str]],
+    previous: Dict[str, object],
+) -> Set[Path]:
+    """Return the sources whose pages must be re-rendered.
+
+    Every page embeds the full navigation (all output paths and titles), so any
+    change to that set invalidates every page. With `shared_nav` pages only
+    embed their own nav group and the top navigation, so a nav change only
+    invalidates the groups it touched unless the top navigation targets moved.
+    Otherwise a page is re-rendered when its content or release status changed,
+    its output is missing, one of its link targets outside the generated site
+    appeared or disappeared since it was last rendered, or it has diagrams and
+    the Mermaid library it loads changed.
+    """
+    previous_pages = previous.get("pages")
+    if (
+        not isinstance(previous_pages, dict)
+        or previous.get("version") != MANIFEST_VERSION
+        or previous.get("builder") != builder_fingerprint()
+        or previous.get("generator") != generator_link_path.as_posix()
+        or bool(previous.get("minify")) != minify
+        or bool(previous.get("shared_nav")) != shared_nav
+    ):
+        return set(sources)
+
+    previous_nav = {
+        key: (entry.get("output"), entry.get("title"))
+        for key, entry in previous_pages.items()
+        if isinstance(entry, dict)
+    }
+    current_nav = {
+        source.as_posix(): (source_to_output[source].as_posix(), titles[source])
+        for source in sources
+    }
+    dirty: Set[Path] = set()
+    if previous_nav != current_nav:
+        if not shared_nav or previous.get("nav_top") != nav_top:
+            return set(sources)
+        changed_groups = {
+            nav_group(Path(key))
+            for key in previous_nav.keys() | current_nav.keys()
+            if previous_nav.get(key) != current_nav.get(key)
+        }
+        dirty.update(source for source in sources if nav_group(source) in changed_groups)
+
+    mermaid_changed = previous.get("mermaid") != mermaid_asset
+    exists_cache: Dict[str, bool] = {}
+    for source in sources:
+        if source in dirty:
+            continue
+        entry = previous_pages[source.as_posix()]
+        if (
+            entry.get("hash") != digests[source]
+            or entry.get("release") != release_digest(release_infos[source])
+            or (mermaid_changed and entry.get("mermaid"))
+            or not current_build().site.exists(source_to_output[source].as_posix())
+        ):
+            dirty.add(source)
+            continue
+        links = entry.get("links")
+        if not isinstance(links, dict):
+            dirty.add(source)
+            continue
+        for target, existed in links.items():
+            if site_link_path(Path(target)) is not None:
+                # Generated output, which this build is about to rewrite.
+                continue
+            if target not in exists_cache:
+                exists_cache[target] = repo_file_exists(target)
+            if exists_cache[target] != existed:
+                dirty.add(source)
+                break
+    return dirty
+
+
+def remove_stale_outputs(previous_pages: Dict[str, PageEntry], source_to_output: Dict[Path, Path]) -> None:
+    current_outputs = {output.as_posix() for output in source_to_output.values()}
+    for entry in previous_pages.values():
+        if not isinstance(entry, dict):
+            continue
+        output = entry.get("output")
+        if isinstance(output, str) and output not in current_outputs:
+            current_build().site.remove(output)
+
+
+def collect_search_entry(blocks: List[Block], title: str) -> Dict[str, object]:
+    """Tokenize a page's title, headings and body for the search index.
+
+    Returns `{"sections": [[slug, heading], ...], "terms": {term: [score, section, ...]}}`
+    where section 0 is the top of the page and section n is `sections[n - 1]`.
+    Diagram sources have no blocks and are indexed by title only.
+    """
+    sections: List[List[str]] = []
+    scores: Dict[str, int] = {}
+    term_sections: Dict[str, List[int]] = {}
+
+    def add(text: str, weight: int, section: int) -> None:
+        for match in SEARCH_TOKEN_RE.finditer(text.lower()):
+            term = match.group(0)[:SEARCH_MAX_TERM]
+            if term in SEARCH_STOPWORDS:
+                continue
+            scores[term] = scores.get(term, 0) + weight
+            seen = term_sections.setdefault(term, [])
+            if section not in seen and len(seen) < SEARCH_MAX_SECTIONS:
+                seen.append(section)
+
+    add(title, SEARCH_TITLE_WEIGHT, 0)
+    section = 0
+    for block in blocks:
+        if block.kind == "heading":
+            text = LINK_RE.sub(r"\1", block.text) if "](" in block.text else block.text
+            sections.append([block.slug, SEARCH_MARKUP_RE.sub("", text)])
+            section = len(sections)
+            add(text, SEARCH_HEADING_WEIGHT, section)
+            continue
+        for text in (block.text,) if block.kind == "paragraph" else block.items:
+            add(LINK_RE.sub(r"\1", text) if "](" in text else text, 1, section)
+    return {
+        "sections": sections,
+        "terms": {term: [score, *term_sections[term]] for term, score in scores.items()},
+    }
+
+
+class SearchIndex:
+    """Inverted index over every page, sharded by term prefix under `docs/site/search/`.
+
+    Pages are numbered by sorted source path. `meta.json` lists the shard keys;
+    `terms/<key>.json` maps each term starting with that key to its top
+    SEARCH_MAX_POSTINGS postings `[page, score, section, ...]`, and
+    `pages/<n>.json` holds the output path, title and sections of pages
+    n*SEARCH_PAGE_CHUNK onwards. A browser fetches `meta.json`, one shard per
+    query term and the page chunks of the results it shows.
+
+    Full postings and each term's serialized top postings are kept per
+    two-character base prefix in `.docsmith-cache/search/`, and each manifest
+    entry records the bases its page touches. A build loads and rewrites only
+    the bases of re-rendered or removed pages, re-ranks only terms whose top
+    postings can change, and renumbers everything only when pages are added
+    or removed.
+    """
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.token = ""
+        self.damaged = False
+        self.page_keys: List[str] = []
+        self.numbers: Dict[str, int] = {}
+        self.pages: Dict[str, PageEntry] = {}
+        # base -> term -> source -> "score,section,..." (strings keep the
+        # cache cheap to load and out of the garbage collector's way)
+        self.postings: Dict[str, Dict[str, Dict[str, str]]] = {}
+        # base -> term -> (serialized top postings, (-score, page) of the last one kept)
+        self.ranked: Dict[str, Dict[str, Tuple[bytes, Optional[Tuple[int, int]]]]] = {}
+        self.shard_keys: Dict[str, List[str]] = {}
+        self.dirty_bases: Set[str] = set()
+        self.dirty_terms: Dict[str, Set[str]] = {}
+        self.dirty_chunks: Set[int] = set()
+        self.sweep = False
+
+    def resume(self, previous: Dict[str, object]) -> bool:
+        """Continue from the index written with `previous`, or reset and return False."""
+        build_context = current_build()
+        previous_pages = previous.get("pages")
+        if not self.token and build_context.search_cache_dir is not None:
+            try:
+                saved = json.loads((build_context.search_cache_dir / "state.json").read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                saved = None
+            if (
+                isinstance(saved, dict)
+                and saved.get("version") == SEARCH_INDEX_VERSION
+                and saved.get("cache") == SEARCH_CACHE_VERSION
+            ):
+                self.token = str(saved.get("token", ""))
+                shard_keys = saved.get("shards")
+                self.shard_keys = shard_keys if isinstance(shard_keys, dict) else {}
+        if (
+            self.token
+            and isinstance(previous_pages, dict)
+            and previous.get("search_index") == self.token
+            and build_context.site.exists(f"{SEARCH_DIR}/meta.json")
+        ):
+            if not self.page_keys:
+                self.page_keys = sorted(previous_pages)
+                self.numbers = {key: number for number, key in enumerate(self.page_keys)}
+            return True
+        self.reset()
+        if build_context.search_cache_dir is not None and build_context.search_cache_dir.exists():
+            shutil.rmtree(build_context.search_cache_dir)
+        # Published files are kept so unchanged ones are not rewritten; write()
+        # removes the shards the rebuilt index no longer has.
+        self.sweep = True
+        return False
+
+    def load(self, base: str) -> Tuple[Dict[str, Dict[str, str]], Dict[str, Tuple[bytes, Optional[Tuple[int, int]]]]]:
+        search_cache_dir = current_build().search_cache_dir
+        if base not in self.postings:
+            postings: Dict[str, Dict[str, str]] = {}
+            ranked: Dict[str, Tuple[bytes, Optional[Tuple[int, int]]]] = {}
+            if base in self.shard_keys and search_cache_dir is not None:
+                try:
+                    # marshal, not pickle: the cache may be restored from another branch's CI
+                    # job, and marshal only rebuilds plain values, it never runs code.
+                    saved = marshal.loads((search_cache_dir / f"{base}.marshal").read_bytes())
+                    if not (
+                        isinstance(saved, tuple)
+                        and len(saved) == 3
+                        and saved[0] == SEARCH_CACHE_VERSION
+                        and isinstance(saved[1], dict)
+                        and isinstance(saved[2], dict)
+                    ):
+                        raise ValueError(f"unexpected search cache contents for {base!r}")
+                    _, postings, ranked = saved
+                except (OSError, ValueError, EOFError, TypeError):
+                    # The next build starts over; see write().
+                    postings, ranked = {}, {}
+                    self.damaged = True
+            self.postings[base] = postings
+            self.ranked[base] = ranked
+        return self.postings[base], self.ranked[base]
+
+    def touch(self, base: str, term: str, key: str, posting: str) -> None:
+        """Mark `term` for re-ranking unless `posting` is outside its kept top postings."""
+        kept = self.ranked[base].get(term)
+        number = self.numbers.get(key)
+        if kept is None or kept[1] is None or number is None or (-posting_score(posting), number) <= kept[1]:
+            self.dirty_terms.setdefault(base, set()).add(term)
+
+    def update(
+        self,
+        previous_pages: Dict[str, PageEntry],
+        pages: Dict[str, PageEntry],
+        rendered: Iterable[str],
+    ) -> None:
+        """Replace the postings of rendered and removed pages.
+
+        Rendered entries carry their terms under `search`; they are moved into
+        the index and the entry keeps only its sections and base prefixes.
+        """
+        changed = set(rendered)
+        changed.update(key for key in previous_pages if key not in pages)
+        for key in changed:
+            previous = previous_pages.get(key)
+            previous_search = previous.get("search") if isinstance(previous, dict) else None
+            if isinstance(previous_search, dict):
+                for base in str(previous_search.get("bases", "")).split():
+                    postings, _ = self.load(base)
+                    for term in [term for term, term_postings in postings.items() if key in term_postings]:
+                        self.touch(base, term, key, postings[term].pop(key))
+                        if not postings[term]:
+                            del postings[term]
+                    self.dirty_bases.add(base)
+            entry = pages.get(key)
+            search = entry.get("search") if entry is not None else None
+            if not isinstance(search, dict):
+                continue
+            terms = cast(Dict[str, List[int]], search.pop("terms", None) or {})
+            bases: Set[str] = set()
+            for term, values in terms.items():
+                base = term[:SEARCH_MIN_PREFIX]
+                bases.add(base)
+                postings, _ = self.load(base)
+                posting = ",".join(map(str, values))
+                postings.setdefault(term, {})[key] = posting
+                self.touch(base, term, key, posting)
+            self.dirty_bases.update(bases)
+            search["bases"] = " ".join(sorted(bases))
+
+        page_keys = sorted(pages)
+        if page_keys != self.page_keys:
+            # Page numbers shifted: every shard and page chunk changes.
+            self.page_keys = page_keys
+            self.numbers = {key: number for number, key in enumerate(page_keys)}
+            self.dirty_bases.update(self.shard_keys)
+            for base in self.dirty_bases:
+                postings, ranked = self.load(base)
+                ranked.clear()
+                # Keep terms whose last posting was just removed, so write() drops their shards.
+                self.dirty_terms.setdefault(base, set()).update(postings)
+            self.dirty_chunks.update(range((len(page_keys) + SEARCH_PAGE_CHUNK - 1) // SEARCH_PAGE_CHUNK))
+        else:
+            self.dirty_chunks.update(self.numbers[key] // SEARCH_PAGE_CHUNK for key in changed if key in self.numbers)
+        self.pages = pages
+
+    def write(self) -> str:
+        """Write changed shards, page chunks and cache files; return the token for the manifest.
+
+        The token is a digest of the indexed pages and their content hashes, so
+        identical inputs produce identical manifests.
+        """
+        build_context = current_build()
+        for base in sorted(self.dirty_bases):
+            postings, ranked = self.load(base)
+            dirty_terms = self.dirty_terms.pop(base, set())
+            for term in dirty_terms:
+                if term not in postings:
+                    ranked.pop(term, None)
+                    continue
+                top = heapq.nsmallest(
+                    SEARCH_MAX_POSTINGS,
+                    ((-posting_score(posting), self.numbers[key], posting) for key, posting in postings[term].items()),
+                    key=lambda item: item[:2],
+                )
+                body = ",".join(f"[{number},{posting}]" for _, number, posting in top)
+                fragment = search_json(term) + f":[{body}]".encode("utf-8")
+                cutoff = top[-1][:2] if len(top) == SEARCH_MAX_POSTINGS else None
+                ranked[term] = (fragment, cutoff)
+            if dirty_terms:
+                shards = split_search_shard(base, {term: kept[0] for term, kept in ranked.items()})
+                for key, content in shards.items():
+                    write_search_file(f"{SEARCH_DIR}/terms/{key}.json", content)
+                for key in self.shard_keys.get(base, []):
+                    if key not in shards:
+                        build_context.site.remove(f"{SEARCH_DIR}/terms/{key}.json")
+                if shards:
+                    self.shard_keys[base] = sorted(shards)
+                else:
+                    self.shard_keys.pop(base, None)
+            if build_context.search_cache_dir is not None:
+                cache_path = build_context.search_cache_dir / f"{base}.marshal"
+                if postings:
+                    write_bytes(cache_path, marshal.dumps((SEARCH_CACHE_VERSION, postings, ranked)))
+                else:
+                    cache_path.unlink(missing_ok=True)
+            if not postings:
+                del self.postings[base], self.ranked[base]
+
+        chunk_count = (len(self.page_keys) + SEARCH_PAGE_CHUNK - 1) // SEARCH_PAGE_CHUNK
+        for chunk in sorted(self.dirty_chunks):
+            if chunk < chunk_count:
+                keys = self.page_keys[chunk * SEARCH_PAGE_CHUNK:(chunk + 1) * SEARCH_PAGE_CHUNK]
+                rows = [search_page_row(self.pages[key]) for key in keys]
+                write_search_file(f"{SEARCH_DIR}/pages/{chunk}.json", search_json(rows))
+        for name in fnmatch.filter(build_context.site.listdir(f"{SEARCH_DIR}/pages"), "*.json"):
+            stem = name[:-len(".json")]
+            if not stem.isdigit() or int(stem) >= chunk_count:
+                build_context.site.remove(f"{SEARCH_DIR}/pages/{name}")
+        if self.sweep:
+            shard_keys = {key for keys in self.shard_keys.values() for key in keys}
+            for name in fnmatch.filter(build_context.site.listdir(f"{SEARCH_DIR}/terms"), "*.json"):
+                if name[:-len(".json")] not in shard_keys:
+                    build_context.site.remove(f"{SEARCH_DIR}/terms/{name}")
+            self.sweep = False
+
+        write_search_file(f"{SEARCH_DIR}/meta.json", search_json({
+            "version": SEARCH_INDEX_VERSION,
+            "pages": len(self.page_keys),
+            "chunk": SEARCH_PAGE_CHUNK,
+            "postings": SEARCH_MAX_POSTINGS,
+            "shards": sorted(key for keys in self.shard_keys.values() for key in keys),
+        }))
+        digest = hashlib.sha256(str(SEARCH_INDEX_VERSION).encode("utf-8"))
+        for key in self.page_keys:
+            digest.update(f"\n{key}\0{self.pages[key].get('hash')}".encode("utf-8"))
+        self.token = digest.hexdigest()[:16]
+        if build_context.search_cache_dir is not None:
+            write_bytes(build_context.search_cache_dir / "state.json", search_json({
+                "version": SEARCH_INDEX_VERSION,
+                "cache": SEARCH_CACHE_VERSION,
+                "token": self.token,
+                "shards": self.shard_keys,
+            }))
+        self.dirty_bases = set()
+        self.dirty_terms = {}
+        self.dirty_chunks = set()
+        # A cache file that failed to load leaves this index incomplete, so
+        # give the manifest a token that forces a full rebuild next time.
+        return "" if self.damaged else self.token
+
+
+def posting_score(posting: str) -> int:
+    return int(posting.split(",", 1)[0])
+
+
+def search_page_row(entry: PageEntry) -> List[object]:
+    search = entry.get("search")
+    sections = search.get("sections") if isinstance(search, dict) else None
+    return [entry.get("output"), entry.get("title"), sections or []]
+
+
+def search_json(value: object) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+
+def write_search_file(path: str, content: bytes) -> None:
+    if current_build().site.write(path, content):
+        record_write("search", len(content))
+
+
+def write_bytes(path: Path, content: bytes) -> bool:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if not write_if_changed(path, content):
+        return False
+    record_write("search", len(content))
+    return True
+
 
+def write_if_changed(path: Union[str, Path], content: bytes) -> bool:
+    """Write `content` to `path` unless the file already holds exactly these bytes.
 
-def extract_title(source_rel: Path) -> str:
-    text = (REPO_ROOT / source_rel).read_text(encoding="utf-8")
-    if source_rel.suffix.lower() == ".mmd":
-        for line in text.splitlines():
-            stripped = line.strip()
-            if stripped.startswith("%%"):
-                return stripped.strip("% ").strip() or source_rel.stem.replace("_", " ").replace("-", " ").title()
-    for line in text.splitlines():
-        stripped = line.strip()
-        if stripped.startswith("# "):
-            return stripped[2:].strip()
-    return source_rel.stem.replace("_", " ").replace("-", " ").title()
+    Unchanged files keep their mtime, so rsync and CDN syncs skip them.
+    Returns True if the file was written.
+    """
+    try:
+        if os.path.getsize(path) == len(content):
+            with open(path, "rb") as handle:
+                if handle.read() == content:
+                    return False
+    except OSError:
+        pass
+    with open(path, "wb") as handle:
+        handle.write(content)
+    return True
+
+
+def record_write(kind: str, size: int) -> None:
+    profile = current_build().profile
+    if profile is not None:
+        profile.bytes_written[kind] = profile.bytes_written.get(kind, 0) + size
+
+
+def split_search_shard(key: str, fragments: Dict[str, bytes]) -> Dict[str, bytes]:
+    """Join serialized `"term":[postings]` fragments into shards of at most SEARCH_SHARD_BYTES.
+
+    An oversized shard is split by one more prefix character, up to
+    SEARCH_MAX_PREFIX. Terms no longer than the key stay in the key's own
+    shard, so a browser always looks a term up under the longest listed key
+    that prefixes it.
+    """
+    if not fragments:
+        return {}
+    size = sum(len(fragment) + 1 for fragment in fragments.values()) + 1
+    if size <= SEARCH_SHARD_BYTES or len(key) >= SEARCH_MAX_PREFIX:
+        return {key: b"{" + b",".join(fragments[term] for term in sorted(fragments)) + b"}"}
+    groups: Dict[str, Dict[str, bytes]] = {}
+    for term, fragment in fragments.items():
+        groups.setdefault(term[:len(key) + 1], {})[term] = fragment
+    shards: Dict[str, bytes] = {}
+    for group_key, group_fragments in groups.items():
+        if group_key == key:
+            shards[key] = b"{" + b",".join(group_fragments[term] for term in sorted(group_fragments)) + b"}"
+        else:
+            shards.update(split_search_shard(group_key, group_fragments))
+    return shards
 
 
 def run_git(args: List[str]) -> str:
+    build_context = current_build()
+    started = time.perf_counter()
     try:
         result = subprocess.run(
             ["git", *args],
-            cwd=REPO_ROOT,
+            cwd=build_context.repo_root,
             check=False,
             capture_output=True,
             text=True,
         )
     except OSError:
         return ""
+    finally:
+        if build_context.profile is not None:
+            build_context.profile.record_git(time.perf_counter() - started)
     if result.returncode != 0:
         return ""
     return result.stdout.strip()
@@ -190,64 +3616,238 @@ def parse_git_record(raw: str) -> Optional[Dict[str, object]]:
     }
 
 
-def collect_release_context(sources: List[Path]) -> Dict[str, object]:
+def find_git_dir() -> Optional[Path]:
+    repo_root = current_build().repo_root
+    for directory in (repo_root, *repo_root.parents):
+        candidate = directory / ".git"
+        if candidate.is_dir():
+            return candidate
+        if candidate.is_file():
+            pointer = candidate.read_text(encoding="utf-8").strip()
+            if pointer.startswith("gitdir:"):
+                return (directory / pointer[len("gitdir:"):].strip()).resolve()
+            return None
+    return None
+
+
+def read_head_commit() -> str:
+    """Resolve HEAD from the git directory on disk, falling back to `git rev-parse`; with --rev, its commit."""
+    tree = current_build().tree
+    if tree is not None:
+        return tree.commit
+    git_dir = find_git_dir()
+    if git_dir is None:
+        return ""
+    try:
+        head = (git_dir / "HEAD").read_text(encoding="utf-8").strip()
+        if not head.startswith("ref:"):
+            return head
+        ref = head[len("ref:"):].strip()
+        common_dir = git_dir
+        if (git_dir / "commondir").is_file():
+            common_dir = (git_dir / (git_dir / "commondir").read_text(encoding="utf-8").strip()).resolve()
+        for base in (git_dir, common_dir):
+            if (base / ref).is_file():
+                return (base / ref).read_text(encoding="utf-8").strip()
+        packed_refs = common_dir / "packed-refs"
+        if packed_refs.is_file():
+            for line in packed_refs.read_text(encoding="utf-8").splitlines():
+                if not line.startswith(("#", "^")) and line.endswith(f" {ref}"):
+                    return line.split(" ", 1)[0]
+    except OSError:
+        pass
+    return run_git(["rev-parse", "HEAD"])
+
+
+def build_git_index(head: str) -> Optional[Dict[str, object]]:
+    """Walk the history once and index the last change of every path.
+
+    Commit header rows are stored raw so they can be fed to `parse_git_record`,
+    and every `Release` commit keeps the full set of files it changed.
+    """
+    build_context = current_build()
+    started = time.perf_counter()
+    try:
+        process = subprocess.Popen(
+            [
+                "git",
+                "-c",
+                "core.quotePath=false",
+                "log",
+                "--name-only",
+                "--relative",
+                "--date=iso-strict",
+                "--pretty=format:%x1e%H%x1f%ad%x1f%s",
+                head,
+            ],
+            cwd=build_context.repo_root,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+        )
+    except OSError:
+        return None
+
+    commits: Dict[str, str] = {}
+    paths: Dict[str, str] = {}
+    releases: List[Dict[str, object]] = []
+    commit_hash = ""
+    row = ""
+    release_files: Optional[List[str]] = None
+    assert process.stdout is not None
+    with process.stdout:
+        for line in process.stdout:
+            line = line.rstrip("\n")
+            if line.startswith("\x1e"):
+                row = line[1:]
+                parts = row.split("\x1f")
+                commit_hash = parts[0].strip() if len(parts) == 3 else ""
+                release_files = None
+                if commit_hash and RELEASE_TAG_RE.match(parts[2].strip()):
+                    release_files = []
+                    commits[commit_hash] = row
+                    releases.append({"hash": commit_hash, "files": release_files})
+                continue
+            if not line or not commit_hash:
+                continue
+            if line not in paths:
+                paths[line] = commit_hash
+                commits[commit_hash] = row
+            if release_files is not None:
+                release_files.append(line)
+    returncode = process.wait()
+    if build_context.profile is not None:
+        build_context.profile.record_git(time.perf_counter() - started)
+    if returncode != 0:
+        return None
+    return {
+        "version": GIT_INDEX_VERSION,
+        "head": head,
+        "commits": commits,
+        "paths": paths,
+        "releases": releases,
+    }
+
+
+def load_git_index() -> Optional[Dict[str, object]]:
+    """Return the history index for HEAD, reusing the cached copy when HEAD is unchanged."""
+    build_context = current_build()
+    head = read_head_commit()
+    if not head:
+        return None
+    try:
+        cached = json.loads(build_context.git_index_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        cached = None
+    if isinstance(cached, dict) and cached.get("version") == GIT_INDEX_VERSION and cached.get("head") == head:
+        return cached
+
+    index = build_git_index(head)
+    if index is None:
+        return None
+    try:
+        build_context.cache_root.mkdir(parents=True, exist_ok=True)
+        temp_path = build_context.git_index_path.with_name(build_context.git_index_path.name + ".tmp")
+        index_text = json.dumps(index)
+        temp_path.write_text(index_text, encoding="utf-8")
+        os.replace(temp_path, build_context.git_index_path)
+        record_write("git index", len(index_text))
+    except OSError:
+        pass
+    return index
+
+
+def collect_release_context(sources: List[Path], index: Optional[Dict[str, object]]) -> Dict[str, object]:
     context: Dict[str, object] = {
         "releases": [],
         "last_release": None,
         "last_release_files": set(),
+        "release_files": {},
         "source_changes": {},
     }
 
-    release_rows = run_git([
-        "log",
-        "--grep",
-        "^Release",
-        "--date=iso-strict",
-        "--pretty=format:%H%x1f%ad%x1f%s",
-    ])
+    if index is None:
+        return context
+    commits = index.get("commits")
+    paths = index.get("paths")
+    release_rows = index.get("releases")
+    if not isinstance(commits, dict) or not isinstance(paths, dict) or not isinstance(release_rows, list):
+        return context
+
     releases: List[Dict[str, object]] = []
-    if release_rows:
-        for row in release_rows.splitlines():
-            record = parse_git_record(row)
-            if not record:
-                continue
-            match = RELEASE_TAG_RE.match(str(record["subject"]))
-            if not match:
-                continue
-            record["tag"] = match.group(1)
-            releases.append(record)
+    release_files: Dict[str, Set[str]] = {}
+    for release_row in release_rows:
+        if not isinstance(release_row, dict):
+            continue
+        commit_hash = str(release_row.get("hash", ""))
+        record = parse_git_record(commits.get(commit_hash, ""))
+        if not record:
+            continue
+        match = RELEASE_TAG_RE.match(str(record["subject"]))
+        if not match:
+            continue
+        record["tag"] = match.group(1)
+        releases.append(record)
+        release_files[commit_hash] = set(release_row.get("files") or [])
     context["releases"] = releases
     context["last_release"] = releases[0] if releases else None
-
-    last_release = context["last_release"]
-    if last_release:
-        changed = run_git([
-            "diff-tree",
-            "--no-commit-id",
-            "--name-only",
-            "-r",
-            str(last_release["hash"]),
-        ])
-        if changed:
-            context["last_release_files"] = set(line.strip() for line in changed.splitlines() if line.strip())
+    context["release_files"] = release_files
+    if releases:
+        context["last_release_files"] = release_files[str(releases[0]["hash"])]
 
     source_changes: Dict[Path, Dict[str, object]] = {}
     for source in sources:
-        row = run_git([
-            "log",
-            "-1",
-            "--date=iso-strict",
-            "--pretty=format:%H%x1f%ad%x1f%s",
-            "--",
-            source.as_posix(),
-        ])
-        record = parse_git_record(row) if row else None
+        source_commit = paths.get(source.as_posix())
+        record = parse_git_record(commits.get(source_commit, "")) if source_commit else None
         if record:
             source_changes[source] = record
     context["source_changes"] = source_changes
     return context
 
 
+def collect_release_infos(
+    sources: List[Path],
+    index: Optional[Dict[str, object]],
+    reproducible: bool = False,
+) -> Dict[Path, Dict[str, str]]:
+    """Build each page's release badge.
+
+    When `reproducible`, each info also carries the page's "generated" stamp
+    (see `page_timestamps`), so a stamp change re-renders the page like any
+    other release change.
+    """
+    release_context = collect_release_context(sources, index)
+    infos = {source: build_release_info(source, release_context) for source in sources}
+    if reproducible:
+        for source, stamp in page_timestamps(sources, release_context).items():
+            infos[source]["generated"] = stamp.isoformat()
+    return infos
+
+
+def page_timestamps(sources: List[Path], release_context: Dict[str, object]) -> Dict[Path, datetime]:
+    """Return the time to stamp each page with instead of the build time.
+
+    SOURCE_DATE_EPOCH applies to every page when set. Otherwise a page gets its
+    source's last commit time, and uncommitted sources get the newest commit
+    time among all sources. Without git history the result is empty.
+    """
+    epoch = os.environ.get("SOURCE_DATE_EPOCH")
+    if epoch is not None:
+        try:
+            fixed = datetime.fromtimestamp(int(epoch), timezone.utc)
+        except ValueError:
+            raise SystemExit(f"SOURCE_DATE_EPOCH must be an integer number of seconds, not {epoch!r}") from None
+        return {source: fixed for source in sources}
+    source_changes = release_context.get("source_changes")
+    if not isinstance(source_changes, dict) or not source_changes:
+        return {}
+    committed = {source: record["at"].astimezone(timezone.utc) for source, record in source_changes.items()}
+    newest = max(committed.values())
+    return {source: committed.get(source, newest) for source in sources}
+
+
 def build_release_info(source: Path, context: Dict[str, object]) -> Dict[str, str]:
     fallback = {
         "label": "Release N/A",
@@ -321,18 +3921,8 @@ def render_mermaid_source(diagram_text: str) -> str:
     )
 
 
-def build_table_of_contents(markdown_text: str) -> str:
-    headings: List[Tuple[int, str, str]] = []
-    for line in markdown_text.splitlines():
-        match = HEADING_RE.match(line.strip())
-        if not match:
-            continue
-        level = len(match.group(1))
-        if level not in (2, 3):
-            continue
-        heading_text = match.group(2).strip()
-        headings.append((level, heading_text, slugify(heading_text)))
-
+def build_table_of_contents(all_headings: List[Tuple[int, str, str]]) -> str:
+    headings = [heading for heading in all_headings if heading[0] in (2, 3)]
     if not headings:
         return ""
 
@@ -345,162 +3935,165 @@ def build_table_of_contents(markdown_text: str) -> str:
     return "".join(items)
 
 
-def render_markdown(
-    markdown_text: str,
-    source_rel: Path,
-    output_rel: Path,
-    source_to_output: Dict[Path, Path],
-) -> str:
-    lines = markdown_text.splitlines()
-    html_parts: List[str] = []
-    list_stack: Optional[str] = None
+def parse_markdown(lines: Iterable[str]) -> List[Block]:
+    return list(iter_blocks(lines))
 
-    def close_list() -> None:
-        nonlocal list_stack
-        if list_stack:
-            html_parts.append(f"</{list_stack}>")
-            list_stack = None
 
-    i = 0
-    while i < len(lines):
-        line = lines[i]
-        stripped = line.strip()
+def iter_blocks(lines: Iterable[str]) -> Iterator[Block]:
+    """Split Markdown into blocks in one pass, classifying each line once.
 
-        if not stripped:
-            close_list()
-            i += 1
-            continue
+    A table header is recognised by the divider line under it, so one line of
+    lookahead is enough and `lines` may be a stream (consumers that stop early,
+    like title extraction, read no further than they need).
+    """
+    source = iter(lines)
+    line = next(source, None)
+    kind = ""
+    items: List[str] = []
+    text = ""
+    while line is not None:
+        following = next(source, None)
+        stripped = line.strip()
 
-        if stripped.startswith("```"):
-            close_list()
-            language = stripped[3:].strip().lower()
-            code_lines: List[str] = []
-            i += 1
-            while i < len(lines) and not lines[i].strip().startswith("```"):
-                code_lines.append(lines[i])
-                i += 1
-            if i < len(lines):
-                i += 1
-
-            code_body = "\n".join(code_lines)
-            if language == "mermaid":
-                html_parts.append(f"<pre class=\"mermaid\">{code_body}</pre>")
+        if kind == "code":
+            if stripped.startswith("```"):
+                yield Block("code", text, tuple(items))
+                kind = ""
             else:
-                class_name = f" class=\"language-{html.escape(language)}\"" if language else ""
-                html_parts.append(
-                    f"<pre><code{class_name}>{html.escape(code_body)}</code></pre>"
-                )
+                items.append(line)
+            line = following
             continue
+        if kind == "table":
+            if stripped and "|" in stripped:
+                if not TABLE_DIVIDER_RE.match(stripped):
+                    items.append(line)
+                line = following
+                continue
+            yield Block("table", "", tuple(items))
+            kind = ""
 
-        heading_match = HEADING_RE.match(stripped)
-        if heading_match:
-            close_list()
-            level = len(heading_match.group(1))
-            text = heading_match.group(2).strip()
-            slug = slugify(text)
-            html_parts.append(f"<h{level} id=\"{slug}\">{render_inline(text, source_rel, output_rel, source_to_output)}</h{level}>")
-            i += 1
-            continue
+        # Classify the line: blank, fence, heading, table, ul, ol or text.
+        line_kind = "text"
+        match: Optional[re.Match] = None
+        if not stripped:
+            line_kind = "blank"
+        else:
+            first = stripped[0]
+            if first == "`" and stripped.startswith("```"):
+                line_kind = "fence"
+            elif first == "#":
+                match = HEADING_RE.match(stripped)
+                if match:
+                    line_kind = "heading"
+            if line_kind == "text":
+                if "|" in line and following is not None and TABLE_DIVIDER_RE.match(following.strip()):
+                    line_kind = "table"
+                elif first in "-*":
+                    match = UL_RE.match(line)
+                    if match:
+                        line_kind = "ul"
+                elif first.isdigit():
+                    match = OL_RE.match(line)
+                    if match:
+                        line_kind = "ol"
+
+        if kind:
+            if line_kind == kind == "text":
+                items.append(stripped)
+                line = following
+                continue
+            if line_kind == kind and match is not None:
+                items.append(match.group(1).strip())
+                line = following
+                continue
+            yield Block("paragraph", " ".join(items)) if kind == "text" else Block(kind, "", tuple(items))
+            kind = ""
+
+        if line_kind == "heading":
+            assert match is not None
+            heading_text = match.group(2).strip()
+            yield Block("heading", heading_text, level=len(match.group(1)), slug=slugify(heading_text))
+        elif line_kind == "fence":
+            kind, text, items = "code", stripped[3:].strip().lower(), []
+        elif line_kind == "table":
+            kind, items = "table", [line]
+        elif line_kind in ("ul", "ol"):
+            assert match is not None
+            kind, items = line_kind, [match.group(1).strip()]
+        elif line_kind == "text":
+            kind, items = "text", [stripped]
+        line = following
+
+    if kind == "text":
+        yield Block("paragraph", " ".join(items))
+    elif kind:
+        yield Block(kind, text if kind == "code" else "", tuple(items))
+
+
+def document_headings(blocks: List[Block]) -> List[Tuple[int, str, str]]:
+    return [(block.level, block.text, block.slug) for block in blocks if block.kind == "heading"]
 
-        if looks_like_table_header(lines, i):
-            close_list()
-            table_html, next_index = render_table(lines, i, source_rel, output_rel, source_to_output)
-            html_parts.append(table_html)
-            i = next_index
-            continue
 
-        ul_match = UL_RE.match(line)
-        if ul_match:
-            if list_stack != "ul":
-                close_list()
-                list_stack = "ul"
-                html_parts.append("<ul>")
-            item_text = ul_match.group(1).strip()
-            html_parts.append(
-                f"<li>{render_inline(item_text, source_rel, output_rel, source_to_output)}</li>"
-            )
-            i += 1
-            continue
+def render_markdown(
+    blocks: List[Block],
+    source_rel: Path,
+    output_rel: Path,
+    source_to_output: Dict[Path, Path],
+    links: Optional[List[str]] = None,
+) -> str:
+    """Render parsed Markdown blocks to HTML.
 
-        ol_match = OL_RE.match(line)
-        if ol_match:
-            if list_stack != "ol":
-                close_list()
-                list_stack = "ol"
-                html_parts.append("<ol>")
-            item_text = ol_match.group(1).strip()
-            html_parts.append(
-                f"<li>{render_inline(item_text, source_rel, output_rel, source_to_output)}</li>"
+    Each link target as written (outside code spans and fences) is appended
+    to `links`.
+    """
+    html_parts: List[str] = []
+    for block in blocks:
+        kind = block.kind
+        if kind == "paragraph":
+            html_parts.append(f"<p>{render_inline(block.text, source_rel, output_rel, source_to_output, links)}</p>")
+        elif kind == "heading":
+            inner = render_inline(block.text, source_rel, output_rel, source_to_output, links)
+            html_parts.append(f"<h{block.level} id=\"{block.slug}\">{inner}</h{block.level}>")
+        elif kind == "ul" or kind == "ol":
+            html_parts.append(f"<{kind}>")
+            html_parts.extend(
+                f"<li>{render_inline(item, source_rel, output_rel, source_to_output, links)}</li>"
+                for item in block.items
             )
-            i += 1
-            continue
-
-        close_list()
-        paragraph_lines = [stripped]
-        i += 1
-        while i < len(lines):
-            candidate = lines[i].strip()
-            if not candidate:
-                break
-            if candidate.startswith("```"):
-                break
-            if HEADING_RE.match(candidate):
-                break
-            if UL_RE.match(lines[i]) or OL_RE.match(lines[i]):
-                break
-            if looks_like_table_header(lines, i):
-                break
-            paragraph_lines.append(candidate)
-            i += 1
-
-        paragraph_text = " ".join(paragraph_lines)
-        html_parts.append(
-            f"<p>{render_inline(paragraph_text, source_rel, output_rel, source_to_output)}</p>"
-        )
-
-    close_list()
+            html_parts.append(f"</{kind}>")
+        elif kind == "table":
+            html_parts.append(render_table(block.items, source_rel, output_rel, source_to_output, links))
+        else:
+            code_body = "\n".join(block.items)
+            if block.text == "mermaid":
+                html_parts.append(f"<pre class=\"mermaid\">{code_body}</pre>")
+            else:
+                class_name = f" class=\"language-{html.escape(block.text)}\"" if block.text else ""
+                html_parts.append(f"<pre><code{class_name}>{html.escape(code_body)}</code></pre>")
     return "\n".join(html_parts)
 
 
-def looks_like_table_header(lines: List[str], index: int) -> bool:
-    if index + 1 >= len(lines):
-        return False
-    return "|" in lines[index] and bool(TABLE_DIVIDER_RE.match(lines[index + 1].strip()))
-
-
 def render_table(
-    lines: List[str],
-    start: int,
+    rows: Tuple[str, ...],
     source_rel: Path,
     output_rel: Path,
     source_to_output: Dict[Path, Path],
-) -> Tuple[str, int]:
-    header_cells = split_table_row(lines[start])
-    i = start + 2
-    data_rows: List[List[str]] = []
-    while i < len(lines):
-        line = lines[i]
-        stripped = line.strip()
-        if not stripped or "|" not in stripped:
-            break
-        if TABLE_DIVIDER_RE.match(stripped):
-            i += 1
-            continue
-        data_rows.append(split_table_row(line))
-        i += 1
-
+    links: Optional[List[str]] = None,
+) -> str:
+    """Render a table block: the header row followed by data rows, dividers already dropped."""
     head_html = "".join(
-        f"<th>{render_inline(cell, source_rel, output_rel, source_to_output)}</th>" for cell in header_cells
+        f"<th>{render_inline(cell, source_rel, output_rel, source_to_output, links)}</th>"
+        for cell in split_table_row(rows[0])
     )
     row_html = []
-    for row in data_rows:
+    for row in rows[1:]:
         cells = "".join(
-            f"<td>{render_inline(cell, source_rel, output_rel, source_to_output)}</td>" for cell in row
+            f"<td>{render_inline(cell, source_rel, output_rel, source_to_output, links)}</td>"
+            for cell in split_table_row(row)
         )
         row_html.append(f"<tr>{cells}</tr>")
 
-    table_html = "<table><thead><tr>" + head_html + "</tr></thead><tbody>" + "".join(row_html) + "</tbody></table>"
-    return table_html, i
+    return "<table><thead><tr>" + head_html + "</tr></thead><tbody>" + "".join(row_html) + "</tbody></table>"
 
 
 def split_table_row(line: str) -> List[str]:
@@ -513,51 +4106,104 @@ def render_inline(
     source_rel: Path,
     output_rel: Path,
     source_to_output: Dict[Path, Path],
+    links: Optional[List[str]] = None,
 ) -> str:
-    placeholders: Dict[str, str] = {}
-
-    def stash(value: str) -> str:
-        key = f"@@PLACEHOLDER_{len(placeholders)}@@"
-        placeholders[key] = value
-        return key
-
-    def format_label(value: str) -> str:
-        label_placeholders: Dict[str, str] = {}
-
-        def label_stash(fragment: str) -> str:
-            key = f"@@LABEL_{len(label_placeholders)}@@"
-            label_placeholders[key] = fragment
-            return key
-
-        formatted = re.sub(
-            r"`([^`]+)`",
-            lambda m: label_stash(f"<code>{html.escape(m.group(1))}</code>"),
-            value,
+    """Render inline Markdown, memoizing short fragments per (text, source dir, output dir, output map).
+
+    Link targets resolve against the source directory and hrefs are written
+    relative to the output directory, so those two directories and the output
+    map fully determine the result. The map is keyed by identity: it is one
+    object per build, and `--serve` replaces it when sources are added or
+    removed while older pages may still be rendering. Link targets as
+    written are appended to `links`, also on cache hits.
+    """
+    if len(text) > INLINE_CACHE_MAX_TEXT:
+        rendered, targets = render_inline_uncached(text, source_rel, output_rel, source_to_output)
+    else:
+        rendered, targets = cached(
+            "inline fragments",
+            (text, source_rel.parent, output_rel.parent, id(source_to_output)),
+            lambda: render_inline_uncached(text, source_rel, output_rel, source_to_output),
         )
-        formatted = html.escape(formatted)
-        formatted = re.sub(r"\*\*([^*]+)\*\*", r"<strong>\1</strong>", formatted)
-        formatted = re.sub(r"\*([^*]+)\*", r"<em>\1</em>", formatted)
-        for key, fragment in label_placeholders.items():
-            formatted = formatted.replace(key, fragment)
-        return formatted
+    if links is not None and targets:
+        links.extend(targets)
+    return rendered
 
-    def link_replacer(match: re.Match[str]) -> str:
-        label = format_label(match.group(1).strip())
-        href = resolve_link(match.group(2).strip(), source_rel, output_rel, source_to_output)
-        return stash(f"<a href=\"{html.escape(href, quote=True)}\">{label}</a>")
 
-    def code_replacer(match: re.Match[str]) -> str:
-        return stash(f"<code>{html.escape(match.group(1))}</code>")
-
-    working = LINK_RE.sub(link_replacer, text)
-    working = re.sub(r"`([^`]+)`", code_replacer, working)
-    working = html.escape(working)
-    working = re.sub(r"\*\*([^*]+)\*\*", r"<strong>\1</strong>", working)
-    working = re.sub(r"\*([^*]+)\*", r"<em>\1</em>", working)
+def render_inline_uncached(
+    text: str,
+    source_rel: Path,
+    output_rel: Path,
+    source_to_output: Dict[Path, Path],
+) -> Tuple[str, Tuple[str, ...]]:
+    targets: List[str] = []
+
+    def render_link(label: str, target: str) -> str:
+        target = target.strip()
+        targets.append(target)
+        href = resolve_link(target, source_rel, output_rel, source_to_output)
+        return f"<a href=\"{html.escape(href, quote=True)}\">{render_inline_text(label.strip())}</a>"
+
+    return render_inline_text(text, render_link), tuple(targets)
+
+
+def render_inline_text(text: str, render_link: Optional[Callable[[str, str], str]] = None) -> str:
+    """Render inline Markdown (links, code spans, strong, emphasis) in one scan.
+
+    Links take precedence over code spans, as in the original regex cascade: a
+    backtick only opens a code span when no link starts before its closing
+    backtick. Links and code spans are emitted as single-character atoms so the
+    emphasis passes cannot see inside them, then restored with one split.
+    Without `render_link` (link labels) only code spans and emphasis apply.
+    """
+    if INLINE_ATOM in text:
+        text = text.replace(INLINE_ATOM, "\ufffd")
+    parts: List[str] = []
+    atoms: List[str] = []
+    position = 0
+    cursor = 0
+    code_spans_possible = True
+    next_link = LINK_RE.search(text) if render_link else None
+    while True:
+        marker = INLINE_MARKER_RE.search(text, cursor)
+        if marker is None:
+            break
+        index = marker.start()
+        if text[index] == "[":
+            if next_link is not None and render_link is not None and next_link.start() == index:
+                parts.append(html.escape(text[position:index]))
+                parts.append(INLINE_ATOM)
+                atoms.append(render_link(next_link.group(1), next_link.group(2)))
+                position = cursor = next_link.end()
+                next_link = LINK_RE.search(text, cursor)
+            else:
+                cursor = index + 1
+            continue
 
-    for key, value in placeholders.items():
-        working = working.replace(key, value)
-    return working
+        closing = text.find("`", index + 1) if code_spans_possible else -1
+        if closing == -1:
+            code_spans_possible = False
+        if closing <= index + 1 or (next_link is not None and next_link.start() < closing):
+            cursor = index + 1
+            continue
+        parts.append(html.escape(text[position:index]))
+        parts.append(INLINE_ATOM)
+        atoms.append(f"<code>{html.escape(text[index + 1:closing])}</code>")
+        position = cursor = closing + 1
+    parts.append(html.escape(text[position:]))
+
+    rendered = "".join(parts)
+    if "*" in rendered:
+        rendered = STRONG_RE.sub(r"<strong>\1</strong>", rendered)
+        rendered = EM_RE.sub(r"<em>\1</em>", rendered)
+    if not atoms:
+        return rendered
+    pieces = rendered.split(INLINE_ATOM)
+    merged = [pieces[0]]
+    for atom, piece in zip(atoms, pieces[1:]):
+        merged.append(atom)
+        merged.append(piece)
+    return "".join(merged)
 
 
 def resolve_link(
@@ -593,7 +4239,7 @@ def resolve_link(
         return f"{href}{anchor}"
 
     if source_candidate:
-        href = rel_href(Path("docs/site") / output_rel.parent, source_candidate)
+        href = rel_href(SITE_LINK_ROOT / output_rel.parent, source_candidate)
         return f"{href}{anchor}"
 
     return target
@@ -602,30 +4248,82 @@ def resolve_link(
 def resolve_repo_path(raw_target: str, source_rel: Path) -> Optional[Path]:
     if not raw_target:
         return source_rel
+    source_dir = source_rel.parent
+    return cached(
+        "link resolution",
+        (source_dir, raw_target),
+        lambda: resolve_repo_path_uncached(raw_target, source_dir),
+    )
 
+
+def resolve_repo_path_uncached(raw_target: str, source_dir: Path) -> Optional[Path]:
+    build_context = current_build()
+    if build_context.tree is not None:
+        return resolve_tree_path(raw_target, source_dir)
     candidate_path: Optional[Path] = None
 
-    if raw_target.startswith(str(REPO_ROOT)):
+    if raw_target.startswith(str(build_context.repo_root)):
         candidate_path = Path(raw_target)
     elif raw_target.startswith("/"):
         relative_candidate = raw_target.lstrip("/")
-        local = REPO_ROOT / relative_candidate
+        local = build_context.repo_root / relative_candidate
         if local.exists():
             candidate_path = local
     else:
-        candidate_path = (REPO_ROOT / source_rel.parent / raw_target).resolve()
+        relative = lexical_repo_path(raw_target, source_dir)
+        if relative is not None:
+            return relative
+        candidate_path = build_context.repo_root / source_dir / raw_target
 
     if not candidate_path:
         return None
 
     try:
-        relative = candidate_path.resolve().relative_to(REPO_ROOT)
+        relative = candidate_path.resolve().relative_to(build_context.repo_root)
     except ValueError:
         return None
 
     return relative
 
 
+def resolve_tree_path(raw_target: str, source_dir: Path) -> Optional[Path]:
+    """resolve_repo_path_uncached against the --rev tree: the same rules, with symlinks read from the revision."""
+    build_context = current_build()
+    assert build_context.tree is not None
+    if raw_target.startswith(str(build_context.repo_root)):
+        relative = os.path.relpath(raw_target, build_context.repo_root)
+    elif raw_target.startswith("/"):
+        relative = raw_target.lstrip("/")
+        if not build_context.tree.exists(posixpath.normpath(relative)):
+            return None
+    else:
+        relative = posixpath.join(source_dir.as_posix(), raw_target)
+    resolved = build_context.tree.resolve(relative)
+    return Path(resolved) if resolved is not None else None
+
+
+def lexical_repo_path(raw_target: str, source_dir: Path) -> Optional[Path]:
+    """Resolve a relative link target by name, checking each directory for a symlink once per build.
+
+    This takes the same steps as os.path.realpath without re-examining the
+    components of the repository root for every link. Returns None when a
+    symlink or a climb above the repository root needs the full resolution.
+    """
+    parts: List[str] = []
+    for part in itertools.chain(source_dir.parts, raw_target.split("/")):
+        if not part or part == ".":
+            continue
+        if part == "..":
+            if not parts:
+                return None
+            parts.pop()
+            continue
+        parts.append(part)
+        if cached("symlinks", "/".join(parts), lambda: os.path.islink(os.path.join(current_build().repo_root, *parts))):
+            return None
+    return Path(*parts)
+
+
 def rel_href(from_dir: Path, to_file: Path) -> str:
     from_value = from_dir.as_posix() if from_dir.as_posix() else "."
     return posixpath.relpath(to_file.as_posix(), from_value)
@@ -636,111 +4334,174 @@ def slugify(value: str) -> str:
     return slug or "section"
 
 
-def build_navigation(
-    current_source: Path,
-    current_output: Path,
-    source_to_output: Dict[Path, Path],
-    titles: Dict[Path, str],
-) -> str:
-    grouped: Dict[str, List[Tuple[Path, Path]]] = {
-        "Overview": [],
-        "Frontend": [],
-        "API": [],
-        "Tests": [],
-        "Utilities": [],
-        "Diagrams": [],
-        "Modules": [],
-        "Reference": [],
-    }
-
+def build_nav_model(source_to_output: Dict[Path, Path], titles: Dict[Path, str]) -> NavModel:
+    grouped: Dict[str, List[Tuple[Path, Path, str]]] = {name: [] for name in NAV_GROUPS}
     for source, output in sorted(source_to_output.items(), key=lambda item: item[1].as_posix()):
-        group_name = nav_group(source)
-        grouped.setdefault(group_name, [])
-        grouped[group_name].append((source, output))
+        label = html.escape(titles.get(source, source.stem))
+        grouped.setdefault(nav_group(source), []).append((source, output, label))
+
+    groups = [(name, items) for name, items in grouped.items() if items]
+    group_heads: List[Tuple[str, str]] = []
+    positions: Dict[Path, Tuple[int, int]] = {}
+    directories: Dict[Tuple[int, Path], List[int]] = {}
+    directory_index: Dict[Tuple[int, Path], int] = {}
+    for group_index, (group_name, items) in enumerate(groups):
+        icon = html.escape(GROUP_ICONS.get(group_name, "•"))
+        heads = []
+        for open_class, expanded in ((" open", "true"), ("", "false")):
+            heads.append(
+                "<section class=\"nav-group"
+                + open_class
+                + "\">"
+                + f"<button class=\"nav-group-btn\" type=\"button\" aria-expanded=\"{expanded}\">"
+                + f"<span class=\"nav-group-icon\">{icon}</span>"
+                + f"<span class=\"nav-group-title\">{html.escape(group_name)}</span>"
+                + "<span class=\"nav-group-caret\">▾</span>"
+                + "</button>"
+                + "<div class=\"nav-group-items\">"
+            )
+        group_heads.append((heads[0], heads[1]))
+        for item_index, (source, output, _label) in enumerate(items):
+            positions[source] = (group_index, item_index)
+            directories.setdefault((group_index, output.parent), []).append(item_index)
+            if output.name == "index.html":
+                directory_index[(group_index, output.parent)] = item_index
 
-    current_group = nav_group(current_source)
-    sections: List[str] = []
-    for group_name, items in grouped.items():
+    top_targets: List[Tuple[str, Path]] = []
+    for group_name in ("Overview", "Frontend", "API", "Tests", "Utilities", "Diagrams", "Modules"):
+        items = grouped.get(group_name) or []
         if not items:
             continue
-        links: List[str] = []
-        for source, output in items:
-            href = rel_href(current_output.parent, output)
-            active = " active" if source == current_source else ""
-            label = html.escape(titles.get(source, source.stem))
-            links.append(
-                "<a class=\"nav-link"
-                + active
-                + f"\" href=\"{href}\">"
-                + "<span class=\"nav-link-dot\">•</span>"
-                + f"<span class=\"nav-link-text\">{label}</span>"
-                + "</a>"
-            )
+        preferred = items[0]
+        for item in items:
+            if item[1].name == "index.html":
+                preferred = item
+                break
+        top_targets.append((group_name, preferred[1]))
+    reference_items = grouped.get("Reference") or []
+    if reference_items:
+        top_targets.append(("Reference", reference_items[0][1]))
+
+    return NavModel(
+        groups=groups,
+        group_heads=group_heads,
+        positions=positions,
+        directories=directories,
+        directory_index=directory_index,
+        top_targets=top_targets,
+        prefixed={},
+    )
 
-        is_open = group_name == current_group or group_name == "Overview"
-        open_class = " open" if is_open else ""
-        icon = html.escape(GROUP_ICONS.get(group_name, "•"))
-        expanded = "true" if is_open else "false"
-        sections.append(
-            "<section class=\"nav-group"
-            + open_class
-            + "\">"
-            + f"<button class=\"nav-group-btn\" type=\"button\" aria-expanded=\"{expanded}\">"
-            + f"<span class=\"nav-group-icon\">{icon}</span>"
-            + f"<span class=\"nav-group-title\">{html.escape(group_name)}</span>"
-            + "<span class=\"nav-group-caret\">▾</span>"
-            + "</button>"
-            + f"<div class=\"nav-group-items\">{''.join(links)}</div>"
-            + "</section>"
-        )
 
-    return "\n".join(sections)
+def prefixed_navigation(nav_model: NavModel, output_dir: Path) -> PrefixedNav:
+    depth = len(output_dir.parts)
+    cached = nav_model.prefixed.get(depth)
+    if cached is not None:
+        return cached
 
+    prefix = "../" * depth
+    group_links: List[Tuple[str, List[str]]] = []
+    for _group_name, items in nav_model.groups:
+        links = [nav_link(prefix, output, label) for _source, output, label in items]
+        group_links.append(("".join(links), links))
 
-def build_top_navigation(
-    current_source: Path,
-    current_output: Path,
-    source_to_output: Dict[Path, Path],
-) -> str:
-    grouped: Dict[str, List[Tuple[Path, Path]]] = {
-        "Overview": [],
-        "Frontend": [],
-        "API": [],
-        "Tests": [],
-        "Utilities": [],
-        "Diagrams": [],
-        "Modules": [],
-        "Reference": [],
-    }
-    for source, output in sorted(source_to_output.items(), key=lambda item: item[1].as_posix()):
-        grouped.setdefault(nav_group(source), []).append((source, output))
+    entry = PrefixedNav(group_links=group_links)
+    nav_model.prefixed[depth] = entry
+    return entry
 
-    current_group = nav_group(current_source)
-    chips: List[str] = []
-    for group_name in ("Overview", "Frontend", "API", "Tests", "Utilities", "Diagrams", "Modules"):
-        items = grouped.get(group_name) or []
-        if not items:
-            continue
 
-        preferred = items[0]
-        for source, output in items:
-            if output.name == "index.html":
-                preferred = (source, output)
-                break
+def nav_link(prefix: str, output: Path, label: str) -> str:
+    return (
+        NAV_LINK_OPEN
+        + f" href=\"{prefix}{output.as_posix()}\">"
+        + "<span class=\"nav-link-dot\">•</span>"
+        + f"<span class=\"nav-link-text\">{label}</span>"
+        + "</a>"
+    )
 
-        target_source, target_output = preferred
-        href = rel_href(current_output.parent, target_output)
-        active = " top-link-active" if group_name == current_group else ""
-        chips.append(f"<a class=\"top-link{active}\" href=\"{href}\">{html.escape(group_name)}</a>")
 
-    reference_items = grouped.get("Reference") or []
-    if reference_items:
-        target_source, target_output = reference_items[0]
-        href = rel_href(current_output.parent, target_output)
-        active = " top-link-active" if current_group == "Reference" else ""
-        chips.append(f"<a class=\"top-link{active}\" href=\"{href}\">Reference</a>")
+def build_navigation(current_source: Path, current_output: Path, nav_model: NavModel) -> str:
+    prefixed = prefixed_navigation(nav_model, current_output.parent)
+    current_group = nav_group(current_source)
+    active_group, active_index = nav_model.positions.get(current_source, (-1, -1))
+    parts: List[str] = []
+    for group_index, (group_name, _items) in enumerate(nav_model.groups):
+        if group_index:
+            parts.append("\n")
+        open_head, closed_head = nav_model.group_heads[group_index]
+        is_open = group_name == current_group or group_name == "Overview"
+        parts.append(open_head if is_open else closed_head)
+        links_html, links = prefixed.group_links[group_index]
+        if group_index == active_group:
+            parts.extend(links[:active_index])
+            parts.append(NAV_LINK_OPEN_ACTIVE + links[active_index][len(NAV_LINK_OPEN):])
+            parts.extend(links[active_index + 1:])
+        else:
+            parts.append(links_html)
+        parts.append(NAV_GROUP_CLOSE)
+    return "".join(parts)
+
+
+def build_shared_navigation(current_source: Path, current_output: Path, nav_model: NavModel) -> str:
+    """Render the current page's siblings and ancestor index pages, for `--shared-nav` pages.
+
+    The script replaces it with the full tree from nav.json; without JavaScript
+    the page still links to its own directory and up to the root of its nav
+    group. Its size grows with the page's depth and siblings, not the site.
+    """
+    active_group, active_index = nav_model.positions.get(current_source, (-1, -1))
+    attrs = (
+        f" data-current=\"{html.escape(current_output.as_posix(), quote=True)}\""
+        f" data-group=\"{html.escape(nav_group(current_source), quote=True)}\""
+    )
+    if active_group < 0:
+        return f"<div class=\"nav-tree\" id=\"nav-tree\"{attrs}></div>"
+    prefix = "../" * len(current_output.parent.parts)
+    items = nav_model.groups[active_group][1]
+    shown = set(nav_model.directories[(active_group, current_output.parent)])
+    for directory in current_output.parent.parents:
+        index = nav_model.directory_index.get((active_group, directory))
+        if index is not None:
+            shown.add(index)
+    parts = [f"<div class=\"nav-tree\" id=\"nav-tree\"{attrs}>", nav_model.group_heads[active_group][0]]
+    for index in sorted(shown):
+        _source, output, label = items[index]
+        link = nav_link(prefix, output, label)
+        parts.append(NAV_LINK_OPEN_ACTIVE + link[len(NAV_LINK_OPEN):] if index == active_index else link)
+    parts += [NAV_GROUP_CLOSE, "</div>"]
+    return "".join(parts)
+
+
+def write_shared_nav(nav_model: Optional[NavModel]) -> None:
+    """Write the site-wide nav tree loaded by `--shared-nav` pages, or remove it.
+
+    Items are `[output, label]` with the label already HTML-escaped.
+    """
+    site = current_build().site
+    if nav_model is None:
+        site.remove("nav.json")
+        return
+    groups = [
+        {
+            "name": group_name,
+            "icon": GROUP_ICONS.get(group_name, "•"),
+            "items": [[output.as_posix(), label] for _source, output, label in items],
+        }
+        for group_name, items in nav_model.groups
+    ]
+    content = search_json({"groups": groups})
+    if site.write("nav.json", content):
+        record_write("nav", len(content))
+
 
-    return "".join(chips)
+def build_top_navigation(current_source: Path, current_output: Path, nav_model: NavModel) -> str:
+    prefix = "../" * len(current_output.parent.parts)
+    current_group = nav_group(current_source)
+    return "".join(
+        f"<a class=\"{'top-link top-link-active' if group_name == current_group else 'top-link'}\""
+        f" href=\"{prefix}{output.as_posix()}\">{html.escape(group_name)}</a>"
+        for group_name, output in nav_model.top_targets
+    )
 
 
 def nav_group(source: Path) -> str:
@@ -763,6 +4524,858 @@ def nav_group(source: Path) -> str:
     return mapping.get(section, "Overview")
 
 
+PAGE_CSS = """\
+:root {
+  --bg: #f2f6fc;
+  --surface: #ffffff;
+  --surface-2: #f8fbff;
+  --ink: #162844;
+  --muted: #5d6f8b;
+  --border: #d4dfef;
+  --link: #0b4fce;
+  --code-bg: #eef4ff;
+  --active: #e6efff;
+  --accent: #0b3fa8;
+  --topbar: #ffffffee;
+  --topbar-border: #d6e3f5;
+  --shadow: rgba(11, 43, 104, 0.08);
+  --top-height: 64px;
+}
+html[data-theme="dark"] {
+  --bg: #0f1420;
+  --surface: #121b2a;
+  --surface-2: #0f1827;
+  --ink: #e7eefc;
+  --muted: #95a6c4;
+  --border: #243652;
+  --link: #7ab6ff;
+  --code-bg: #1a263c;
+  --active: #1c2c48;
+  --accent: #89bfff;
+  --topbar: #10192af0;
+  --topbar-border: #253958;
+  --shadow: rgba(2, 10, 22, 0.45);
+}
+* { box-sizing: border-box; }
+html, body { margin: 0; padding: 0; }
+body {
+  font-family: "IBM Plex Sans", "Avenir Next", "Segoe UI", ui-sans-serif, system-ui, -apple-system, sans-serif;
+  background: radial-gradient(circle at top right, #e8f2ff 0%, var(--bg) 50%);
+  color: var(--ink);
+}
+a { color: var(--link); text-decoration: none; }
+a:hover { text-decoration: underline; }
+
+.topbar {
+  position: sticky;
+  top: 0;
+  z-index: 50;
+  height: var(--top-height);
+  background: var(--topbar);
+  backdrop-filter: blur(8px);
+  border-bottom: 1px solid var(--topbar-border);
+  display: flex;
+  align-items: center;
+  justify-content: space-between;
+  padding: 0 14px;
+}
+.top-left {
+  display: flex;
+  align-items: center;
+  gap: 14px;
+  min-width: 0;
+}
+.menu-btn {
+  display: none;
+  border: 1px solid var(--border);
+  background: var(--surface);
+  color: var(--ink);
+  border-radius: 10px;
+  font-size: 13px;
+  font-weight: 600;
+  padding: 7px 10px;
+  cursor: pointer;
+}
+.brand {
+  color: var(--ink);
+  font-weight: 800;
+  letter-spacing: 0.01em;
+  font-size: 15px;
+  white-space: nowrap;
+}
+.top-nav {
+  display: flex;
+  align-items: center;
+  gap: 8px;
+  overflow-x: auto;
+  padding-bottom: 1px;
+}
+.top-link {
+  display: inline-flex;
+  align-items: center;
+  height: 30px;
+  border-radius: 999px;
+  padding: 0 10px;
+  color: var(--muted);
+  border: 1px solid transparent;
+  font-size: 12px;
+  font-weight: 600;
+  white-space: nowrap;
+}
+.top-link:hover {
+  color: var(--ink);
+  text-decoration: none;
+  background: var(--surface);
+  border-color: var(--border);
+}
+.top-link-active {
+  color: var(--accent);
+  background: var(--active);
+  border-color: var(--border);
+}
+.top-right {
+  display: flex;
+  align-items: center;
+  gap: 8px;
+  white-space: nowrap;
+}
+.search { position: relative; }
+.search-input {
+  width: 200px;
+  height: 32px;
+  border: 1px solid var(--border);
+  background: var(--surface);
+  color: var(--ink);
+  border-radius: 10px;
+  font-size: 13px;
+  padding: 0 10px;
+}
+.search-input:focus { outline: 2px solid var(--link); outline-offset: 1px; }
+.search-results {
+  position: absolute;
+  top: calc(100% + 6px);
+  right: 0;
+  width: min(420px, 90vw);
+  max-height: 60vh;
+  overflow-y: auto;
+  white-space: normal;
+  background: var(--surface);
+  border: 1px solid var(--border);
+  border-radius: 12px;
+  box-shadow: 0 8px 24px var(--shadow);
+  padding: 6px;
+  z-index: 60;
+}
+.search-results[hidden] { display: none; }
+.search-hit {
+  display: block;
+  padding: 8px 10px;
+  border-radius: 8px;
+  color: var(--ink);
+  font-size: 13px;
+  font-weight: 600;
+}
+.search-hit:hover, .search-hit:focus {
+  background: var(--active);
+  text-decoration: none;
+}
+.search-hit-section {
+  display: block;
+  color: var(--muted);
+  font-size: 12px;
+  font-weight: 400;
+}
+.search-empty {
+  padding: 8px 10px;
+  color: var(--muted);
+  font-size: 13px;
+}
+.generated-stamp {
+  color: var(--muted);
+  font-size: 12px;
+  font-variant-numeric: tabular-nums;
+  padding: 0 6px;
+}
+.release-pill {
+  border: 1px solid var(--border);
+  background: var(--surface);
+  color: var(--ink);
+  border-radius: 999px;
+  font-size: 12px;
+  padding: 6px 10px;
+  box-shadow: 0 1px 4px var(--shadow);
+  cursor: help;
+}
+.theme-btn {
+  border: 1px solid var(--border);
+  background: var(--surface);
+  color: var(--ink);
+  border-radius: 10px;
+  font-size: 12px;
+  font-weight: 600;
+  padding: 7px 10px;
+  cursor: pointer;
+}
+.layout {
+  display: grid;
+  grid-template-columns: 300px minmax(0, 1fr) 240px;
+  min-height: calc(100vh - var(--top-height));
+}
+.sidebar {
+  border-right: 1px solid var(--border);
+  background: var(--surface-2);
+  padding: 12px 10px 18px;
+  position: sticky;
+  top: var(--top-height);
+  height: calc(100vh - var(--top-height));
+  overflow: auto;
+}
+.sub {
+  color: var(--muted);
+  font-size: 12px;
+  margin: 0 6px 10px;
+}
+.nav-group {
+  border: 1px solid var(--border);
+  border-radius: 10px;
+  background: var(--surface);
+  margin-bottom: 8px;
+  overflow: hidden;
+}
+.nav-group-btn {
+  width: 100%;
+  border: 0;
+  background: transparent;
+  color: var(--ink);
+  padding: 7px 9px;
+  display: flex;
+  align-items: center;
+  gap: 8px;
+  font-size: 12px;
+  font-weight: 700;
+  cursor: pointer;
+  text-align: left;
+}
+.nav-group-btn:hover {
+  background: var(--active);
+}
+.nav-group-icon {
+  width: 16px;
+  text-align: center;
+  color: var(--accent);
+  font-size: 12px;
+}
+.nav-group-title {
+  flex: 1;
+  text-transform: uppercase;
+  letter-spacing: 0.03em;
+  font-size: 11px;
+}
+.nav-group-caret {
+  color: var(--muted);
+  font-size: 12px;
+  transition: transform 0.18s ease;
+}
+.nav-group.open .nav-group-caret {
+  transform: rotate(0deg);
+}
+.nav-group:not(.open) .nav-group-caret {
+  transform: rotate(-90deg);
+}
+.nav-group-items {
+  display: none;
+  padding: 0 6px 7px 6px;
+  border-top: 1px solid var(--border);
+  background: var(--surface-2);
+}
+.nav-group.open .nav-group-items {
+  display: block;
+}
+.nav-link {
+  display: flex;
+  align-items: center;
+  gap: 7px;
+  padding: 5px 6px;
+  border-radius: 7px;
+  color: var(--ink);
+  font-size: 12px;
+  line-height: 1.3;
+}
+.nav-link:hover {
+  text-decoration: none;
+  background: var(--active);
+}
+.nav-link-dot {
+  width: 12px;
+  text-align: center;
+  color: var(--muted);
+  font-size: 10px;
+  flex: none;
+}
+.nav-link-text {
+  overflow: hidden;
+  text-overflow: ellipsis;
+  white-space: nowrap;
+}
+.nav-link.active {
+  background: var(--active);
+  color: var(--accent);
+  font-weight: 700;
+}
+.nav-link.active .nav-link-dot {
+  color: var(--accent);
+}
+.content-wrap { padding: 24px 28px 44px; }
+.content {
+  max-width: 930px;
+  margin: 0 auto;
+  background: var(--surface);
+  border: 1px solid var(--border);
+  border-radius: 16px;
+  padding: 26px 30px;
+  box-shadow: 0 10px 28px var(--shadow);
+}
+.meta { color: var(--muted); font-size: 12px; margin-bottom: 18px; }
+.meta-row {
+  display: flex;
+  align-items: center;
+  justify-content: space-between;
+  gap: 8px;
+  flex-wrap: wrap;
+  margin-bottom: 14px;
+}
+.status-pill {
+  border: 1px solid var(--border);
+  border-radius: 999px;
+  padding: 4px 9px;
+  background: var(--surface-2);
+  color: var(--ink);
+  font-size: 11px;
+  font-weight: 600;
+}
+.doc-footer {
+  margin-top: 28px;
+  padding-top: 12px;
+  border-top: 1px solid var(--border);
+  color: var(--muted);
+  font-size: 12px;
+  text-align: right;
+}
+.doc-footer a {
+  font-weight: 700;
+}
+.eyebrow { font-size: 11px; letter-spacing: 0.04em; text-transform: uppercase; color: var(--accent); margin-bottom: 8px; font-weight: 700; }
+h1, h2, h3, h4 { color: var(--ink); }
+h1 { margin-top: 0; font-size: 34px; letter-spacing: -0.01em; }
+h2 { margin-top: 28px; font-size: 22px; border-top: 1px solid var(--border); padding-top: 18px; }
+h3 { margin-top: 22px; font-size: 18px; }
+p, li { line-height: 1.62; color: var(--ink); }
+ul, ol { padding-left: 24px; }
+pre { background: #0f172a; color: #e2e8f0; border-radius: 10px; padding: 14px; overflow-x: auto; }
+pre.mermaid { background: var(--surface); border: 1px solid var(--border); color: var(--ink); }
+code { background: var(--code-bg); color: var(--ink); border-radius: 6px; padding: 2px 6px; font-size: 0.92em; }
+pre code { background: transparent; color: inherit; padding: 0; }
+details { margin-top: 14px; }
+summary { cursor: pointer; color: var(--accent); }
+table { width: 100%; border-collapse: collapse; margin: 16px 0; font-size: 14px; }
+th, td { border: 1px solid var(--border); text-align: left; padding: 9px 10px; vertical-align: top; }
+th { background: var(--surface-2); font-weight: 600; }
+.toc {
+  border-left: 1px solid var(--border);
+  background: var(--surface-2);
+  padding: 22px 12px;
+  position: sticky;
+  top: var(--top-height);
+  height: calc(100vh - var(--top-height));
+  overflow: auto;
+}
+.toc h3 { font-size: 11px; text-transform: uppercase; letter-spacing: 0.05em; color: var(--muted); margin: 0 0 10px; }
+.toc-link { display: block; color: var(--ink); font-size: 13px; padding: 4px 6px; border-radius: 6px; }
+.toc-link:hover { background: var(--active); text-decoration: none; }
+.toc-main { font-weight: 600; }
+.toc-sub { padding-left: 16px; color: var(--muted); }
+.toc-empty { color: var(--muted); font-size: 12px; }
+.backdrop {
+  display: none;
+  position: fixed;
+  inset: var(--top-height) 0 0 0;
+  background: rgba(5, 12, 23, 0.42);
+  z-index: 35;
+}
+.backdrop.show { display: block; }
+@media (max-width: 1200px) {
+  .layout { grid-template-columns: 280px minmax(0, 1fr); }
+  .toc { display: none; }
+}
+@media (max-width: 980px) {
+  .menu-btn { display: inline-flex; }
+  .top-nav { display: none; }
+  .generated-stamp { display: none; }
+  .layout { grid-template-columns: 1fr; }
+  .sidebar {
+    position: fixed;
+    top: var(--top-height);
+    left: 0;
+    width: min(90vw, 320px);
+    transform: translateX(-104%);
+    transition: transform 0.22s ease;
+    z-index: 40;
+    border-right: 1px solid var(--border);
+  }
+  .sidebar.open { transform: translateX(0); }
+  .content-wrap { padding: 12px; }
+  .content { padding: 18px; border-radius: 10px; }
+}
+@media (max-width: 640px) {
+  .release-pill { display: none; }
+  .search-input { width: 120px; }
+  .theme-btn { padding: 7px 9px; }
+  .topbar { padding: 0 10px; }
+  .content h1 { font-size: 30px; }
+}
+"""
+
+PAGE_JS = """\
+(function () {
+  var root = document.documentElement;
+  var currentScript = document.currentScript;
+  var siteRoot = currentScript ? currentScript.src.replace(/assets\\/[^\\/]*$/, "") : "";
+  var themeKey = "aidex-docs-theme";
+  var menuToggle = document.getElementById("menu-toggle");
+  var themeToggle = document.getElementById("theme-toggle");
+  var sidebar = document.getElementById("left-nav");
+  var backdrop = document.getElementById("nav-backdrop");
+  var navCacheKey = "aidex-docs-nav:" + siteRoot;
+  var mermaidSrc = currentScript ? currentScript.getAttribute("data-mermaid") : null;
+  var mermaidTheme = "neutral";
+  var mermaidQueue = null;
+  var renderedDiagrams = [];
+
+  function loadMermaid() {
+    return new Promise(function (resolve, reject) {
+      var script = document.createElement("script");
+      script.src = mermaidSrc;
+      script.onload = resolve;
+      script.onerror = reject;
+      document.head.appendChild(script);
+    });
+  }
+
+  // Diagrams render one batch at a time, in the order they became visible.
+  function renderDiagrams(nodes) {
+    if (!mermaidSrc || !nodes.length) {
+      return;
+    }
+    mermaidQueue = (mermaidQueue || loadMermaid()).then(function () {
+      if (!window.mermaid) {
+        return null;
+      }
+      for (var i = 0; i < nodes.length; i += 1) {
+        var node = nodes[i];
+        if (node.mermaidSource === undefined) {
+          node.mermaidSource = node.textContent;
+          renderedDiagrams.push(node);
+        } else {
+          node.textContent = node.mermaidSource;
+        }
+        node.removeAttribute("data-processed");
+      }
+      window.mermaid.initialize({ startOnLoad: false, theme: mermaidTheme });
+      return window.mermaid.run({ nodes: nodes });
+    }).catch(function () {
+      return null;
+    });
+  }
+
+  function renderMermaid(theme) {
+    mermaidTheme = theme === "dark" ? "dark" : "neutral";
+    renderDiagrams(renderedDiagrams.slice());
+  }
+
+  function initMermaid() {
+    var nodes = document.querySelectorAll("pre.mermaid");
+    if (!mermaidSrc || !nodes.length) {
+      return;
+    }
+    if (!("IntersectionObserver" in window)) {
+      renderDiagrams(Array.prototype.slice.call(nodes));
+      return;
+    }
+    var observer = new IntersectionObserver(function (entries) {
+      var visible = [];
+      for (var i = 0; i < entries.length; i += 1) {
+        if (entries[i].isIntersecting) {
+          visible.push(entries[i].target);
+          observer.unobserve(entries[i].target);
+        }
+      }
+      renderDiagrams(visible);
+    }, { rootMargin: "200px 0px" });
+    for (var j = 0; j < nodes.length; j += 1) {
+      observer.observe(nodes[j]);
+    }
+  }
+
+  function setTheme(theme) {
+    root.setAttribute("data-theme", theme);
+    themeToggle.textContent = theme === "dark" ? "Light" : "Dark";
+    try {
+      localStorage.setItem(themeKey, theme);
+    } catch (err) {
+      // Ignore write failures.
+    }
+    renderMermaid(theme);
+  }
+
+  function initTheme() {
+    var stored = null;
+    try {
+      stored = localStorage.getItem(themeKey);
+    } catch (err) {
+      stored = null;
+    }
+    var preferredDark = window.matchMedia && window.matchMedia("(prefers-color-scheme: dark)").matches;
+    var initial = stored || (preferredDark ? "dark" : "light");
+    setTheme(initial);
+  }
+
+  function closeSidebar() {
+    sidebar.classList.remove("open");
+    backdrop.classList.remove("show");
+  }
+
+  function setGroupOpen(group, open) {
+    if (!group) {
+      return;
+    }
+    group.classList.toggle("open", open);
+    var btn = group.querySelector(".nav-group-btn");
+    if (btn) {
+      btn.setAttribute("aria-expanded", open ? "true" : "false");
+    }
+  }
+
+  sidebar.addEventListener("click", function (event) {
+    var button = event.target.closest(".nav-group-btn");
+    if (button) {
+      var group = button.closest(".nav-group");
+      var shouldOpen = !group.classList.contains("open");
+      var navGroups = sidebar.querySelectorAll(".nav-group");
+      for (var j = 0; j < navGroups.length; j += 1) {
+        setGroupOpen(navGroups[j], false);
+      }
+      setGroupOpen(group, shouldOpen);
+    } else if (event.target.closest(".nav-link") && window.innerWidth <= 980) {
+      closeSidebar();
+    }
+  });
+
+  if (menuToggle) {
+    menuToggle.addEventListener("click", function () {
+      var open = sidebar.classList.toggle("open");
+      backdrop.classList.toggle("show", open);
+    });
+  }
+  if (backdrop) {
+    backdrop.addEventListener("click", closeSidebar);
+  }
+  window.addEventListener("resize", function () {
+    if (window.innerWidth > 980) {
+      closeSidebar();
+    }
+  });
+
+  themeToggle.addEventListener("click", function () {
+    var current = root.getAttribute("data-theme") === "dark" ? "dark" : "light";
+    setTheme(current === "dark" ? "light" : "dark");
+  });
+
+  function escapeHtml(value) {
+    return String(value).replace(/[&<>"]/g, function (ch) {
+      return { "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;" }[ch];
+    });
+  }
+
+  function renderNavTree(tree, nav, siteRoot) {
+    var current = tree.getAttribute("data-current");
+    var currentGroup = tree.getAttribute("data-group");
+    var parts = [];
+    nav.groups.forEach(function (group) {
+      var open = group.name === currentGroup || group.name === "Overview";
+      var links = group.items.map(function (item) {
+        return '<a class="nav-link' + (item[0] === current ? " active" : "") + '" href="' +
+          escapeHtml(siteRoot + item[0]) + '"><span class="nav-link-dot">•</span>' +
+          '<span class="nav-link-text">' + item[1] + "</span></a>";
+      });
+      parts.push(
+        '<section class="nav-group' + (open ? " open" : "") + '">' +
+        '<button class="nav-group-btn" type="button" aria-expanded="' + (open ? "true" : "false") + '">' +
+        '<span class="nav-group-icon">' + escapeHtml(group.icon) + "</span>" +
+        '<span class="nav-group-title">' + escapeHtml(group.name) + "</span>" +
+        '<span class="nav-group-caret">▾</span></button>' +
+        '<div class="nav-group-items">' + links.join("") + "</div></section>"
+      );
+    });
+    tree.innerHTML = parts.join("\\n");
+  }
+
+  function initSharedNav() {
+    var tree = document.getElementById("nav-tree");
+    if (!tree || !currentScript || !window.fetch) {
+      return;
+    }
+    var cached = null;
+    try {
+      cached = window.sessionStorage.getItem(navCacheKey);
+      if (cached) {
+        renderNavTree(tree, JSON.parse(cached), siteRoot);
+      }
+    } catch (error) {
+      cached = null;
+    }
+    // Revalidate in the background; the browser answers from its HTTP cache when nav.json is unchanged.
+    fetch(siteRoot + "nav.json", { cache: "no-cache" }).then(function (response) {
+      if (!response.ok) {
+        throw new Error("nav.json: HTTP " + response.status);
+      }
+      return response.text();
+    }).then(function (text) {
+      if (text === cached) {
+        return;
+      }
+      renderNavTree(tree, JSON.parse(text), siteRoot);
+      try {
+        window.sessionStorage.setItem(navCacheKey, text);
+      } catch (error) {
+        // Storage can be full or disabled; the next page fetches again.
+      }
+    }).catch(function () {
+      // Keep the page's own section when nav.json cannot be loaded (e.g. file:// URLs).
+    });
+  }
+
+  function initSearch() {
+    var input = document.getElementById("search-input");
+    var panel = document.getElementById("search-results");
+    if (!input || !panel || !currentScript || !window.fetch || !window.Promise) {
+      return;
+    }
+    // The script lives at <site root>/assets/, so the index is one level up.
+    var requests = {};
+    var latestQuery = 0;
+    var timer = null;
+    var tokenPattern;
+    try {
+      tokenPattern = new RegExp("[\\\\p{L}\\\\p{N}]{2,}", "gu");
+    } catch (err) {
+      tokenPattern = /[a-z0-9]{2,}/g;
+    }
+
+    function fetchJson(path) {
+      if (!requests[path]) {
+        requests[path] = fetch(siteRoot + "search/" + path).then(function (response) {
+          if (!response.ok) {
+            throw new Error("HTTP " + response.status);
+          }
+          return response.json();
+        });
+      }
+      return requests[path];
+    }
+
+    function tokenize(text) {
+      var matches = text.toLowerCase().match(tokenPattern) || [];
+      return matches.map(function (term) {
+        return term.slice(0, 32);
+      });
+    }
+
+    function shardKey(meta, term) {
+      if (!meta.known) {
+        meta.known = {};
+        for (var i = 0; i < meta.shards.length; i += 1) {
+          meta.known[meta.shards[i]] = true;
+        }
+      }
+      for (var n = Math.min(term.length, 4); n >= 2; n -= 1) {
+        if (meta.known[term.slice(0, n)]) {
+          return term.slice(0, n);
+        }
+      }
+      return null;
+    }
+
+    function lookup(meta, term, asPrefix) {
+      var key = shardKey(meta, term);
+      if (!key) {
+        return Promise.resolve({ hits: {}, complete: true });
+      }
+      return fetchJson("terms/" + key + ".json").then(function (shard) {
+        var hits = {};
+        var complete = true;
+        Object.keys(shard).forEach(function (candidate) {
+          var exact = candidate === term;
+          if (!exact && !(asPrefix && candidate.indexOf(term) === 0)) {
+            return;
+          }
+          if (shard[candidate].length >= meta.postings) {
+            complete = false;
+          }
+          shard[candidate].forEach(function (posting) {
+            var score = exact ? posting[1] : posting[1] / 4;
+            var hit = hits[posting[0]];
+            if (!hit || score > hit.score) {
+              hits[posting[0]] = { score: score, sections: posting.slice(2) };
+            }
+          });
+        });
+        return { hits: hits, complete: complete };
+      });
+    }
+
+    function runQuery(query) {
+      var terms = tokenize(query);
+      if (!terms.length) {
+        return Promise.resolve(null);
+      }
+      return fetchJson("meta.json").then(function (meta) {
+        // The last word is matched as a prefix so results follow typing.
+        var lookups = terms.map(function (term, index) {
+          return lookup(meta, term, index === terms.length - 1);
+        });
+        return Promise.all(lookups).then(function (perTerm) {
+          // Common words keep only their top postings, so a truncated list
+          // adds to scores but cannot rule a page out.
+          perTerm.sort(function (a, b) {
+            return Number(b.complete) - Number(a.complete);
+          });
+          var totals = perTerm[0].hits;
+          for (var t = 1; t < perTerm.length; t += 1) {
+            var merged = {};
+            var hits = perTerm[t].hits;
+            for (var page in totals) {
+              var next = hits[page];
+              if (next) {
+                var shared = totals[page].sections.filter(function (section) {
+                  return next.sections.indexOf(section) !== -1;
+                });
+                merged[page] = {
+                  score: totals[page].score + next.score,
+                  sections: shared.length ? shared : totals[page].sections,
+                };
+              } else if (!perTerm[t].complete) {
+                merged[page] = totals[page];
+              }
+            }
+            if (!perTerm[0].complete) {
+              for (var extra in hits) {
+                if (!merged[extra]) {
+                  merged[extra] = hits[extra];
+                }
+              }
+            }
+            totals = merged;
+          }
+          var ranked = Object.keys(totals).map(function (page) {
+            return { page: Number(page), score: totals[page].score, section: totals[page].sections[0] || 0 };
+          });
+          ranked.sort(function (a, b) {
+            return b.score - a.score || a.page - b.page;
+          });
+          return Promise.all(ranked.slice(0, 10).map(function (hit) {
+            return fetchJson("pages/" + Math.floor(hit.page / meta.chunk) + ".json").then(function (rows) {
+              var row = rows[hit.page % meta.chunk];
+              var section = hit.section ? row[2][hit.section - 1] : null;
+              return {
+                href: siteRoot + row[0] + (section ? "#" + section[0] : ""),
+                title: row[1],
+                heading: section ? section[1] : "",
+              };
+            });
+          }));
+        });
+      });
+    }
+
+    function showMessage(text) {
+      panel.innerHTML = "";
+      var message = document.createElement("div");
+      message.className = "search-empty";
+      message.textContent = text;
+      panel.appendChild(message);
+      panel.hidden = false;
+    }
+
+    function showResults(results) {
+      if (!results) {
+        panel.hidden = true;
+        return;
+      }
+      if (!results.length) {
+        showMessage("No matching pages.");
+        return;
+      }
+      panel.innerHTML = "";
+      results.forEach(function (result) {
+        var link = document.createElement("a");
+        link.className = "search-hit";
+        link.href = result.href;
+        link.textContent = result.title;
+        if (result.heading) {
+          var heading = document.createElement("span");
+          heading.className = "search-hit-section";
+          heading.textContent = result.heading;
+          link.appendChild(heading);
+        }
+        panel.appendChild(link);
+      });
+      panel.hidden = false;
+    }
+
+    function search() {
+      var queryId = latestQuery + 1;
+      latestQuery = queryId;
+      runQuery(input.value).then(function (results) {
+        if (queryId === latestQuery) {
+          showResults(results);
+        }
+      }, function () {
+        if (queryId === latestQuery) {
+          showMessage("Search is available when the site is served over HTTP.");
+        }
+      });
+    }
+
+    input.addEventListener("input", function () {
+      clearTimeout(timer);
+      timer = setTimeout(search, 120);
+    });
+    input.addEventListener("keydown", function (event) {
+      if (event.key === "Escape") {
+        panel.hidden = true;
+        input.blur();
+      } else if (event.key === "Enter") {
+        var first = panel.querySelector(".search-hit");
+        if (first) {
+          window.location.href = first.href;
+        }
+      }
+    });
+    document.addEventListener("click", function (event) {
+      if (!panel.contains(event.target) && event.target !== input) {
+        panel.hidden = true;
+      }
+    });
+  }
+
+  initTheme();
+  initSharedNav();
+  initMermaid();
+  initSearch();
+})();
+"""
+
+
 def page_template(
     title: str,
     source: Path,
@@ -774,19 +5387,31 @@ def page_template(
     toc_html: str,
     content_html: str,
     release_info: Dict[str, str],
+    generated_at: datetime,
+    stylesheet_href: str,
+    script_href: str,
+    mermaid_href: str = "",
+    search: bool = True,
 ) -> str:
-    now_utc = datetime.now(timezone.utc)
-    generated_at = now_utc.strftime("%Y-%m-%d %H:%M UTC")
+    generated_stamp = generated_at.strftime("%Y-%m-%d %H:%M UTC")
     source_label = html.escape(source.as_posix())
     source_href_escaped = html.escape(source_href, quote=True)
     home_href_escaped = html.escape(home_href, quote=True)
     generator_href_escaped = html.escape(generator_href, quote=True)
+    stylesheet_href_escaped = html.escape(stylesheet_href, quote=True)
+    script_href_escaped = html.escape(script_href, quote=True)
+    mermaid_attr = f' data-mermaid="{html.escape(mermaid_href, quote=True)}"' if mermaid_href else ""
     page_title = html.escape(f"{title} | Rishika Docs")
     heading = html.escape(title)
-    year = now_utc.year
+    year = generated_at.year
     release_label = html.escape(release_info.get("label", "Release N/A"))
     release_tooltip = html.escape(release_info.get("tooltip", "Last release info unavailable."), quote=True)
     release_status = html.escape(release_info.get("page_status", "Unknown"))
+    search_html = """<div class="search" role="search">
+        <input class="search-input" id="search-input" type="search" placeholder="Search docs" aria-label="Search docs" autocomplete="off" />
+        <div class="search-results" id="search-results" hidden></div>
+      </div>
+      """ if search else ""
 
     return f"""<!doctype html>
 <html lang="en">
@@ -794,365 +5419,7 @@ def page_template(
   <meta charset="utf-8" />
   <meta name="viewport" content="width=device-width, initial-scale=1" />
   <title>{page_title}</title>
-  <style>
-    :root {{
-      --bg: #f2f6fc;
-      --surface: #ffffff;
-      --surface-2: #f8fbff;
-      --ink: #162844;
-      --muted: #5d6f8b;
-      --border: #d4dfef;
-      --link: #0b4fce;
-      --code-bg: #eef4ff;
-      --active: #e6efff;
-      --accent: #0b3fa8;
-      --topbar: #ffffffee;
-      --topbar-border: #d6e3f5;
-      --shadow: rgba(11, 43, 104, 0.08);
-      --top-height: 64px;
-    }}
-    html[data-theme="dark"] {{
-      --bg: #0f1420;
-      --surface: #121b2a;
-      --surface-2: #0f1827;
-      --ink: #e7eefc;
-      --muted: #95a6c4;
-      --border: #243652;
-      --link: #7ab6ff;
-      --code-bg: #1a263c;
-      --active: #1c2c48;
-      --accent: #89bfff;
-      --topbar: #10192af0;
-      --topbar-border: #253958;
-      --shadow: rgba(2, 10, 22, 0.45);
-    }}
-    * {{ box-sizing: border-box; }}
-    html, body {{ margin: 0; padding: 0; }}
-    body {{
-      font-family: "IBM Plex Sans", "Avenir Next", "Segoe UI", ui-sans-serif, system-ui, -apple-system, sans-serif;
-      background: radial-gradient(circle at top right, #e8f2ff 0%, var(--bg) 50%);
-      color: var(--ink);
-    }}
-    a {{ color: var(--link); text-decoration: none; }}
-    a:hover {{ text-decoration: underline; }}
-
-    .topbar {{
-      position: sticky;
-      top: 0;
-      z-index: 50;
-      height: var(--top-height);
-      background: var(--topbar);
-      backdrop-filter: blur(8px);
-      border-bottom: 1px solid var(--topbar-border);
-      display: flex;
-      align-items: center;
-      justify-content: space-between;
-      padding: 0 14px;
-    }}
-    .top-left {{
-      display: flex;
-      align-items: center;
-      gap: 14px;
-      min-width: 0;
-    }}
-    .menu-btn {{
-      display: none;
-      border: 1px solid var(--border);
-      background: var(--surface);
-      color: var(--ink);
-      border-radius: 10px;
-      font-size: 13px;
-      font-weight: 600;
-      padding: 7px 10px;
-      cursor: pointer;
-    }}
-    .brand {{
-      color: var(--ink);
-      font-weight: 800;
-      letter-spacing: 0.01em;
-      font-size: 15px;
-      white-space: nowrap;
-    }}
-    .top-nav {{
-      display: flex;
-      align-items: center;
-      gap: 8px;
-      overflow-x: auto;
-      padding-bottom: 1px;
-    }}
-    .top-link {{
-      display: inline-flex;
-      align-items: center;
-      height: 30px;
-      border-radius: 999px;
-      padding: 0 10px;
-      color: var(--muted);
-      border: 1px solid transparent;
-      font-size: 12px;
-      font-weight: 600;
-      white-space: nowrap;
-    }}
-    .top-link:hover {{
-      color: var(--ink);
-      text-decoration: none;
-      background: var(--surface);
-      border-color: var(--border);
-    }}
-    .top-link-active {{
-      color: var(--accent);
-      background: var(--active);
-      border-color: var(--border);
-    }}
-    .top-right {{
-      display: flex;
-      align-items: center;
-      gap: 8px;
-      white-space: nowrap;
-    }}
-    .generated-stamp {{
-      color: var(--muted);
-      font-size: 12px;
-      font-variant-numeric: tabular-nums;
-      padding: 0 6px;
-    }}
-    .release-pill {{
-      border: 1px solid var(--border);
-      background: var(--surface);
-      color: var(--ink);
-      border-radius: 999px;
-      font-size: 12px;
-      padding: 6px 10px;
-      box-shadow: 0 1px 4px var(--shadow);
-      cursor: help;
-    }}
-    .theme-btn {{
-      border: 1px solid var(--border);
-      background: var(--surface);
-      color: var(--ink);
-      border-radius: 10px;
-      font-size: 12px;
-      font-weight: 600;
-      padding: 7px 10px;
-      cursor: pointer;
-    }}
-    .layout {{
-      display: grid;
-      grid-template-columns: 300px minmax(0, 1fr) 240px;
-      min-height: calc(100vh - var(--top-height));
-    }}
-    .sidebar {{
-      border-right: 1px solid var(--border);
-      background: var(--surface-2);
-      padding: 12px 10px 18px;
-      position: sticky;
-      top: var(--top-height);
-      height: calc(100vh - var(--top-height));
-      overflow: auto;
-    }}
-    .sub {{
-      color: var(--muted);
-      font-size: 12px;
-      margin: 0 6px 10px;
-    }}
-    .nav-group {{
-      border: 1px solid var(--border);
-      border-radius: 10px;
-      background: var(--surface);
-      margin-bottom: 8px;
-      overflow: hidden;
-    }}
-    .nav-group-btn {{
-      width: 100%;
-      border: 0;
-      background: transparent;
-      color: var(--ink);
-      padding: 7px 9px;
-      display: flex;
-      align-items: center;
-      gap: 8px;
-      font-size: 12px;
-      font-weight: 700;
-      cursor: pointer;
-      text-align: left;
-    }}
-    .nav-group-btn:hover {{
-      background: var(--active);
-    }}
-    .nav-group-icon {{
-      width: 16px;
-      text-align: center;
-      color: var(--accent);
-      font-size: 12px;
-    }}
-    .nav-group-title {{
-      flex: 1;
-      text-transform: uppercase;
-      letter-spacing: 0.03em;
-      font-size: 11px;
-    }}
-    .nav-group-caret {{
-      color: var(--muted);
-      font-size: 12px;
-      transition: transform 0.18s ease;
-    }}
-    .nav-group.open .nav-group-caret {{
-      transform: rotate(0deg);
-    }}
-    .nav-group:not(.open) .nav-group-caret {{
-      transform: rotate(-90deg);
-    }}
-    .nav-group-items {{
-      display: none;
-      padding: 0 6px 7px 6px;
-      border-top: 1px solid var(--border);
-      background: var(--surface-2);
-    }}
-    .nav-group.open .nav-group-items {{
-      display: block;
-    }}
-    .nav-link {{
-      display: flex;
-      align-items: center;
-      gap: 7px;
-      padding: 5px 6px;
-      border-radius: 7px;
-      color: var(--ink);
-      font-size: 12px;
-      line-height: 1.3;
-    }}
-    .nav-link:hover {{
-      text-decoration: none;
-      background: var(--active);
-    }}
-    .nav-link-dot {{
-      width: 12px;
-      text-align: center;
-      color: var(--muted);
-      font-size: 10px;
-      flex: none;
-    }}
-    .nav-link-text {{
-      overflow: hidden;
-      text-overflow: ellipsis;
-      white-space: nowrap;
-    }}
-    .nav-link.active {{
-      background: var(--active);
-      color: var(--accent);
-      font-weight: 700;
-    }}
-    .nav-link.active .nav-link-dot {{
-      color: var(--accent);
-    }}
-    .content-wrap {{ padding: 24px 28px 44px; }}
-    .content {{
-      max-width: 930px;
-      margin: 0 auto;
-      background: var(--surface);
-      border: 1px solid var(--border);
-      border-radius: 16px;
-      padding: 26px 30px;
-      box-shadow: 0 10px 28px var(--shadow);
-    }}
-    .meta {{ color: var(--muted); font-size: 12px; margin-bottom: 18px; }}
-    .meta-row {{
-      display: flex;
-      align-items: center;
-      justify-content: space-between;
-      gap: 8px;
-      flex-wrap: wrap;
-      margin-bottom: 14px;
-    }}
-    .status-pill {{
-      border: 1px solid var(--border);
-      border-radius: 999px;
-      padding: 4px 9px;
-      background: var(--surface-2);
-      color: var(--ink);
-      font-size: 11px;
-      font-weight: 600;
-    }}
-    .doc-footer {{
-      margin-top: 28px;
-      padding-top: 12px;
-      border-top: 1px solid var(--border);
-      color: var(--muted);
-      font-size: 12px;
-      text-align: right;
-    }}
-    .doc-footer a {{
-      font-weight: 700;
-    }}
-    .eyebrow {{ font-size: 11px; letter-spacing: 0.04em; text-transform: uppercase; color: var(--accent); margin-bottom: 8px; font-weight: 700; }}
-    h1, h2, h3, h4 {{ color: var(--ink); }}
-    h1 {{ margin-top: 0; font-size: 34px; letter-spacing: -0.01em; }}
-    h2 {{ margin-top: 28px; font-size: 22px; border-top: 1px solid var(--border); padding-top: 18px; }}
-    h3 {{ margin-top: 22px; font-size: 18px; }}
-    p, li {{ line-height: 1.62; color: var(--ink); }}
-    ul, ol {{ padding-left: 24px; }}
-    pre {{ background: #0f172a; color: #e2e8f0; border-radius: 10px; padding: 14px; overflow-x: auto; }}
-    pre.mermaid {{ background: var(--surface); border: 1px solid var(--border); color: var(--ink); }}
-    code {{ background: var(--code-bg); color: var(--ink); border-radius: 6px; padding: 2px 6px; font-size: 0.92em; }}
-    pre code {{ background: transparent; color: inherit; padding: 0; }}
-    details {{ margin-top: 14px; }}
-    summary {{ cursor: pointer; color: var(--accent); }}
-    table {{ width: 100%; border-collapse: collapse; margin: 16px 0; font-size: 14px; }}
-    th, td {{ border: 1px solid var(--border); text-align: left; padding: 9px 10px; vertical-align: top; }}
-    th {{ background: var(--surface-2); font-weight: 600; }}
-    .toc {{
-      border-left: 1px solid var(--border);
-      background: var(--surface-2);
-      padding: 22px 12px;
-      position: sticky;
-      top: var(--top-height);
-      height: calc(100vh - var(--top-height));
-      overflow: auto;
-    }}
-    .toc h3 {{ font-size: 11px; text-transform: uppercase; letter-spacing: 0.05em; color: var(--muted); margin: 0 0 10px; }}
-    .toc-link {{ display: block; color: var(--ink); font-size: 13px; padding: 4px 6px; border-radius: 6px; }}
-    .toc-link:hover {{ background: var(--active); text-decoration: none; }}
-    .toc-main {{ font-weight: 600; }}
-    .toc-sub {{ padding-left: 16px; color: var(--muted); }}
-    .toc-empty {{ color: var(--muted); font-size: 12px; }}
-    .backdrop {{
-      display: none;
-      position: fixed;
-      inset: var(--top-height) 0 0 0;
-      background: rgba(5, 12, 23, 0.42);
-      z-index: 35;
-    }}
-    .backdrop.show {{ display: block; }}
-    @media (max-width: 1200px) {{
-      .layout {{ grid-template-columns: 280px minmax(0, 1fr); }}
-      .toc {{ display: none; }}
-    }}
-    @media (max-width: 980px) {{
-      .menu-btn {{ display: inline-flex; }}
-      .top-nav {{ display: none; }}
-      .generated-stamp {{ display: none; }}
-      .layout {{ grid-template-columns: 1fr; }}
-      .sidebar {{
-        position: fixed;
-        top: var(--top-height);
-        left: 0;
-        width: min(90vw, 320px);
-        transform: translateX(-104%);
-        transition: transform 0.22s ease;
-        z-index: 40;
-        border-right: 1px solid var(--border);
-      }}
-      .sidebar.open {{ transform: translateX(0); }}
-      .content-wrap {{ padding: 12px; }}
-      .content {{ padding: 18px; border-radius: 10px; }}
-    }}
-    @media (max-width: 640px) {{
-      .release-pill {{ display: none; }}
-      .theme-btn {{ padding: 7px 9px; }}
-      .topbar {{ padding: 0 10px; }}
-      .content h1 {{ font-size: 30px; }}
-    }}
-  </style>
-  <script src="https://cdn.jsdelivr.net/npm/mermaid@11/dist/mermaid.min.js"></script>
+  <link rel="stylesheet" href="{stylesheet_href_escaped}" />
 </head>
 <body>
   <header class="topbar">
@@ -1162,7 +5429,7 @@ def page_template(
       <nav class="top-nav" aria-label="Top navigation">{top_nav_html}</nav>
     </div>
     <div class="top-right">
-      <span class="generated-stamp" title="Generation timestamp">{generated_at}</span>
+      {search_html}<span class="generated-stamp" title="Generation timestamp">{generated_stamp}</span>
       <span class="release-pill" title="{release_tooltip}">{release_label}</span>
       <button class="theme-btn" id="theme-toggle" aria-label="Toggle color theme">Dark</button>
     </div>
@@ -1178,7 +5445,7 @@ def page_template(
         <div class="eyebrow">Markdown-First Documentation</div>
         <h1>{heading}</h1>
         <div class="meta-row">
-          <div class="meta">Source Markdown: <a href="{source_href_escaped}"><code>{source_label}</code></a> · Generated: {generated_at}</div>
+          <div class="meta">Source Markdown: <a href="{source_href_escaped}"><code>{source_label}</code></a> · Generated: {generated_stamp}</div>
           <span class="status-pill" title="{release_tooltip}">{release_status}</span>
         </div>
         {content_html}
@@ -1190,114 +5457,7 @@ def page_template(
       {toc_html or '<div class="toc-empty">No section headings on this page.</div>'}
     </aside>
   </div>
-  <script>
-    (function () {{
-      var root = document.documentElement;
-      var themeKey = "aidex-docs-theme";
-      var menuToggle = document.getElementById("menu-toggle");
-      var themeToggle = document.getElementById("theme-toggle");
-      var sidebar = document.getElementById("left-nav");
-      var backdrop = document.getElementById("nav-backdrop");
-      var navGroups = document.querySelectorAll(".nav-group");
-      var navGroupButtons = document.querySelectorAll(".nav-group-btn");
-      var navLinks = document.querySelectorAll(".nav-link");
-
-      function renderMermaid(theme) {{
-        if (!window.mermaid) {{
-          return;
-        }}
-        var nodes = document.querySelectorAll("pre.mermaid");
-        for (var i = 0; i < nodes.length; i += 1) {{
-          nodes[i].removeAttribute("data-processed");
-        }}
-        window.mermaid.initialize({{
-          startOnLoad: false,
-          theme: theme === "dark" ? "dark" : "neutral",
-        }});
-        window.mermaid.run({{ nodes: nodes }});
-      }}
-
-      function setTheme(theme) {{
-        root.setAttribute("data-theme", theme);
-        themeToggle.textContent = theme === "dark" ? "Light" : "Dark";
-        try {{
-          localStorage.setItem(themeKey, theme);
-        }} catch (err) {{
-          // Ignore write failures.
-        }}
-        renderMermaid(theme);
-      }}
-
-      function initTheme() {{
-        var stored = null;
-        try {{
-          stored = localStorage.getItem(themeKey);
-        }} catch (err) {{
-          stored = null;
-        }}
-        var preferredDark = window.matchMedia && window.matchMedia("(prefers-color-scheme: dark)").matches;
-        var initial = stored || (preferredDark ? "dark" : "light");
-        setTheme(initial);
-      }}
-
-      function closeSidebar() {{
-        sidebar.classList.remove("open");
-        backdrop.classList.remove("show");
-      }}
-
-      function setGroupOpen(group, open) {{
-        if (!group) {{
-          return;
-        }}
-        group.classList.toggle("open", open);
-        var btn = group.querySelector(".nav-group-btn");
-        if (btn) {{
-          btn.setAttribute("aria-expanded", open ? "true" : "false");
-        }}
-      }}
-
-      for (var gi = 0; gi < navGroupButtons.length; gi += 1) {{
-        navGroupButtons[gi].addEventListener("click", function () {{
-          var group = this.closest(".nav-group");
-          var shouldOpen = !group.classList.contains("open");
-          for (var j = 0; j < navGroups.length; j += 1) {{
-            setGroupOpen(navGroups[j], false);
-          }}
-          setGroupOpen(group, shouldOpen);
-        }});
-      }}
-
-      if (menuToggle) {{
-        menuToggle.addEventListener("click", function () {{
-          var open = sidebar.classList.toggle("open");
-          backdrop.classList.toggle("show", open);
-        }});
-      }}
-      if (backdrop) {{
-        backdrop.addEventListener("click", closeSidebar);
-      }}
-      window.addEventListener("resize", function () {{
-        if (window.innerWidth > 980) {{
-          closeSidebar();
-        }}
-      }});
-
-      for (var li = 0; li < navLinks.length; li += 1) {{
-        navLinks[li].addEventListener("click", function () {{
-          if (window.innerWidth <= 980) {{
-            closeSidebar();
-          }}
-        }});
-      }}
-
-      themeToggle.addEventListener("click", function () {{
-        var current = root.getAttribute("data-theme") === "dark" ? "dark" : "light";
-        setTheme(current === "dark" ? "light" : "dark");
-      }});
-
-      initTheme();
-    }})();
-  </script>
+  <script src="{script_href_escaped}"{mermaid_attr}></script>
 </body>
 </html>
 """
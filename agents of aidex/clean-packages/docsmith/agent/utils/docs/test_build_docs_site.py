@@ -0,0 +1,372 @@
+"""Regression tests for the invariants build_docs_site.py documents in the README."""
+
+import json
+import shutil
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import build_docs_site as docs  # noqa: E402
+
+
+@pytest.fixture
+def repo(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """A small docs tree with cross links, outside any git work tree, stamped reproducibly."""
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1700000000")
+    root = tmp_path / "repo"
+    pages = {
+        "docs/index.md": "# Home\n\nSee [the guide](guide/intro.md) and [the API](api.md).\n",
+        "docs/api.md": "# API\n\n## Calls\n\nBack to [home](index.md).\n",
+        "docs/guide/intro.md": "# Intro\n\n- one\n- two\n\nNext: [setup](setup.md).\n",
+        "docs/guide/setup.md": "# Setup\n\n```sh\npip install docsmith\n```\n\n[Intro](intro.md#intro)\n",
+        "docs/guide/faq.md": "# FAQ\n\n| Question | Answer |\n| --- | --- |\n| Why? | Because. |\n",
+        "Readme.md": "# Readme\n\nStart at [the docs](docs/index.md).\n",
+    }
+    for rel, text in pages.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Padding keeps every page above COMPRESS_MIN_BYTES.
+        path.write_text(text + "\n" + "Filler text for the page body. " * 20 + "\n", encoding="utf-8")
+    return root
+
+
+def build(repo: Path, output: Path, **options: object) -> docs.BuildResult:
+    config = docs.BuildConfig(repo_root=repo, output=output, use_git=False, **options)  # type: ignore[arg-type]
+    return docs.build_site(config)
+
+
+def snapshot(root: Path) -> Dict[str, bytes]:
+    return {path.relative_to(root).as_posix(): path.read_bytes() for path in root.rglob("*") if path.is_file()}
+
+
+def search(site: Path, term: str) -> List[Tuple[str, str]]:
+    """Look `term` up the way the browser does: longest listed shard key, then page chunks."""
+    meta = json.loads((site / "search" / "meta.json").read_text(encoding="utf-8"))
+    keys = [key for key in meta["shards"] if term.startswith(key)]
+    if not keys:
+        return []
+    shard = json.loads((site / "search" / "terms" / f"{max(keys, key=len)}.json").read_text(encoding="utf-8"))
+    hits = []
+    for page, _score, section, *_rest in shard.get(term, []):
+        chunk = json.loads((site / "search" / "pages" / f"{page // meta['chunk']}.json").read_text(encoding="utf-8"))
+        output, _title, sections = chunk[page % meta["chunk"]]
+        hits.append((output, sections[section - 1][0] if section else ""))
+    return hits
+
+
+RENDER_CASES = [
+    pytest.param(
+        "Some *emphasis*, _under_, **strong** and ***both***.",
+        "<p>Some <em>emphasis</em>, _under_, <strong>strong</strong> and <em><strong>both</strong></em>.</p>",
+        id="emphasis",
+    ),
+    pytest.param(
+        "A `code span` with `<tags> & *stars*` inside.",
+        "<p>A <code>code span</code> with <code>&lt;tags&gt; &amp; *stars*</code> inside.</p>",
+        id="code-spans",
+    ),
+    pytest.param(
+        "See [the guide](guide/intro.md), [a section](api.md#Error Codes) and [out](https://example.com/a?b=1&c=2).",
+        '<p>See <a href="guide/intro.html">the guide</a>, <a href="api.html#error-codes">a section</a> and'
+        ' <a href="https://example.com/a?b=1&amp;c=2">out</a>.</p>',
+        id="links",
+    ),
+    pytest.param(
+        "A [`code` label](api.md) and a `[not](a link)` span.",
+        '<p>A <a href="api.html"><code>code</code> label</a> and a `<a href="../a link">not</a>` span.</p>',
+        id="links-before-code-spans",
+    ),
+    pytest.param(
+        "Autolink <https://example.com> and bare https://example.com/x.",
+        "<p>Autolink &lt;https://example.com&gt; and bare https://example.com/x.</p>",
+        id="autolinks-stay-text",
+    ),
+    pytest.param(
+        "| Name | Value |\n| --- | --- |\n| *a* | `b` |\n| [c](api.md) | d \\| e |",
+        "<table><thead><tr><th>Name</th><th>Value</th></tr></thead><tbody>"
+        "<tr><td><em>a</em></td><td><code>b</code></td></tr>"
+        '<tr><td><a href="api.html">c</a></td><td>d \\</td><td>e</td></tr></tbody></table>',
+        id="tables",
+    ),
+    pytest.param(
+        "```python\nif a < b and c > d:\n    print('&')\n```",
+        '<pre><code class="language-python">if a &lt; b and c &gt; d:\n    print(&#x27;&amp;&#x27;)</code></pre>',
+        id="fences",
+    ),
+    pytest.param(
+        "```mermaid\ngraph LR\n  A --> B\n```",
+        '<pre class="mermaid">graph LR\n  A --> B</pre>',
+        id="mermaid",
+    ),
+    pytest.param(
+        "# Title with `code`\n\n- one *item*\n- two\n\n1. first\n2. second",
+        '<h1 id="title-with-code">Title with <code>code</code></h1>\n'
+        "<ul>\n<li>one <em>item</em></li>\n<li>two</li>\n</ul>\n<ol>\n<li>first</li>\n<li>second</li>\n</ol>",
+        id="headings-and-lists",
+    ),
+]
+
+
+@pytest.mark.parametrize(("markdown", "expected"), RENDER_CASES)
+def test_render_markdown_output_is_pinned(markdown: str, expected: str) -> None:
+    source_to_output = {
+        Path("docs/index.md"): Path("index.html"),
+        Path("docs/api.md"): Path("api.html"),
+        Path("docs/guide/intro.md"): Path("guide/intro.html"),
+    }
+    blocks = docs.parse_markdown(markdown.splitlines())
+    assert docs.render_markdown(blocks, Path("docs/index.md"), Path("index.html"), source_to_output) == expected
+
+
+def test_full_build_without_precompress_removes_siblings(repo: Path) -> None:
+    site = repo / "docs" / "site"
+    build(repo, site, precompress=True)
+    assert list(site.rglob("*.gz"))
+    build(repo, site, full=True)
+    assert not list(site.rglob("*.gz")) and not list(site.rglob("*.br"))
+    # A later incremental build must not bring them back or depend on the manifest flag.
+    build(repo, site)
+    assert not list(site.rglob("*.gz"))
+
+
+def test_removing_a_page_drops_its_search_terms(repo: Path, tmp_path: Path) -> None:
+    site = repo / "docs" / "site"
+    build(repo, site)
+    (repo / "docs" / "guide" / "faq.md").unlink()
+    build(repo, site)
+    expected = tmp_path / "full"
+    build(repo, expected, full=True)
+    assert snapshot(site / "search") == snapshot(expected / "search")
+
+
+def test_search_finds_terms_and_follows_incremental_edits(repo: Path, tmp_path: Path) -> None:
+    site = repo / "docs" / "site"
+    build(repo, site)
+    assert search(site, "calls") == [("api.html", "calls")]
+    assert search(site, "pip") == [("guide/setup.html", "setup")]
+    # Title matches outrank body text.
+    assert search(site, "intro") == [("guide/intro.html", ""), ("guide/setup.html", "setup")]
+    assert search(site, "widgets") == []
+    (repo / "docs" / "api.md").write_text("# API\n\n## Widgets\n\nNo calls here.\n", encoding="utf-8")
+    assert build(repo, site).rendered == ["docs/api.md"]
+    assert search(site, "widgets") == [("api.html", "widgets")]
+    assert search(site, "calls") == [("api.html", "widgets")]
+    expected = tmp_path / "full"
+    build(repo, expected, full=True)
+    assert snapshot(site / "search") == snapshot(expected / "search")
+
+
+def test_atomic_builds_recycle_generations_and_match_full_build(repo: Path, tmp_path: Path) -> None:
+    site = repo / "docs" / "site"
+    build(repo, site)
+    for step in range(4):
+        (repo / "docs" / "api.md").write_text(f"# API\n\nRevision {step}.\n", encoding="utf-8")
+        if step == 2:
+            (repo / "docs" / "guide" / "faq.md").unlink()
+        lines: List[str] = []
+        build(repo, site, atomic=True, log=lines.append)
+        assert site.is_symlink()
+        # The first two builds have no generation to recycle yet.
+        assert any("recycled generation" in line for line in lines) == (step >= 2)
+        expected = tmp_path / f"full-{step}"
+        build(repo, expected, full=True)
+        assert snapshot(site) == snapshot(expected)
+    generations = [path for path in (repo / "docs" / ".site-generations").iterdir() if path.is_dir()]
+    assert len(generations) == 2
+
+
+def test_parallel_build_matches_serial_build(repo: Path, tmp_path: Path) -> None:
+    build(repo, tmp_path / "serial", jobs=1)
+    build(repo, tmp_path / "parallel", jobs=3)
+    assert snapshot(tmp_path / "parallel") == snapshot(tmp_path / "serial")
+
+
+def test_incremental_builds_match_full_build(repo: Path, tmp_path: Path) -> None:
+    site = repo / "docs" / "site"
+    build(repo, site, jobs=2)
+    edits = [
+        ("docs/api.md", "# API\n\n## Calls\n\nBack to [home](index.md).\n\n## Errors\n"),
+        ("docs/guide/new.md", "# New\n\nLinks to [intro](intro.md) and [missing](gone.md).\n"),
+        ("docs/guide/intro.md", "# Introduction\n\nRetitled.\n"),
+    ]
+    for step, (rel, text) in enumerate(edits):
+        (repo / rel).write_text(text, encoding="utf-8")
+        if step == 2:
+            (repo / "docs" / "guide" / "setup.md").unlink()
+        result = build(repo, site, jobs=2)
+        assert result.rendered
+        expected = tmp_path / f"full-{step}"
+        build(repo, expected, full=True)
+        assert snapshot(site) == snapshot(expected)
+
+
+def test_builds_nested_in_a_log_callback_and_on_threads_keep_their_own_context(repo: Path, tmp_path: Path) -> None:
+    other = tmp_path / "other"
+    shutil.copytree(repo, other)
+    (other / "docs" / "api.md").write_text("# Other API\n", encoding="utf-8")
+    build(repo, tmp_path / "expected-repo", full=True)
+    build(other, tmp_path / "expected-other", full=True)
+
+    nested: List[docs.BuildResult] = []
+
+    def log(line: str) -> None:
+        # The outer build is mid-way through discovery when this runs.
+        if line.startswith("Discovered") and not nested:
+            nested.append(build(other, tmp_path / "nested"))
+
+    outer = build(repo, tmp_path / "outer", log=log)
+    assert nested and outer.output.root == tmp_path / "outer"
+    assert snapshot(tmp_path / "outer") == snapshot(tmp_path / "expected-repo")
+    assert snapshot(tmp_path / "nested") == snapshot(tmp_path / "expected-other")
+
+    threads = [
+        threading.Thread(target=build, args=(root, tmp_path / f"threaded-{index}"))
+        for index, root in enumerate([repo, other] * 2)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for index in range(4):
+        expected = tmp_path / ("expected-repo" if index % 2 == 0 else "expected-other")
+        assert snapshot(tmp_path / f"threaded-{index}") == snapshot(expected)
+
+
+def test_links_into_generated_site_resolve_on_clean_build(repo: Path) -> None:
+    (repo / "docs" / "diagrams").mkdir()
+    (repo / "docs" / "diagrams" / "README.md").write_text(
+        "# Diagrams\n\nView [the intro](../site/guide/intro.html), [the guide](../site/guide/)"
+        " and [the styles](../site/assets/manifest.json), not [this](../site/missing.html).\n",
+        encoding="utf-8",
+    )
+    site = repo / "docs" / "site"
+    expected = [("docs/diagrams/README.md", "../site/missing.html", "target not found")]
+    assert build(repo, site, clean=True).broken_links == expected
+    assert build(repo, site).broken_links == expected
+
+
+@pytest.mark.parametrize("output", ["docs/site", "public"])
+def test_unchanged_rebuild_renders_no_pages(repo: Path, output: str) -> None:
+    # Rendered before the page it links to, so the target is only written later in the build.
+    (repo / "docs" / "about.md").write_text(
+        "# About\n\nSee [the intro](site/guide/intro.html) and [the published one](../public/guide/intro.html).\n",
+        encoding="utf-8",
+    )
+    site = repo / output
+    assert build(repo, site, clean=True).rendered
+    assert build(repo, site).rendered == []
+
+
+def test_diagrams_without_vendored_mermaid_need_cdn_opt_in(
+    repo: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(docs, "MERMAID_VENDOR_PATH", tmp_path / "missing" / "mermaid.min.js")
+    (repo / "docs" / "flow.md").write_text("# Flow\n\n```mermaid\ngraph LR\n  A --> B\n```\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="--mermaid-cdn"):
+        build(repo, tmp_path / "site")
+    build(repo, tmp_path / "site", mermaid_cdn=True)
+    assert docs.MERMAID_CDN_URL in (tmp_path / "site" / "flow.html").read_text(encoding="utf-8")
+    assert docs.MERMAID_CDN_URL not in (tmp_path / "site" / "api.html").read_text(encoding="utf-8")
+
+
+def test_bounded_cache_serializes_lookups_but_not_compute() -> None:
+    cache = docs.BoundedCache(2)
+    results: List[int] = []
+    with cache.lock:
+        reader = threading.Thread(target=lambda: results.append(cache.get("a", lambda: 1)))
+        reader.start()
+        reader.join(0.2)
+        assert reader.is_alive() and not results
+    reader.join()
+    assert results == [1]
+    # Computing a value may consult the same cache without deadlocking.
+    assert cache.get("b", lambda: cache.get("a", lambda: 0) + 1) == 2
+    cache.get("c", lambda: 3)
+    assert list(cache.entries) == ["b", "c"]
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_merged_shards_match_single_reproducible_build(repo: Path, tmp_path: Path) -> None:
+    shards = [tmp_path / f"shard-{index}" for index in range(3)]
+    for index, shard in enumerate(shards):
+        build(repo, shard, shard=(index, 3))
+    build(repo, tmp_path / "merged", merge=[str(shard) for shard in shards])
+    build(repo, tmp_path / "single", reproducible=True)
+    assert snapshot(tmp_path / "merged") == snapshot(tmp_path / "single")
+
+
+def test_merge_rejects_missing_shard(repo: Path, tmp_path: Path) -> None:
+    shards = [tmp_path / f"shard-{index}" for index in range(3)]
+    for index, shard in enumerate(shards[:2]):
+        build(repo, shard, shard=(index, 3))
+    with pytest.raises(ValueError, match="Missing shards 2/3"):
+        build(repo, tmp_path / "merged", merge=[str(shard) for shard in shards[:2]])
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="needs git")
+def test_git_and_walk_discovery_find_the_same_sources(repo: Path) -> None:
+    files = {
+        ".gitignore": "/build/\n*.draft.md\n!keep.draft.md\n/docs/generated.md\n",
+        "docs/guide/.gitignore": "private/\nsecret.md\n",
+        "docs/plan.draft.md": "# Draft\n",
+        "docs/keep.draft.md": "# Kept\n",
+        "docs/generated.md": "# Generated\n",
+        "docs/guide/secret.md": "# Secret\n",
+        "docs/guide/private/notes.md": "# Notes\n",
+        "docs/guide/public/notes.md": "# Public notes\n",
+        "docs/build/page.md": "# Nested build dirs are not anchored\n",
+        "build/docs/page.md": "# Ignored\n",
+        "docs/node_modules/pkg/README.md": "# Vendored\n",
+        "docs/env/pyvenv.cfg": "home = /usr/bin\n",
+        "docs/env/lib/README.md": "# Virtualenv\n",
+        "src/module/README.md": "# Module\n",
+    }
+    for rel, text in files.items():
+        path = repo / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+    subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+    # Half the tree tracked, half untracked: ls-files must report both.
+    subprocess.run(["git", "add", "docs/index.md", "docs/guide", ".gitignore"], cwd=repo, check=True)
+    with docs.use_build(docs.BuildContext(repo)):
+        from_git, git_method = docs.collect_sources()
+        from_walk, walk_method = docs.collect_sources(use_git=False)
+    assert (git_method, walk_method) == ("git ls-files", "directory walk")
+    assert [path.as_posix() for path in from_git] == [
+        "Readme.md",
+        "docs/api.md",
+        "docs/build/page.md",
+        "docs/guide/faq.md",
+        "docs/guide/intro.md",
+        "docs/guide/public/notes.md",
+        "docs/guide/setup.md",
+        "docs/index.md",
+        "docs/keep.draft.md",
+        "src/module/README.md",
+    ]
+    assert from_walk == from_git
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="needs git")
+def test_rev_build_ignores_work_tree_and_matches_checkout(repo: Path, tmp_path: Path) -> None:
+    def git(*args: str) -> None:
+        subprocess.run(["git", *args], cwd=repo, check=True, capture_output=True)
+
+    git("init", "-q")
+    git("add", "-A")
+    git("-c", "user.name=Docs", "-c", "user.email=docs@example.com", "commit", "-q", "-m", "docs")
+    (repo / "docs" / "api.md").write_text("# API\n\nUncommitted.\n", encoding="utf-8")
+    (repo / "docs" / "extra.md").write_text("# Extra\n", encoding="utf-8")
+    config = docs.BuildConfig(repo_root=repo, output=tmp_path / "rev", rev="HEAD")
+    docs.build_site(config)
+    git("checkout", "-q", "--", ".")
+    (repo / "docs" / "extra.md").unlink()
+    docs.build_site(docs.BuildConfig(repo_root=repo, output=tmp_path / "checkout"))
+    assert snapshot(tmp_path / "rev") == snapshot(tmp_path / "checkout")
+    assert b"Uncommitted" not in (tmp_path / "rev" / "api.html").read_bytes()